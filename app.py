@@ -1,28 +1,48 @@
-from flask import Flask, jsonify, request, render_template, session, redirect, url_for, flash
+from flask import Flask, Blueprint, current_app, request, render_template, session, redirect, url_for, flash, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 import uuid
-from chatbot_backend import get_chatbot_response
+import chatbot_backend
+from chatbot_backend import get_chatbot_response, get_chatbot_stats
+from chatbot_router import router as chatbot_router
+from chatbot_pool import chat_executor, client_disconnected, CHATBOT_TIMEOUT_SECONDS, QueueFull, PoolClosed, JobTimeout, ClientGone
+from phone_specs import parse_specs
+import chatbot_indexer
+import catalog_io
+import catalog_snapshot
+import product_feed
+import suggest
+import popularity
+import similarity
+import spec_store
+import uploads
+import inventory
+import cart_store
+import otp
+import db
+import compression
+import fastjson
+import metrics
+import profiling
+from fastjson import jsonify
 from functools import wraps
 from urllib.parse import quote
 import os
-import random
+import csv
+import math
+import time
 import smtplib
 from email.mime.text import MIMEText
-from pymongo import MongoClient, ASCENDING
-from gridfs import GridFS
 from bson.objectid import ObjectId
+from gridfs import errors as gridfs_errors
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
+from datetime import datetime
 
 
 
 load_dotenv()
 
-app = Flask(__name__)
-app.secret_key = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key')
-app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5 MB upload limit (GridFS backend)
-CORS(app)
+bp = Blueprint('store', __name__)
 
 def login_required(f):
     @wraps(f)
@@ -30,7 +50,7 @@ def login_required(f):
         if not session.get('user_id'):
             # Redirect to login with next param so we can return after auth
             next_url = request.path
-            return redirect(url_for('login') + f"?next={quote(next_url)}")
+            return redirect(url_for('store.login') + f"?next={quote(next_url)}")
         return f(*args, **kwargs)
     return decorated_function
 
@@ -40,65 +60,158 @@ def admin_required(f):
         role = session.get('role')
         if not session.get('user_id') or role != 'admin':
             next_url = request.path
-            return redirect(url_for('login') + f"?next={quote(next_url)}")
+            return redirect(url_for('store.login') + f"?next={quote(next_url)}")
         return f(*args, **kwargs)
     return decorated_function
 
 # --- MongoDB setup ---
-MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
-MONGO_DB_NAME = os.getenv('MONGO_DB_NAME', 'phonestoredb')
-
-try:
-    # Add connection timeout to prevent hanging
-    mongo_client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000, connectTimeoutMS=5000)
-    # Test the connection
-    mongo_client.admin.command('ping')
-    mongo_db = mongo_client.get_database(MONGO_DB_NAME)
-    users_col = mongo_db['users']
-    print(f"✅ Connected to MongoDB: {MONGO_DB_NAME}")
-except Exception as e:
-    print(f"❌ MongoDB connection failed: {e}")
-    print("💡 Make sure MongoDB is running on localhost:27017")
-    # Use a fallback or exit gracefully
-    mongo_client = None
-    mongo_db = None
-    users_col = None
-products_col = mongo_db['products'] if mongo_db is not None else None
-cart_col = mongo_db['cart'] if mongo_db is not None else None
-fs = GridFS(mongo_db) if mongo_db is not None else None
-
-# Ensure we have a unique index on email
-try:
-    users_col.create_index([('email', ASCENDING)], unique=True)
-except Exception:
-    pass
-# Helpful index on role (optional, non-unique)
-try:
-    users_col.create_index([('role', ASCENDING)], unique=False)
-except Exception:
-    pass
-
-# Ensure unique index on product id
-try:
-    products_col.create_index([('id', ASCENDING)], unique=True)
-except Exception:
-    pass
-
-
-@app.route('/')
+# Collections resolve against a per-process client created on first use (see db.py),
+# so importing this module or calling create_app() does no network I/O and is safe
+# before a pre-fork server forks. Indexes are created by `python migrate_db.py`.
+users_col = db.CollectionProxy('users')
+products_col = db.CollectionProxy('products')
+fs = db.GridFSProxy()
+
+# The chatbot stack (LangChain, Chroma, Gemini) is loaded lazily. By default a
+# background thread warms it up when the app is created; "lazy" defers it to the
+# first chat message and "eager" blocks startup until it is built.
+CHATBOT_WARMUP = os.getenv('CHATBOT_WARMUP', 'background').lower()
+
+# Let the chatbot answer price/spec lookups straight from the catalog
+chatbot_router.set_catalog_provider(
+    lambda: products_col.find({}, {'_id': 0, 'id': 1, 'title': 1, 'price': 1, 'stock': 1, 'specs': 1})
+)
+
+
+# The home page server-renders the first INDEX_FIRST_PAGE products and inlines up to
+# INDEX_INLINE_PRODUCTS as JSON, so products.js can hydrate without calling /api/products
+INDEX_FIRST_PAGE = int(os.getenv('INDEX_FIRST_PAGE', '12'))
+INDEX_INLINE_PRODUCTS = int(os.getenv('INDEX_INLINE_PRODUCTS', '200'))
+INDEX_CACHE_SECONDS = float(os.getenv('INDEX_CACHE_SECONDS', '5'))
+CARD_FIELDS = ('id', 'title', 'price', 'category', 'brand', 'image', 'image_file_id', 'stock')
+
+_index_cache = {'at': 0.0, 'value': None}
+
+
+def _card_image(d):
+    img = d.get('image_url') or d.get('image') or ''
+    return '/static' + img[1:] if img.startswith('./images/') else img
+
+
+def _index_catalog():
+    """(first page, inline JSON state, degraded), cached per worker for INDEX_CACHE_SECONDS."""
+    cached = _index_cache['value']
+    if cached is not None and time.monotonic() - _index_cache['at'] < INDEX_CACHE_SECONDS:
+        return cached
+    projection = dict({f: 1 for f in CARD_FIELDS}, _id=0)
+    try:
+        docs, degraded = catalog_snapshot.breaker.call(
+            lambda: list(products_col.find({}, projection).limit(INDEX_INLINE_PRODUCTS + 1)),
+            lambda: (catalog_snapshot.products() or [])[:INDEX_INLINE_PRODUCTS + 1])
+    except Exception as e:
+        print('ERROR loading home page products:', e)
+        docs, degraded = None, False
+    if docs is None:
+        # Nothing to inline: products.js falls back to fetching /api/products
+        return [], None, degraded
+    complete = len(docs) <= INDEX_INLINE_PRODUCTS
+    products = [_with_image_url({f: d[f] for f in CARD_FIELDS if f in d}) for d in docs[:INDEX_INLINE_PRODUCTS]]
+    first_page = [dict(p, card_image=_card_image(p)) for p in products[:INDEX_FIRST_PAGE]]
+    state = fastjson.dumps_for_script({'products': products, 'complete': complete})
+    value = (first_page, state, degraded)
+    if not degraded:
+        _index_cache.update(at=time.monotonic(), value=value)
+    return value
+
+
+@bp.route('/')
 def index():
     if 'session_id' not in session:
         session['session_id'] = str(uuid.uuid4())
-    return render_template('index.html')
+    first_page, catalog_state, degraded = _index_catalog()
+    return render_template('index.html', degraded=degraded or catalog_snapshot.breaker.is_open(),
+                           first_page=first_page, catalog_state=catalog_state)
+
+
+# --- DEGRADED MODE ---
+# While the MongoDB circuit is open (see catalog_snapshot.py) the catalog is served
+# from the local snapshot and anything that would write is refused up front.
+# These POSTs only touch the session or in-process state, never MongoDB
+DEGRADED_ALLOWED_POSTS = {'/api/chatbot', '/api/logout'}
+
+
+@bp.before_app_request
+def _refuse_writes_when_degraded():
+    if (catalog_snapshot.breaker.is_open() and request.method not in ('GET', 'HEAD', 'OPTIONS')
+            and request.path.startswith('/api/') and request.path not in DEGRADED_ALLOWED_POSTS):
+        resp = jsonify({'success': False, 'degraded': True,
+                        'message': 'The store is temporarily read-only. Please try again in a few minutes.'})
+        resp.status_code = 503
+        resp.headers['Retry-After'] = str(int(catalog_snapshot.BREAKER_PROBE_SECONDS) or 1)
+        return resp
+
+
+def _snapshot_headers(resp, degraded):
+    resp.headers.update(catalog_snapshot.response_headers(degraded))
+    return resp
+
+
+
+# --- HEALTH / READINESS ---
+@bp.route('/healthz')
+def healthz():
+    return jsonify({'status': 'ok'})
+
+
+@bp.route('/readyz')
+def readyz():
+    """Ready when MongoDB answers a ping; the chatbot warming up does not block readiness."""
+    mongo_ok = db.ping(timeout_ms=500)
+    # With a snapshot loaded the catalog stays browsable, so keep taking traffic
+    snapshot = catalog_snapshot.current()
+    ready = mongo_ok or snapshot is not None
+    body = {
+        'ready': ready,
+        'mongo': mongo_ok,
+        'degraded': not mongo_ok or catalog_snapshot.breaker.is_open(),
+        'breaker': catalog_snapshot.breaker.state,
+        'snapshot_version': snapshot['version'] if snapshot else None,
+        'chatbot': chatbot_backend.is_ready(),
+    }
+    return jsonify(body), (200 if ready else 503)
+
+
+@bp.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint; set METRICS_TOKEN to require a bearer token."""
+    token = os.getenv('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return ('', 401)
+    return current_app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
+def _chatbot_gauges():
+    stats = chat_executor.stats()
+    yield ('chatbot_executor_queue_depth', 'Chatbot turns waiting for a worker.', {}, stats['queue_depth'])
+    yield ('chatbot_executor_running', 'Chatbot turns currently running.', {}, stats['running'])
+    for name in ('submitted', 'completed', 'rejected', 'timed_out', 'cancelled'):
+        yield ('chatbot_executor_jobs', 'Chatbot executor job counts by outcome.', {'outcome': name}, stats[name])
+    for route, n in chatbot_router.stats()['routes'].items():
+        yield ('chatbot_turns', 'Chatbot turns by route.', {'route': route}, n)
+    yield ('chatbot_ready', 'Whether the chatbot stack is built.', {}, int(chatbot_backend.is_ready()))
 
-@app.route('/login/')
+
+metrics.register_gauges(_chatbot_gauges)
+metrics.register_gauges(catalog_snapshot.gauges)
+metrics.register_gauges(popularity.gauges)
+
+
+@bp.route('/login/')
 def login():
     return render_template('login.html')
 
 # --- LOGIN API ---
-@app.route('/api/login', methods=['POST'])
+@bp.route('/api/login', methods=['POST'])
 def api_login():
     data = request.json
     email = data.get('email','').strip().lower()
@@ -113,13 +226,13 @@ def api_login():
     return jsonify({'success': False, 'message': 'Invalid email or password.'}), 401
 
 # --- LOGOUT API ---
-@app.route('/api/logout', methods=['POST'])
+@bp.route('/api/logout', methods=['POST'])
 def api_logout():
     session.clear()
     return jsonify({'success': True})
 
 # --- REGISTER API ---
-@app.route('/api/register', methods=['POST'])
+@bp.route('/api/register', methods=['POST'])
 def api_register():
     data = request.json
     name = data.get('name')
@@ -133,7 +246,6 @@ def api_register():
             'name': name,
             'email': email,
             'password_hash': password_hash,
-            'reset_code': None,
             'role': 'user'
         })
         return jsonify({'success': True, 'message': 'Registration successful! You can now log in.'})
@@ -199,7 +311,8 @@ def send_email(to_email, subject, body):
 
 def send_reset_email(to_email, code):
     subject = "Your Password Reset Code"
-    body = f"Your verification code is: {code}\n\nThis code will expire in 15 minutes. If you didn't request this, ignore this email." 
+    minutes = otp.OTP_TTL_SECONDS // 60
+    body = f"Your verification code is: {code}\n\nThis code will expire in {minutes} minutes. If you didn't request this, ignore this email." 
     return send_email(to_email, subject, body)
 
 
@@ -208,61 +321,60 @@ def send_password_changed_email(to_email):
     body = "Your account password was recently updated. If you did not perform this action, please contact support immediately."
     return send_email(to_email, subject, body)
 
-@app.route('/api/forgot-password', methods=['POST'])
+@bp.route('/api/forgot-password', methods=['POST'])
 def api_forgot_password():
     try:
-        # Check database connection
-        # Explicit None check (PyMongo Collection objects do not support truth value testing)
-        if users_col is None:
-            return jsonify({'success': False, 'message': 'Database not available'}), 500
-            
         data = request.json
-        email = data.get('email')
-        user = users_col.find_one({'email': email})
+        email = (data.get('email') or '').strip().lower()
+        user = users_col.find_one({'email': email}, {'_id': 1})
         if user:
-            code = str(random.randint(100000, 999999))
-            # expiry 15 minutes from now
-            expiry_ts = int((datetime.utcnow() + timedelta(minutes=15)).timestamp())
-            users_col.update_one({'_id': user['_id']}, {'$set': {'reset_code': code, 'reset_code_expires': expiry_ts}})
-            send_reset_email(email, code)
+            # Codes live in their own TTL-indexed collection (see otp.py)
+            code = otp.issue(email, otp.PASSWORD_RESET)
+            if code:
+                send_reset_email(email, code)
         return jsonify({'success': True, 'message': 'If your email exists, you will receive a code.'})
     except Exception as e:
         import traceback
         print('ERROR in /api/forgot-password:', traceback.format_exc())  # This will print detailed error in terminal
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/reset-password', methods=['POST'])
+
+_OTP_ERRORS = {
+    otp.MISSING: ('Invalid code or email.', 400),
+    otp.INVALID: ('Invalid verification code.', 400),
+    otp.EXPIRED: ('Verification code expired.', 400),
+    otp.LOCKED: ('Too many attempts. Please try again later.', 429),
+}
+
+
+def _otp_error(status):
+    message, code = _OTP_ERRORS[status]
+    return jsonify({'success': False, 'message': message}), code
+
+
+@bp.route('/api/reset-password', methods=['POST'])
 def api_reset_password():
     data = request.json
-    email = data.get('email')
+    email = (data.get('email') or '').strip().lower()
     code = data.get('code')
     new_password = data.get('newPassword')
     # Validate inputs
     if not email or not code or not new_password:
         return jsonify({'success': False, 'message': 'Missing parameters.'}), 400
 
-    user = users_col.find_one({'email': email})
-    if not user or 'reset_code' not in user or not user.get('reset_code'):
-        return jsonify({'success': False, 'message': 'Invalid code or email.'}), 400
-
-    # Check code match
-    if str(user.get('reset_code')) != str(code):
-        return jsonify({'success': False, 'message': 'Invalid verification code.'}), 400
-
-    # Check expiry
-    expires_ts = user.get('reset_code_expires')
-    if expires_ts:
-        if int(datetime.utcnow().timestamp()) > int(expires_ts):
-            return jsonify({'success': False, 'message': 'Verification code expired.'}), 400
+    status = otp.verify(email, code, otp.PASSWORD_RESET, consume=True)
+    if status != otp.OK:
+        return _otp_error(status)
 
     # All good, update password
     try:
-        users_col.update_one({'_id': user['_id']}, {
+        result = users_col.update_one({'email': email}, {
             '$set': {
                 'password_hash': generate_password_hash(new_password),
-            },
-            '$unset': {'reset_code': '', 'reset_code_expires': ''}
+            }
         })
+        if not result.matched_count:
+            return jsonify({'success': False, 'message': 'Invalid code or email.'}), 400
         # Send notification email (best-effort)
         try:
             send_password_changed_email(email)
@@ -275,25 +387,20 @@ def api_reset_password():
         return jsonify({'success': False, 'message': 'Failed to update password.'}), 500
 
 
-@app.route('/api/verify-reset-code', methods=['POST'])
+@bp.route('/api/verify-reset-code', methods=['POST'])
 def api_verify_reset_code():
     """Verify OTP code without resetting password yet."""
     data = request.json
-    email = data.get('email')
+    email = (data.get('email') or '').strip().lower()
     code = data.get('code')
     if not email or not code:
         return jsonify({'success': False, 'message': 'Missing parameters.'}), 400
-    user = users_col.find_one({'email': email})
-    if not user or not user.get('reset_code'):
-        return jsonify({'success': False, 'message': 'Invalid code or email.'}), 400
-    if str(user.get('reset_code')) != str(code):
-        return jsonify({'success': False, 'message': 'Invalid verification code.'}), 400
-    expires_ts = user.get('reset_code_expires')
-    if expires_ts and int(datetime.utcnow().timestamp()) > int(expires_ts):
-        return jsonify({'success': False, 'message': 'Verification code expired.'}), 400
+    status = otp.verify(email, code, otp.PASSWORD_RESET)
+    if status != otp.OK:
+        return _otp_error(status)
     return jsonify({'success': True, 'message': 'Code verified. You may reset your password now.'})
 
-@app.route('/api/check-auth')
+@bp.route('/api/check-auth')
 def check_auth():
     if session.get('user_id'):
         try:
@@ -312,7 +419,15 @@ def check_auth():
 
 
 #--CHATBOT API--
-@app.route('/api/chatbot', methods=['POST'])
+def _server_timing(timings):
+    """Render chatbot stage timings (seconds) as a Server-Timing header value."""
+    parts = [f"{stage};dur={timings[stage] * 1000:.1f}"
+             for stage in ('retrieval', 'reformulation', 'generation', 'total') if stage in timings]
+    if timings.get('route'):
+        parts.append(f'route;desc="{timings["route"]}"')
+    return ', '.join(parts)
+
+@bp.route('/api/chatbot', methods=['POST'])
 def chatbot():
     try:
         data = request.get_json()
@@ -321,46 +436,282 @@ def chatbot():
         # Get the session ID from the user's session
         session_id = session.get('session_id', 'default')
         
-        # Get response from the chatbot
-        response = get_chatbot_response(message, session_id)
-        
-        return jsonify({'response': response})
+        if chatbot_backend.CHATBOT_READY and not chatbot_backend.is_ready():
+            # Catalog lookups don't need the LLM stack; answer them right away
+            answer = chatbot_backend.answer_without_stack(message, session_id)
+            if answer is not None:
+                return jsonify({'response': answer})
+            chatbot_backend.warm_up()  # no-op while a failed build is backing off
+            if chatbot_backend.stack_state() == 'unavailable':
+                resp = jsonify({'response': 'Sorry, the assistant is unavailable right now. Please try again later.',
+                                'unavailable': True})
+                resp.headers['Retry-After'] = str(max(1, math.ceil(chatbot_backend.retry_in())))
+                return resp, 503
+            resp = jsonify({'response': 'The assistant is warming up. Please try again in a few seconds.',
+                            'warming_up': True})
+            resp.headers['Retry-After'] = '3'
+            return resp, 503
+
+        # Run the chain on the bounded chatbot executor, not on this request thread
+        timings = {}
+        try:
+            job = chat_executor.submit(get_chatbot_response, message, session_id, timings=timings)
+        except QueueFull:
+            resp = jsonify({'response': "I'm answering a lot of questions right now. Please try again in a moment."})
+            resp.headers['Retry-After'] = '2'
+            return resp, 429
+        except PoolClosed:
+            return jsonify({'response': 'The assistant is restarting. Please try again shortly.'}), 503
+
+        environ = request.environ
+        try:
+            response = job.wait(CHATBOT_TIMEOUT_SECONDS, disconnected=lambda: client_disconnected(environ))
+        except JobTimeout:
+            chat_executor.count('timed_out')
+            return jsonify({'response': 'Sorry, that took too long to answer. Please try again.'}), 504
+        except ClientGone:
+            chat_executor.count('cancelled')
+            return ('', 499)
+
+        resp = jsonify({'response': response})
+        resp.headers['Server-Timing'] = _server_timing(timings)
+        return resp
     except Exception as e:
         print(f"Error in chatbot endpoint: {e}")
         return jsonify({'response': "Sorry, I'm having trouble processing your request right now."}), 500
 
 
+@bp.route('/api/chatbot/stats')
+def chatbot_stats():
+    if not _require_admin():
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    stats = get_chatbot_stats()
+    stats['executor'] = chat_executor.stats()
+    return jsonify(stats)
+
+
 
 # --- PRODUCTS API ---
-@app.route('/api/products', methods=['GET'])
+def _with_image_url(d):
+    if d.get('image_file_id'):
+        d['image_url'] = f"/api/products/{d['id']}/image"
+    return d
+
+
+# One change-stream watcher per process, shared by every open /api/products/stream
+products_feed = product_feed.ProductFeed(products_col, transform=_with_image_url)
+metrics.register_gauges(products_feed.gauges)
+
+
+@bp.route('/api/products', methods=['GET'])
 def api_products():
     try:
-        # Return all products (exclude Mongo _id)
-        raw_docs = list(products_col.find({}, {'_id': 0}))
+        # Return all products (exclude Mongo _id); fall back to the local snapshot
+        raw_docs, degraded = catalog_snapshot.breaker.call(
+            lambda: list(products_col.find({}, {'_id': 0})), catalog_snapshot.products)
+        if raw_docs is None:
+            return jsonify([]), 503
         docs = []
         for d in raw_docs:
-            if d.get('image_file_id'):
-                d['image_url'] = f"/api/products/{d['id']}/image"
-            docs.append(d)
-        return jsonify(docs)
+            if degraded:
+                d = dict(d)  # snapshot products are shared; don't mutate them
+            docs.append(_with_image_url(d))
+        return _snapshot_headers(jsonify(docs), degraded)
     except Exception as e:
         print('ERROR in /api/products:', e)
         return jsonify([]), 500
 
-@app.route('/api/products/<int:pid>/image')
+@bp.route('/api/suggest')
+def api_suggest():
+    """Typeahead suggestions for the search box from the in-process prefix index."""
+    q = request.args.get('q', '')[:100]
+    try:
+        limit = max(1, min(int(request.args.get('limit', 8)), suggest.MAX_LIMIT))
+    except ValueError:
+        limit = 8
+    try:
+        suggest.ensure_fresh()
+    except Exception as e:
+        print('ERROR building suggest index:', e)
+    t0 = time.perf_counter()
+    items = suggest.index.suggest(q, limit)
+    took_ms = (time.perf_counter() - t0) * 1000
+    resp = jsonify({'query': q, 'suggestions': items})
+    resp.headers['Server-Timing'] = f'suggest;dur={took_ms:.3f}'
+    resp.headers['Cache-Control'] = 'public, max-age=30'
+    return resp
+
+
+def _suggest_scores():
+    # Rank by recorded views and cart adds; fall back to cart contents until there are any
+    return popularity.scores() or suggest.cart_counts()
+
+
+suggest.score_source = _suggest_scores
+
+
+def _window_args():
+    try:
+        hours = max(1, min(int(request.args.get('hours', 24)), popularity.POPULARITY_RETENTION_DAYS * 24))
+        limit = max(1, min(int(request.args.get('limit', 10)), popularity.MAX_LIMIT))
+    except ValueError:
+        return None, None
+    return hours, limit
+
+
+@bp.route('/api/products/popular')
+def api_products_popular():
+    """Most viewed / added products over the last ``hours`` (from the popularity rollups)."""
+    hours, limit = _window_args()
+    metric = request.args.get('metric', 'score')
+    if hours is None or metric not in popularity.METRICS + ('score',):
+        return jsonify({'success': False, 'message': 'Invalid hours, limit or metric'}), 400
+    try:
+        items = popularity.popular(metric, hours, limit)
+    except Exception as e:
+        print('ERROR in /api/products/popular:', e)
+        return jsonify({'success': False, 'message': 'Popularity data unavailable'}), 503
+    return jsonify({'metric': metric, 'hours': hours, 'products': [_with_image_url(d) for d in items]})
+
+
+@bp.route('/api/products/trending')
+def api_products_trending():
+    """Products doing unusually well in the last ``hours`` compared with the week before."""
+    hours, limit = _window_args()
+    if hours is None:
+        return jsonify({'success': False, 'message': 'Invalid hours or limit'}), 400
+    try:
+        items = popularity.trending(hours, limit)
+    except Exception as e:
+        print('ERROR in /api/products/trending:', e)
+        return jsonify({'success': False, 'message': 'Popularity data unavailable'}), 503
+    return jsonify({'hours': hours, 'products': [_with_image_url(d) for d in items]})
+
+
+def _catalog_changed():
+    """Refresh the derived catalog indexes after an admin write."""
+    chatbot_indexer.schedule_sync(products_col)
+    similarity.schedule_sync()
+    spec_store.invalidate()
+    _index_cache['value'] = None
+
+
+def _reindex_product(pid):
+    """Keep this process's suggestion index in step with an admin write."""
+    try:
+        doc = products_col.find_one({'id': pid}, {'_id': 0})
+        if doc:
+            suggest.index.upsert(doc)
+        else:
+            suggest.index.remove(pid)
+    except Exception as e:
+        print(f'Suggest index update failed for product {pid}: {e}')
+
+
+@bp.route('/api/products/stream')
+def api_products_stream():
+    """Server-Sent Events feed of product upserts/deletes (see product_feed.py)."""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    try:
+        sub = products_feed.subscribe(last_event_id)
+    except product_feed.TooManySubscribers:
+        resp = jsonify({'success': False, 'message': 'Too many live connections; poll /api/products instead.'})
+        resp.status_code = 503
+        resp.headers['Retry-After'] = '60'
+        return resp
+    return current_app.response_class(product_feed.sse_stream(products_feed, sub), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # stop nginx from buffering the stream
+    })
+
+
+SIMILAR_ON_PAGE = 8
+
+
+@bp.route('/api/products/<int:pid>/similar')
+def api_product_similar(pid):
+    """Precomputed nearest products by specs (see similarity.py); a lookup, no scoring."""
+    try:
+        limit = max(1, min(int(request.args.get('limit', similarity.SIMILAR_K)), similarity.SIMILAR_K))
+    except ValueError:
+        limit = similarity.SIMILAR_K
+    try:
+        items = similarity.similar(pid, limit)
+    except Exception as e:
+        print('ERROR in /api/products/similar:', e)
+        return jsonify({'success': False, 'message': 'Similar products unavailable'}), 503
+    if items is None:
+        if not similarity.is_ready():
+            return jsonify({'success': False, 'message': 'Similar products unavailable'}), 503
+        return jsonify({'success': False, 'message': 'No similar products for this product'}), 404
+    return jsonify({'product_id': pid, 'similar': items})
+
+
+@bp.route('/api/phones/filter')
+def api_phones_filter():
+    """Phones matching range predicates, e.g. ``?ram_gb_min=8&battery_mah_min=5000&price_max=500``."""
+    try:
+        query = spec_store.parse_query(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    try:
+        table = spec_store.current()
+    except Exception as e:
+        print('ERROR in /api/phones/filter:', e)
+        return jsonify({'success': False, 'message': 'Phone specs unavailable'}), 503
+    t0 = time.perf_counter()
+    total, phones = table.filter(**query)
+    took_ms = (time.perf_counter() - t0) * 1000
+    resp = jsonify({'total': total, 'offset': query['offset'], 'limit': query['limit'], 'phones': phones})
+    resp.headers['Server-Timing'] = f'specs;dur={took_ms:.3f};desc="{len(table)} rows"'
+    return resp
+
+
+@bp.route('/api/phones/compare')
+def api_phones_compare():
+    """Side-by-side specs for ``?keys=p:12,csv:3`` with the best value per attribute."""
+    keys = [k.strip() for k in request.args.get('keys', '').split(',') if k.strip()]
+    if not 2 <= len(keys) <= spec_store.MAX_COMPARE:
+        return jsonify({'success': False, 'message': f'Pass 2 to {spec_store.MAX_COMPARE} phone keys'}), 400
+    try:
+        table = spec_store.current()
+    except Exception as e:
+        print('ERROR in /api/phones/compare:', e)
+        return jsonify({'success': False, 'message': 'Phone specs unavailable'}), 503
+    rows = [table.find(k) for k in keys]
+    missing = [k for k, r in zip(keys, rows) if r is None]
+    if missing:
+        return jsonify({'success': False, 'message': 'Unknown phones: ' + ', '.join(missing)}), 404
+    phones, best = table.compare(rows)
+    return jsonify({'attributes': list(spec_store.ATTRIBUTES), 'phones': phones, 'best': best})
+
+
+@bp.route('/api/products/<int:pid>/image')
 def api_product_image(pid):
     try:
-        prod = products_col.find_one({'id': pid})
-        if not prod or not prod.get('image_file_id'):
-            return ('', 404)
-        from bson import ObjectId
-        try:
-            file_obj = fs.get(ObjectId(prod['image_file_id']))
-        except Exception:
-            return ('', 404)
-        data = file_obj.read()
-        mime = file_obj.content_type or 'application/octet-stream'
-        return app.response_class(data, mimetype=mime, headers={
+        def from_gridfs():
+            prod = products_col.find_one({'id': pid})
+            if not prod or not prod.get('image_file_id'):
+                return None
+            try:
+                file_obj = fs.get(ObjectId(prod['image_file_id']))
+            except gridfs_errors.NoFile:
+                return None
+            return file_obj.read(), file_obj.content_type or 'application/octet-stream'
+
+        def from_snapshot():
+            cached = catalog_snapshot.image_path(pid)
+            if not cached:
+                return None
+            with open(cached[0], 'rb') as f:
+                return f.read(), cached[1]
+
+        image, degraded = catalog_snapshot.breaker.call(from_gridfs, from_snapshot)
+        if image is None:
+            return ('', 503 if degraded else 404)
+        data, mime = image
+        popularity.record(pid, popularity.IMAGE_HIT)
+        return current_app.response_class(data, mimetype=mime, headers={
             'Cache-Control': 'public, max-age=86400'
         })
     except Exception as e:
@@ -369,7 +720,7 @@ def api_product_image(pid):
 
 
 # --- ADMIN PAGE ---
-@app.route('/admin/')
+@bp.route('/admin/')
 @admin_required
 def admin():
     return render_template('admin.html')
@@ -390,12 +741,71 @@ def _save_image_gridfs(file_storage):
     if not _allowed_image(file_storage.filename):
         return None, 'Unsupported file type'
     try:
-        file_id = fs.put(file_storage.stream.read(), filename=file_storage.filename, contentType=file_storage.mimetype)
+        # put() copies a file-like object a GridFS chunk at a time instead of reading it whole
+        file_id = fs.put(file_storage.stream, filename=file_storage.filename, contentType=file_storage.mimetype)
         return str(file_id), None
     except Exception as e:
         return None, f'Failed saving file: {e}'
 
-@app.route('/api/products', methods=['POST'])
+# --- CHUNKED MEDIA UPLOADS (admin) ---
+# Files larger than MAX_CONTENT_LENGTH go up in parts; see uploads.py
+def _upload_error(e):
+    return jsonify({'success': False, 'message': str(e)}), e.status
+
+@bp.route('/api/admin/uploads', methods=['POST'])
+def api_upload_create():
+    if not _require_admin():
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    data = request.get_json(silent=True) or {}
+    try:
+        upload = uploads.create(data.get('filename'), data.get('size'), sha256=data.get('sha256'),
+                                content_type=data.get('content_type'), owner=session.get('user_id'))
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    return jsonify(uploads.public(upload)), 201
+
+@bp.route('/api/admin/uploads/<upload_id>')
+def api_upload_status(upload_id):
+    if not _require_admin():
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    try:
+        return jsonify(uploads.public(uploads.get(upload_id)))
+    except uploads.UploadError as e:
+        return _upload_error(e)
+
+@bp.route('/api/admin/uploads/<upload_id>/parts/<int:index>', methods=['PUT'])
+def api_upload_part(upload_id, index):
+    if not _require_admin():
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    try:
+        upload = uploads.get(upload_id)
+        if 0 <= index < upload['parts'] and request.content_length != uploads.part_length(upload, index):
+            return jsonify({'success': False, 'message': f'Content-Length must be {uploads.part_length(upload, index)}'}), 400
+        upload = uploads.write_part(upload_id, index, request.stream, sha256=request.headers.get('X-Part-Sha256'))
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    return jsonify({'success': True, 'received': len(upload['received']), 'parts': upload['parts']})
+
+@bp.route('/api/admin/uploads/<upload_id>/complete', methods=['POST'])
+def api_upload_complete(upload_id):
+    if not _require_admin():
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    try:
+        return jsonify(uploads.public(uploads.complete(upload_id)))
+    except uploads.UploadError as e:
+        return _upload_error(e)
+
+@bp.route('/api/admin/uploads/<upload_id>', methods=['DELETE'])
+def api_upload_abort(upload_id):
+    if not _require_admin():
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    try:
+        uploads.abort(upload_id)
+    except uploads.UploadError as e:
+        return _upload_error(e)
+    return jsonify({'success': True})
+
+@bp.route('/api/products', methods=['POST'])
 def api_products_create():
     if not _require_admin():
         return jsonify({'success': False, 'message': 'Unauthorized'}), 401
@@ -434,14 +844,16 @@ def api_products_create():
         required = ['id', 'title', 'image', 'price', 'category']
         missing = [k for k in required if k not in data]
         if missing:
-            return jsonify({'success': False, 'message': f'Missing fields: {', '.join(missing)}'}), 400
+            return jsonify({'success': False, 'message': 'Missing fields: ' + ', '.join(missing)}), 400
     try:
         products_col.update_one({'id': data['id']}, {'$set': data}, upsert=True)
+        _catalog_changed()
+        _reindex_product(data['id'])
         return jsonify({'success': True, 'data': {'image_file_id': data.get('image_file_id')}})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/products/<int:pid>', methods=['PUT'])
+@bp.route('/api/products/<int:pid>', methods=['PUT'])
 def api_products_update(pid):
     if not _require_admin():
         return jsonify({'success': False, 'message': 'Unauthorized'}), 401
@@ -478,38 +890,100 @@ def api_products_update(pid):
         data = request.get_json(force=True) or {}
     try:
         products_col.update_one({'id': pid}, {'$set': data}, upsert=False)
+        _catalog_changed()
+        _reindex_product(pid)
         return jsonify({'success': True, 'data': {'image_file_id': data.get('image_file_id')}})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/products/<int:pid>', methods=['DELETE'])
+@bp.route('/api/products/<int:pid>', methods=['DELETE'])
 def api_products_delete(pid):
     if not _require_admin():
         return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     try:
         products_col.delete_one({'id': pid})
+        _catalog_changed()
+        suggest.index.remove(pid)
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+# --- ADMIN BULK EXPORT / IMPORT ---
+@bp.route('/api/admin/products/export')
+def api_products_export():
+    """Stream the catalog as CSV (default) or NDJSON straight from a Mongo cursor."""
+    if not _require_admin():
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'success': False, 'message': 'format must be csv or ndjson'}), 400
+    query = {}
+    if request.args.get('category'):
+        query['category'] = request.args['category']
+    cursor = products_col.find(query, {'_id': 0}).sort('id', 1).batch_size(1000)
+    body = catalog_io.iter_csv(cursor) if fmt == 'csv' else catalog_io.iter_ndjson(cursor)
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    filename = f"products-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    return current_app.response_class(stream_with_context(body), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Cache-Control': 'no-store',
+    })
+
+
+@bp.route('/api/admin/products/import', methods=['POST'])
+def api_products_import():
+    """Validate and upsert many products at once (CSV, NDJSON or JSON array; raw body or 'file' upload)."""
+    if not _require_admin():
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    upload = request.files.get('file')
+    if upload:
+        stream, name, ctype = upload.stream, (upload.filename or '').lower(), upload.mimetype or ''
+    else:
+        stream, name, ctype = request.stream, '', request.mimetype or ''
+    fmt = request.args.get('format')
+    if not fmt:
+        if name.endswith('.csv') or 'csv' in ctype:
+            fmt = 'csv'
+        elif name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in ctype:
+            fmt = 'ndjson'
+        else:
+            fmt = 'json'
+    dry_run = request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+    try:
+        summary = catalog_io.import_rows(products_col, catalog_io.read_rows(stream, fmt), dry_run=dry_run)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({'success': False, 'message': f'Could not parse {fmt} upload: {e}'}), 400
+    if not dry_run and (summary['inserted'] or summary['updated']):
+        _catalog_changed()
+        suggest.invalidate()
+    return jsonify(dict(summary, success=summary['error_count'] == 0))
+
+
 # (admin-login removed; unified to /api/login and /login/)
 
 
-@app.route('/product/')
+@bp.route('/product/')
 def product_index():
     # Keep backward compatibility: redirect to home (use /product/<id> for details)
-    return redirect(url_for('index'))
+    return redirect(url_for('store.index'))
 
 
-@app.route('/product/<int:pid>')
+@bp.route('/product/<int:pid>')
 def product_detail(pid):
+    def from_snapshot():
+        prod = catalog_snapshot.find_product(pid)
+        return dict(prod) if prod else None
+
     try:
-        prod = products_col.find_one({'id': pid}, {'_id': 0})
+        prod, degraded = catalog_snapshot.breaker.call(
+            lambda: products_col.find_one({'id': pid}, {'_id': 0}), from_snapshot)
     except Exception:
-        prod = None
+        prod, degraded = None, False
     if not prod:
-        return render_template('product.html', product=None), 404
+        # Degraded with no snapshot at all: we can't tell whether the product exists
+        unknown = degraded and catalog_snapshot.current() is None
+        return render_template('product.html', product=None, degraded=degraded), (503 if unknown else 404)
 
     # Provide image_url when using GridFS
     if prod.get('image_file_id'):
@@ -528,250 +1002,92 @@ def product_detail(pid):
     if not images:
         images.append('/static/images/products/placeholder.png')
 
+    popularity.record(pid, popularity.VIEW)
+    try:
+        similar = similarity.similar(pid, SIMILAR_ON_PAGE)
+    except Exception as e:
+        print(f'Similar products unavailable for {pid}: {e}')
+        similar = None
     prod['images'] = images
     prod['price'] = float(prod.get('price', 0))
     prod['description'] = prod.get('description', '')
     # Normalize specs: allow stored dict or string (key:value lines or JSON)
-    raw_specs = prod.get('specs', '')
-    specs_obj = {}
-    if isinstance(raw_specs, dict):
-        specs_obj = raw_specs
-    elif isinstance(raw_specs, str) and raw_specs.strip():
-        # try JSON
-        try:
-            import json
-            parsed = json.loads(raw_specs)
-            if isinstance(parsed, dict):
-                specs_obj = parsed
-            else:
-                specs_obj = {}
-        except Exception:
-            # parse key:value lines
-            for line in raw_specs.splitlines():
-                if ':' in line:
-                    k, v = line.split(':', 1)
-                    specs_obj[k.strip()] = v.strip()
-    prod['specs'] = specs_obj
+    prod['specs'] = parse_specs(prod.get('specs', ''))
 
-    return render_template('product.html', product=prod)
+    page = render_template('product.html', product=prod, similar=similar or [], degraded=degraded)
+    return _snapshot_headers(current_app.make_response(page), degraded)
 
-@app.route('/cart/')
+@bp.route('/cart/')
 @login_required
 def cart():
     return render_template('cart.html')
  
 
 # --- USER DASHBOARD PAGE ---
-@app.route('/user-dashboard/')
+@bp.route('/user-dashboard/')
 @login_required
 def user_dashboard():
     return render_template('user_dashboard.html')
 
 
 # --- CART API ENDPOINTS ---
-@app.route('/api/cart/add', methods=['POST'])
+# The handlers live in cart_store.py, shared with async_app.py
+def _cart(op, *args):
+    body, status = op(cart_store.owner(session), *args)
+    return jsonify(body), status
+
+
+@bp.route('/api/cart/add', methods=['POST'])
 def api_cart_add():
-    try:
-        # Require authenticated user for cart actions
-        if not session.get('user_id'):
-            return jsonify({'success': False, 'message': 'Authentication required'}), 401
-        data = request.get_json()
-        product_id = data.get('product_id')
-        quantity = int(data.get('quantity', 1))
-        
-        if not product_id:
-            return jsonify({'success': False, 'message': 'Product ID required'}), 400
-        
-        # Get product details
-        product = products_col.find_one({'id': product_id}, {'_id': 0})
-        if not product:
-            return jsonify({'success': False, 'message': 'Product not found'}), 404
-        
-        # Get user identifier (session_id for guests, user_id for logged in)
-        user_identifier = session.get('user_id') if session.get('user_id') else session.get('session_id')
-        if not user_identifier:
-            session['session_id'] = str(uuid.uuid4())
-            user_identifier = session['session_id']
-        
-        # Check if item already in cart
-        existing_item = cart_col.find_one({
-            'user_identifier': user_identifier,
-            'product_id': product_id
-        })
-        
-        if existing_item:
-            # Update quantity
-            new_quantity = existing_item['quantity'] + quantity
-            cart_col.update_one(
-                {'_id': existing_item['_id']},
-                {'$set': {'quantity': new_quantity}}
-            )
-        else:
-            # Add new item
-            cart_item = {
-                'user_identifier': user_identifier,
-                'product_id': product_id,
-                    'product_title': product.get('title', ''),
-                    # Prefer image_url (GridFS) then image field then placeholder
-                    'product_image': product.get('image_url') or product.get('image') or '/static/images/products/placeholder.png',
-                    'product_price': float(product.get('price', 0)),
-                'quantity': quantity,
-                'added_at': ObjectId().generation_time
-            }
-            cart_col.insert_one(cart_item)
-        
-        # Get updated cart count
-        cart_count = cart_col.count_documents({'user_identifier': user_identifier})
-        
-        return jsonify({
-            'success': True,
-            'message': f'{product["title"]} added to cart!',
-            'cart_count': cart_count
-        })
-        
-    except Exception as e:
-        print(f"Error adding to cart: {e}")
-        return jsonify({'success': False, 'message': 'Failed to add item to cart'}), 500
+    return _cart(cart_store.add, request.get_json(silent=True))
 
 
-@app.route('/api/cart/get', methods=['GET'])
+@bp.route('/api/cart/get', methods=['GET'])
 def api_cart_get():
-    try:
-        # Require authenticated user for cart count/display: unauthenticated users should see 0
-        if not session.get('user_id'):
-            return jsonify({'cart_items': [], 'total': 0, 'count': 0}), 401
-        user_identifier = session.get('user_id') if session.get('user_id') else session.get('session_id')
-        if not user_identifier:
-            return jsonify({'cart_items': [], 'total': 0, 'count': 0})
-        
-        # Get cart items
-        cart_items = list(cart_col.find(
-            {'user_identifier': user_identifier},
-            {'_id': 0}
-        ))
-        
-        # Calculate total
-        total = sum(item['product_price'] * item['quantity'] for item in cart_items)
-        count = len(cart_items)
-        
-        return jsonify({
-            'cart_items': cart_items,
-            'total': round(total, 2),
-            'count': count
-        })
-        
-    except Exception as e:
-        print(f"Error getting cart: {e}")
-        return jsonify({'cart_items': [], 'total': 0, 'count': 0}), 500
+    return _cart(cart_store.get)
 
 
-@app.route('/api/cart/update', methods=['POST'])
+@bp.route('/api/cart/update', methods=['POST'])
 def api_cart_update():
-    try:
-        # Require authenticated user for cart actions
-        if not session.get('user_id'):
-            return jsonify({'success': False, 'message': 'Authentication required'}), 401
-        data = request.get_json()
-        product_id = data.get('product_id')
-        quantity = int(data.get('quantity', 1))
-        
-        if not product_id or quantity < 1:
-            return jsonify({'success': False, 'message': 'Invalid data'}), 400
-        
-        user_identifier = session.get('user_id') if session.get('user_id') else session.get('session_id')
-        if not user_identifier:
-            return jsonify({'success': False, 'message': 'Session not found'}), 400
-        
-        # Update quantity
-        result = cart_col.update_one(
-            {'user_identifier': user_identifier, 'product_id': product_id},
-            {'$set': {'quantity': quantity}}
-        )
-        
-        if result.matched_count == 0:
-            return jsonify({'success': False, 'message': 'Item not found in cart'}), 404
-        
-        # Get updated cart info
-        cart_items = list(cart_col.find({'user_identifier': user_identifier}, {'_id': 0}))
-        total = sum(item['product_price'] * item['quantity'] for item in cart_items)
-        count = len(cart_items)
-        
-        return jsonify({
-            'success': True,
-            'total': round(total, 2),
-            'count': count
-        })
-        
-    except Exception as e:
-        print(f"Error updating cart: {e}")
-        return jsonify({'success': False, 'message': 'Failed to update cart'}), 500
+    return _cart(cart_store.update, request.get_json(silent=True))
 
 
-@app.route('/api/cart/remove', methods=['POST'])
+@bp.route('/api/cart/remove', methods=['POST'])
 def api_cart_remove():
-    try:
-        # Require authenticated user for cart actions
-        if not session.get('user_id'):
-            return jsonify({'success': False, 'message': 'Authentication required'}), 401
-        data = request.get_json()
-        product_id = data.get('product_id')
-        
-        if not product_id:
-            return jsonify({'success': False, 'message': 'Product ID required'}), 400
-        
-        user_identifier = session.get('user_id') if session.get('user_id') else session.get('session_id')
-        if not user_identifier:
-            return jsonify({'success': False, 'message': 'Session not found'}), 400
-        
-        # Remove item
-        result = cart_col.delete_one({
-            'user_identifier': user_identifier,
-            'product_id': product_id
-        })
-        
-        if result.deleted_count == 0:
-            return jsonify({'success': False, 'message': 'Item not found in cart'}), 404
-        
-        # Get updated cart info
-        cart_items = list(cart_col.find({'user_identifier': user_identifier}, {'_id': 0}))
-        total = sum(item['product_price'] * item['quantity'] for item in cart_items)
-        count = len(cart_items)
-        
-        return jsonify({
-            'success': True,
-            'message': 'Item removed from cart',
-            'total': round(total, 2),
-            'count': count
-        })
-        
-    except Exception as e:
-        print(f"Error removing from cart: {e}")
-        return jsonify({'success': False, 'message': 'Failed to remove item'}), 500
+    return _cart(cart_store.remove, request.get_json(silent=True))
 
 
-@app.route('/api/cart/clear', methods=['POST'])
+@bp.route('/api/cart/clear', methods=['POST'])
 def api_cart_clear():
-    try:
-        # Require authenticated user for cart actions
-        if not session.get('user_id'):
-            return jsonify({'success': False, 'message': 'Authentication required'}), 401
-        user_identifier = session.get('user_id') if session.get('user_id') else session.get('session_id')
-        if not user_identifier:
-            return jsonify({'success': False, 'message': 'Session not found'}), 400
-        
-        # Clear all cart items
-        cart_col.delete_many({'user_identifier': user_identifier})
-        
-        return jsonify({
-            'success': True,
-            'message': 'Cart cleared',
-            'total': 0,
-            'count': 0
-        })
-        
-    except Exception as e:
-        print(f"Error clearing cart: {e}")
-        return jsonify({'success': False, 'message': 'Failed to clear cart'}), 500
+    return _cart(cart_store.clear)
+
+
+def create_app():
+    """Application factory.
+
+    Does no network I/O: the MongoDB client is created per process on first use,
+    so this is safe to call in each worker of a pre-fork server such as gunicorn.
+    """
+    app = Flask(__name__)
+    app.secret_key = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key')
+    app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5 MB upload limit (GridFS backend)
+    # Registered first so its after_request hook runs last and times the whole response
+    metrics.init_app(app)
+    profiling.init_app(app)
+    CORS(app)
+    fastjson.init_app(app)
+    compression.init_app(app)
+    app.register_blueprint(bp)
+
+    inventory.start_reaper()
+    catalog_snapshot.init()
+    popularity.start_flusher()
+    if CHATBOT_WARMUP in ('background', 'eager'):
+        chatbot_backend.warm_up(background=CHATBOT_WARMUP == 'background')
+    return app
+
+
+app = create_app()
 
 
 if __name__ == '__main__':
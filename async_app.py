@@ -0,0 +1,236 @@
+"""Async (ASGI) variant of the I/O-heavy storefront routes.
+
+Serves the same URLs and JSON shapes as app.py for the catalog, product
+images, the product page and the cart. It runs on Quart with the motor
+driver, so a request that is waiting on MongoDB or GridFS holds a coroutine
+instead of a thread:
+
+    hypercorn async_app:app --bind 0.0.0.0:5001 --workers 4
+
+It is meant to sit next to the Flask app behind a proxy that routes
+``/api/products``, ``/api/products/<id>/image``, ``/product/<id>`` and
+``/api/cart/*`` here. Everything else (login, admin, chatbot, the live feed)
+stays on app.py. Both apps sign sessions with ``FLASK_SECRET_KEY``, so a
+login on one is valid on the other.
+
+The cart handlers and stock reservations are the ones in cart_store.py and
+inventory.py, driven through motor with ``db.run_async``, so the two apps
+serve carts from the same code and can do so at the same time. Views, image
+hits and cart adds are counted through popularity.py just as in app.py.
+"""
+import asyncio
+import os
+
+from bson.objectid import ObjectId
+from dotenv import load_dotenv
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from quart import Blueprint, Quart, current_app, render_template, request, session
+
+import cart_store
+import catalog_snapshot
+import db
+import fastjson
+import popularity
+import similarity
+from phone_specs import parse_specs
+
+
+load_dotenv()
+
+bp = Blueprint('store', __name__)
+
+_client = None
+
+
+def get_db():
+    return _client.get_database(db.MONGO_DB_NAME)
+
+
+def jsonify(data):
+    return current_app.response_class(fastjson.dumps(data), mimetype=fastjson.MIMETYPE)
+
+
+def _with_image_url(d):
+    if d.get('image_file_id'):
+        d['image_url'] = f"/api/products/{d['id']}/image"
+    return d
+
+
+# --- Catalog ---
+# Reads go through the same circuit breaker and local snapshot as app.py, so
+# these routes degrade to the snapshot together with the rest of the store.
+
+SIMILAR_ON_PAGE = 8
+
+
+def _snapshot_headers(resp, degraded):
+    resp.headers.update(catalog_snapshot.response_headers(degraded))
+    return resp
+
+
+@bp.route('/api/products', methods=['GET'])
+async def api_products():
+    try:
+        raw_docs, degraded = await catalog_snapshot.breaker.call_async(
+            lambda: get_db().products.find({}, {'_id': 0}).to_list(None), catalog_snapshot.products)
+        if raw_docs is None:
+            return jsonify([]), 503
+        docs = [_with_image_url(dict(d) if degraded else d) for d in raw_docs]
+        return _snapshot_headers(jsonify(docs), degraded)
+    except Exception as e:
+        print('ERROR in /api/products:', e)
+        return jsonify([]), 500
+
+
+def _read_cached_image(pid):
+    cached = catalog_snapshot.image_path(pid)
+    if not cached:
+        return None
+    with open(cached[0], 'rb') as f:
+        return f.read(), cached[1]
+
+
+@bp.route('/api/products/<int:pid>/image')
+async def api_product_image(pid):
+    async def from_gridfs():
+        prod = await get_db().products.find_one({'id': pid}, {'image_file_id': 1})
+        if not prod or not prod.get('image_file_id'):
+            return None
+        try:
+            grid_out = await AsyncIOMotorGridFSBucket(get_db()).open_download_stream(ObjectId(prod['image_file_id']))
+        except NoFile:
+            return None
+        return await grid_out.read(), grid_out.content_type or 'application/octet-stream'
+
+    try:
+        image, degraded = await catalog_snapshot.breaker.call_async(from_gridfs, lambda: None)
+        if degraded:
+            image = await asyncio.to_thread(_read_cached_image, pid)
+        if image is None:
+            return ('', 503 if degraded else 404)
+        data, mime = image
+        popularity.record(pid, popularity.IMAGE_HIT)
+        return current_app.response_class(data, mimetype=mime, headers={
+            'Cache-Control': 'public, max-age=86400'
+        })
+    except Exception as e:
+        print('ERROR serving product image:', e)
+        return ('', 500)
+
+
+@bp.route('/product/<int:pid>')
+async def product_detail(pid):
+    def from_snapshot():
+        prod = catalog_snapshot.find_product(pid)
+        return dict(prod) if prod else None
+
+    try:
+        prod, degraded = await catalog_snapshot.breaker.call_async(
+            lambda: get_db().products.find_one({'id': pid}, {'_id': 0}), from_snapshot)
+    except Exception:
+        prod, degraded = None, False
+    if not prod:
+        # Degraded with no snapshot at all: we can't tell whether the product exists
+        unknown = degraded and catalog_snapshot.current() is None
+        return await render_template('product.html', product=None, degraded=degraded), (503 if unknown else 404)
+
+    # Same shaping as app.product_detail
+    if prod.get('image_file_id'):
+        prod['image_url'] = f"/api/products/{pid}/image"
+    images = []
+    if prod.get('image_url'):
+        images.append(prod['image_url'])
+    if prod.get('image'):
+        img = prod.get('image')
+        if isinstance(img, str) and img.startswith('./images/'):
+            images.append('/static' + img[1:])
+        else:
+            images.append(img)
+    if not images:
+        images.append('/static/images/products/placeholder.png')
+
+    popularity.record(pid, popularity.VIEW)
+    try:
+        # The first call loads the neighbour table with the sync driver; keep it off the loop
+        similar = await asyncio.to_thread(similarity.similar, pid, SIMILAR_ON_PAGE)
+    except Exception as e:
+        print(f'Similar products unavailable for {pid}: {e}')
+        similar = None
+    prod['images'] = images
+    prod['price'] = float(prod.get('price', 0))
+    prod['description'] = prod.get('description', '')
+    prod['specs'] = parse_specs(prod.get('specs', ''))
+
+    page = await render_template('product.html', product=prod, similar=similar or [], degraded=degraded)
+    return _snapshot_headers(await current_app.make_response(page), degraded)
+
+
+# --- Cart (handlers shared with app.py, run under motor) ---
+
+async def _cart(op, *args):
+    body, status = await db.run_async(op.steps(cart_store.owner(session), *args), get_db())
+    return jsonify(body), status
+
+
+@bp.route('/api/cart/add', methods=['POST'])
+async def api_cart_add():
+    return await _cart(cart_store.add, await request.get_json(silent=True))
+
+
+@bp.route('/api/cart/get', methods=['GET'])
+async def api_cart_get():
+    return await _cart(cart_store.get)
+
+
+@bp.route('/api/cart/update', methods=['POST'])
+async def api_cart_update():
+    return await _cart(cart_store.update, await request.get_json(silent=True))
+
+
+@bp.route('/api/cart/remove', methods=['POST'])
+async def api_cart_remove():
+    return await _cart(cart_store.remove, await request.get_json(silent=True))
+
+
+@bp.route('/api/cart/clear', methods=['POST'])
+async def api_cart_clear():
+    return await _cart(cart_store.clear)
+
+
+@bp.route('/healthz')
+async def healthz():
+    return jsonify({'status': 'ok'})
+
+
+def create_app():
+    app = Quart(__name__)
+    app.secret_key = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key')
+
+    @app.before_serving
+    async def _connect():
+        # One motor client per worker, bound to that worker's event loop
+        global _client
+        _client = AsyncIOMotorClient(
+            db.MONGO_URI,
+            maxPoolSize=db.MONGO_MAX_POOL_SIZE,
+            minPoolSize=db.MONGO_MIN_POOL_SIZE,
+            waitQueueTimeoutMS=db.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            serverSelectionTimeoutMS=db.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            connectTimeoutMS=db.MONGO_CONNECT_TIMEOUT_MS,
+            readPreference=db.MONGO_READ_PREFERENCE,
+        )
+        # The snapshot, its breaker probe and the counter flush use the sync driver on their own threads
+        catalog_snapshot.init()
+        popularity.start_flusher()
+
+    @app.after_serving
+    async def _disconnect():
+        if _client is not None:
+            _client.close()
+
+    app.register_blueprint(bp)
+    return app
+
+
+app = create_app()
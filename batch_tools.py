@@ -0,0 +1,77 @@
+"""Shared helpers for the batch scripts (seed_products.py, migrate_db.py, generate_data.py).
+
+``Progress`` prints throughput at most once a second. ``Checkpoint`` records
+how far a job got in the ``_checkpoints`` collection, so an interrupted run
+resumes after the last completed batch instead of starting over.
+"""
+import time
+from datetime import datetime, timezone
+
+
+CHECKPOINT_COLLECTION = '_checkpoints'
+
+
+class Progress:
+    def __init__(self, label, total=None):
+        self.label = label
+        self.total = total
+        self.done = 0
+        self.started = time.perf_counter()
+        self._last = 0.0
+
+    def add(self, n):
+        self.done += n
+        now = time.perf_counter()
+        if now - self._last >= 1 or (self.total and self.done >= self.total):
+            self._last = now
+            of = f'/{self.total:,}' if self.total else ''
+            print(f'  {self.label}: {self.done:,}{of} ({self.rate():,.0f}/s)', flush=True)
+
+    def rate(self):
+        return self.done / max(time.perf_counter() - self.started, 1e-9)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+class Checkpoint:
+    """Resume marker for one named job, e.g. ``migrate_db:users``."""
+
+    def __init__(self, db, job, enabled=True):
+        self.col = db[CHECKPOINT_COLLECTION]
+        self.job = job
+        self.enabled = enabled
+
+    def load(self):
+        if not self.enabled:
+            return None
+        doc = self.col.find_one({'_id': self.job})
+        return doc.get('position') if doc else None
+
+    def save(self, position, **stats):
+        if self.enabled:
+            self.col.update_one(
+                {'_id': self.job},
+                {'$set': dict(stats, position=position, updated_at=datetime.now(timezone.utc))},
+                upsert=True,
+            )
+
+    def clear(self):
+        self.col.delete_one({'_id': self.job})
+
+
+def id_ranges(col, batch_size, start_after=None, query=None):
+    """Yield (first_id, last_id, count) windows of ``_id`` in ascending order.
+
+    Only ``_id`` is read, so callers can then update each window server-side
+    with a single range-filtered command instead of one round trip per document.
+    """
+    filt = dict(query or {})
+    while True:
+        if start_after is not None:
+            filt['_id'] = {'$gt': start_after}
+        ids = [d['_id'] for d in col.find(filt, {'_id': 1}).sort('_id', 1).limit(batch_size)]
+        if not ids:
+            return
+        yield ids[0], ids[-1], len(ids)
+        start_after = ids[-1]
@@ -0,0 +1,195 @@
+"""Compare the threaded (app.py) and async (async_app.py) servers under held concurrency.
+
+For each target and each concurrency level, the bench opens that many
+keep-alive connections and has every connection issue requests back to back
+for ``--duration`` seconds. It reports throughput, p50/p99 latency and errors
+per step. "Sustained concurrency" is the highest level whose p99 stays under
+``--p99-slo-ms`` with an error rate under ``--max-error-rate``.
+
+Against servers you started yourself:
+
+    gunicorn -c gunicorn.conf.py app:app                       # :5000, gthread
+    hypercorn async_app:app --bind 0.0.0.0:5001 --workers 4    # :5001
+    python bench_async.py --concurrency 50,200,500,1000 --path /api/products --path /product/1
+
+Or let the bench start both with the same number of workers (needs MongoDB):
+
+    python bench_async.py --spawn --workers 4 --json results/async.json
+
+The load generator is a single asyncio process. Watch its CPU at the highest
+levels; once it saturates, the numbers describe the client, not the server.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+from bench_common import summarize, write_json
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_TARGETS = ['threaded=http://127.0.0.1:5000', 'async=http://127.0.0.1:5001']
+DEFAULT_PATHS = ['/api/products', '/product/1']
+
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connection closed')
+    version, status = status_line.split()[:2]
+    status = int(status)
+    length, chunked = None, False
+    # HTTP/1.0 servers (e.g. werkzeug's dev server) close unless they say otherwise
+    close = version == b'HTTP/1.0'
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'transfer-encoding' and 'chunked' in value:
+            chunked = True
+        elif name == 'connection':
+            close = value == 'close'
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length is not None:
+        await reader.readexactly(length)
+    else:
+        await reader.read()
+        close = True
+    return status, close
+
+
+async def _connection(base, paths, offset, deadline, timeout, samples, errors):
+    parts = urlsplit(base)
+    host, port = parts.hostname, parts.port or 80
+    reader = writer = None
+    n = offset
+    while time.perf_counter() < deadline:
+        path = paths[n % len(paths)]
+        n += 1
+        request = (f'GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n'
+                   f'Accept-Encoding: identity\r\nConnection: keep-alive\r\n\r\n').encode('ascii')
+        t0 = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+            writer.write(request)
+            status, close = await asyncio.wait_for(_read_response(reader), timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            await asyncio.sleep(0.05)
+            continue
+        elapsed = time.perf_counter() - t0
+        if status >= 500:
+            errors[f'http_{status}'] = errors.get(f'http_{status}', 0) + 1
+        else:
+            samples.append(elapsed)
+        if close:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_step(base, paths, concurrency, duration, timeout):
+    samples, errors = [], {}
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*(_connection(base, paths, i, deadline, timeout, samples, errors)
+                           for i in range(concurrency)))
+    wall = time.perf_counter() - started
+    failed = sum(errors.values())
+    total = len(samples) + failed
+    return dict(summarize(samples), concurrency=concurrency, rps=round(len(samples) / wall, 1),
+                errors=errors, error_rate=round(failed / total, 4) if total else 1.0)
+
+
+def _wait_ready(base, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(base + '/healthz', timeout=2) as resp:
+                if resp.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.5)
+    raise RuntimeError(f'{base} did not become healthy within {timeout}s')
+
+
+def spawn(workers, threads):
+    env = dict(os.environ, GUNICORN_BIND='127.0.0.1:5000', GUNICORN_WORKERS=str(workers),
+               GUNICORN_THREADS=str(threads), CHATBOT_WARMUP='lazy')
+    procs = [
+        subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'], cwd=HERE, env=env),
+        subprocess.Popen([sys.executable, '-m', 'hypercorn', 'async_app:app', '--bind', '127.0.0.1:5001',
+                          '--workers', str(workers)], cwd=HERE, env=env),
+    ]
+    for base in ('http://127.0.0.1:5000', 'http://127.0.0.1:5001'):
+        _wait_ready(base)
+    return procs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Threaded vs async server under held concurrency.')
+    parser.add_argument('--target', action='append', help='name=base_url (repeatable)')
+    parser.add_argument('--path', action='append', help='path to request, round-robin (repeatable)')
+    parser.add_argument('--concurrency', default='50,200,500', help='comma-separated connection counts')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per step')
+    parser.add_argument('--timeout', type=float, default=10.0, help='per-request timeout in seconds')
+    parser.add_argument('--p99-slo-ms', type=float, default=500.0)
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--spawn', action='store_true', help='start gunicorn (gthread) and hypercorn locally')
+    parser.add_argument('--workers', type=int, default=2, help='workers per server with --spawn')
+    parser.add_argument('--threads', type=int, default=4, help='gthread threads per worker with --spawn')
+    parser.add_argument('--json', dest='json_path')
+    args = parser.parse_args()
+
+    targets = dict(t.split('=', 1) for t in (args.target or DEFAULT_TARGETS))
+    paths = args.path or DEFAULT_PATHS
+    levels = [int(c) for c in args.concurrency.split(',') if c.strip()]
+
+    procs = spawn(args.workers, args.threads) if args.spawn else []
+    results = {}
+    try:
+        for name, base in targets.items():
+            results[name] = {'base_url': base, 'steps': []}
+            for level in levels:
+                step = asyncio.run(run_step(base, paths, level, args.duration, args.timeout))
+                results[name]['steps'].append(step)
+                print(f"  {name:<10} c={level:<6} {step['rps']:>9.1f} req/s  p50 {step['p50_ms']:>8.2f} ms  "
+                      f"p99 {step['p99_ms']:>8.2f} ms  errors {step['error_rate']:.2%}")
+            ok = [s['concurrency'] for s in results[name]['steps']
+                  if s['p99_ms'] <= args.p99_slo_ms and s['error_rate'] <= args.max_error_rate]
+            results[name]['sustained_concurrency'] = max(ok) if ok else 0
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait(timeout=10)
+
+    print(f'\nSustained concurrency (p99 <= {args.p99_slo_ms:g} ms, errors <= {args.max_error_rate:.0%}):')
+    for name, r in results.items():
+        best = max(r['steps'], key=lambda s: s['rps'])
+        print(f"  {name:<10} {r['sustained_concurrency']:>6} connections, "
+              f"peak {best['rps']:.1f} req/s at c={best['concurrency']}")
+    if args.json_path:
+        write_json(args.json_path, {'paths': paths, 'duration_s': args.duration, 'targets': results})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""Chatbot latency benchmark.
+
+Drives ``get_chatbot_response`` directly and ``POST /api/chatbot`` over HTTP
+from concurrent simulated sessions, and reports p50/p95/p99 for retrieval,
+question reformulation, answer generation and end-to-end time.
+
+Runs fully offline by default (CHATBOT_PROVIDER=fake, see chatbot_fakes.py):
+
+    python bench_chatbot.py                          # both modes, in-process
+    python bench_chatbot.py --mode http --base-url http://localhost:5000
+    FAKE_LLM_LATENCY_MS=800 python bench_chatbot.py --sessions 100 --concurrency 16
+    python bench_chatbot.py --real                   # use the configured Gemini provider
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import re
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_common import print_table, summarize, write_json
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# One simulated session: a first turn, a follow-up, a structured lookup, another follow-up
+CONVERSATION = [
+    "What phones do you have with a big battery?",
+    "Which one of those is the cheapest?",
+    "What's the price of Galaxy S23?",
+    "Tell me more about the camera on that one",
+]
+
+STAGES = ('retrieval', 'reformulation', 'generation', 'total')
+_SERVER_TIMING = re.compile(r'(\w+);dur=([\d.]+)')
+
+
+def seed_offline_index():
+    """Index data/products.json and the specs CSV into the fake provider's store."""
+    import chatbot_backend
+    import chatbot_indexer
+    chatbot_backend.ensure_stack()
+    with open(os.path.join(HERE, 'data', 'products.json'), encoding='utf-8') as f:
+        products = json.load(f).get('products', [])
+    docs = chatbot_indexer.build_documents(products, chatbot_indexer.load_phone_rows())
+    stats = chatbot_indexer.sync_index(
+        chatbot_backend.vectorstore, chatbot_backend.embedding_model, docs,
+        persist_directory=chatbot_backend.PERSIST_DIRECTORY,
+    )
+    print(f"Index ready: {stats}")
+
+
+def _collect(samples, timings, e2e):
+    for stage in STAGES:
+        if stage in timings:
+            samples.setdefault(stage, []).append(timings[stage])
+    samples.setdefault('e2e', []).append(e2e)
+    route = timings.get('route')
+    if route:
+        samples.setdefault('routes', {}).setdefault(route, 0)
+        samples['routes'][route] += 1
+
+
+def run_direct(sessions, concurrency):
+    from chatbot_backend import get_chatbot_response
+
+    def session_worker(_):
+        session_id = f'bench-{uuid.uuid4()}'
+        out = []
+        for message in CONVERSATION:
+            timings = {}
+            t0 = time.perf_counter()
+            get_chatbot_response(message, session_id, timings=timings)
+            out.append((timings, time.perf_counter() - t0))
+        return out
+
+    return _drive(session_worker, sessions, concurrency)
+
+
+def _http_session(base_url):
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    opener.open(base_url + '/').read()  # establishes the session_id cookie
+
+    def send(message):
+        req = urllib.request.Request(
+            base_url + '/api/chatbot',
+            data=json.dumps({'message': message}).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+        )
+        with opener.open(req) as resp:
+            resp.read()
+            return resp.headers.get('Server-Timing', '')
+    return send
+
+
+def _test_client_session():
+    from app import app
+    client = app.test_client()
+    client.get('/')
+
+    def send(message):
+        resp = client.post('/api/chatbot', json={'message': message})
+        return resp.headers.get('Server-Timing', '')
+    return send
+
+
+def run_http(sessions, concurrency, base_url=None):
+    if not base_url:
+        import app  # noqa: F401 -- import (and its Mongo connect) outside the timed region
+
+    def session_worker(_):
+        send = _http_session(base_url) if base_url else _test_client_session()
+        out = []
+        for message in CONVERSATION:
+            t0 = time.perf_counter()
+            header = send(message)
+            e2e = time.perf_counter() - t0
+            timings = {name: float(ms) / 1000.0 for name, ms in _SERVER_TIMING.findall(header)}
+            route = re.search(r'route;desc="?(\w+)', header)
+            if route:
+                timings['route'] = route.group(1)
+            out.append((timings, e2e))
+        return out
+
+    return _drive(session_worker, sessions, concurrency)
+
+
+def _drive(session_worker, sessions, concurrency):
+    samples = {}
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for turns in pool.map(session_worker, range(sessions)):
+            for timings, e2e in turns:
+                _collect(samples, timings, e2e)
+    elapsed = time.perf_counter() - started
+    routes = samples.pop('routes', {})
+    order = STAGES + ('e2e',)
+    report = {name: summarize(samples[name]) for name in order if name in samples}
+    return {
+        'stages': report,
+        'routes': routes,
+        'turns': len(samples.get('e2e', [])),
+        'elapsed_s': round(elapsed, 3),
+        'turns_per_s': round(len(samples.get('e2e', [])) / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark chatbot latency by stage.')
+    parser.add_argument('--mode', choices=['direct', 'http', 'both'], default='both')
+    parser.add_argument('--sessions', type=int, default=40, help='simulated chat sessions')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--base-url', help='benchmark a running server instead of the in-process app')
+    parser.add_argument('--real', action='store_true', help='use the configured provider instead of CHATBOT_PROVIDER=fake')
+    parser.add_argument('--json', dest='json_path', help='also write the report to this file')
+    args = parser.parse_args()
+
+    if not args.real:
+        os.environ.setdefault('CHATBOT_PROVIDER', 'fake')
+    os.environ.setdefault('CATALOG_SNAPSHOT_SECONDS', '0')  # the in-process app must not write the snapshot
+    import chatbot_backend
+    if not chatbot_backend.CHATBOT_READY:
+        raise SystemExit('Chatbot is not configured; run without --real to use the offline providers.')
+    if chatbot_backend.USE_FAKE_PROVIDER:
+        seed_offline_index()
+
+    results = {'provider': chatbot_backend.CHATBOT_PROVIDER, 'sessions': args.sessions, 'concurrency': args.concurrency}
+    if args.mode in ('direct', 'both'):
+        results['direct'] = run_direct(args.sessions, args.concurrency)
+    if args.mode in ('http', 'both'):
+        results['http'] = run_http(args.sessions, args.concurrency, args.base_url)
+
+    for mode in ('direct', 'http'):
+        if mode in results:
+            r = results[mode]
+            print_table(f"{mode}: {r['turns']} turns in {r['elapsed_s']}s ({r['turns_per_s']} turns/s), routes={r['routes']}",
+                        r['stages'])
+    if args.json_path:
+        write_json(args.json_path, results)
+
+
+if __name__ == '__main__':
+    main()
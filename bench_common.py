@@ -0,0 +1,39 @@
+"""Shared helpers for the bench_*.py scripts: percentiles and report printing."""
+import json
+import math
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values`` (0 < pct <= 100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(seconds):
+    """Summarize a list of durations in seconds as milliseconds."""
+    ms = [s * 1000.0 for s in seconds]
+    return {
+        'count': len(ms),
+        'mean_ms': round(sum(ms) / len(ms), 2) if ms else 0.0,
+        'p50_ms': round(percentile(ms, 50), 2),
+        'p95_ms': round(percentile(ms, 95), 2),
+        'p99_ms': round(percentile(ms, 99), 2),
+        'max_ms': round(max(ms), 2) if ms else 0.0,
+    }
+
+
+def print_table(title, rows):
+    """Print ``{name: summary}`` rows as an aligned table."""
+    print(f'\n{title}')
+    print(f"  {'name':<28}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, s in rows.items():
+        print(f"  {name:<28}{s['count']:>8}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}{s['max_ms']:>10.2f}")
+
+
+def write_json(path, payload):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=2)
+    print(f'\nWrote {path}')
@@ -0,0 +1,111 @@
+"""Time to first product on the home page: server-rendered vs client-rendered.
+
+A browser can't paint a product card until it has the card's markup. This
+measures how long each page design takes to deliver it over one keep-alive
+connection:
+
+* ``ssr``: the current page. ``GET /`` until the first ``category__products``
+  card has arrived.
+* ``csr``: the old page, an empty grid filled by products.js. ``GET /``
+  (products.js sits at the end of the body), then
+  ``GET /static/js/products.js``, then ``GET /api/products`` and parsing its
+  JSON. The HTML it downloads now also carries the cards, which makes this
+  path slightly slower than the old page really was.
+
+``--rtt-ms`` adds a simulated network round trip before every request. The
+csr path pays it three times, ssr once. Paint, script execution and TLS are
+not modelled. In a browser, the first card image carries
+``elementtiming="first-product"`` for the Element Timing API.
+
+    python app.py &
+    python bench_first_paint.py --rtt-ms 0,50,150 --iterations 50
+"""
+import argparse
+import http.client
+import json
+import time
+from urllib.parse import urlsplit
+
+from bench_common import print_table, summarize, write_json
+
+
+CARD_MARKER = b'category__products'
+HEADERS = {'Accept-Encoding': 'identity', 'Connection': 'keep-alive'}
+
+
+def _get(conn, path, until=None):
+    """GET ``path``; return the body, or stop reading as soon as ``until`` shows up."""
+    conn.request('GET', path, headers=HEADERS)
+    resp = conn.getresponse()
+    if resp.status != 200:
+        resp.read()
+        raise RuntimeError(f'GET {path} -> {resp.status}')
+    if until is None:
+        return resp.read()
+    body = b''
+    while True:
+        chunk = resp.read1(16384) if hasattr(resp, 'read1') else resp.read(16384)
+        if not chunk:
+            return body
+        body += chunk
+        if until is not None and until in body[-(len(chunk) + len(until)):]:
+            resp.read()  # drain so the connection can be reused
+            return body
+
+
+def ssr(conn, rtt):
+    time.sleep(rtt)
+    body = _get(conn, '/', until=CARD_MARKER)
+    if CARD_MARKER not in body:
+        raise RuntimeError('home page has no server-rendered product cards')
+
+
+def csr(conn, rtt):
+    time.sleep(rtt)
+    _get(conn, '/')
+    time.sleep(rtt)
+    _get(conn, '/static/js/products.js')
+    time.sleep(rtt)
+    products = json.loads(_get(conn, '/api/products'))
+    if not products:
+        raise RuntimeError('/api/products returned no products')
+
+
+def run(base, mode, rtt, iterations):
+    parts = urlsplit(base)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+    fn = ssr if mode == 'ssr' else csr
+    fn(conn, 0)  # warm the connection and the server's caches
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn(conn, rtt)
+        samples.append(time.perf_counter() - t0)
+    conn.close()
+    return summarize(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time to first product markup: SSR vs client-rendered home page.')
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--rtt-ms', default='0,50', help='comma-separated simulated round-trip times')
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--json', dest='json_path')
+    args = parser.parse_args()
+
+    results = {}
+    for rtt_ms in [float(r) for r in args.rtt_ms.split(',') if r.strip()]:
+        rows = {f'{mode} rtt={rtt_ms:g}ms': run(args.base_url, mode, rtt_ms / 1000.0, args.iterations)
+                for mode in ('csr', 'ssr')}
+        print_table(f'Time to first product markup (RTT {rtt_ms:g} ms)', rows)
+        csr_p50, ssr_p50 = (rows[f'{m} rtt={rtt_ms:g}ms']['p50_ms'] for m in ('csr', 'ssr'))
+        if ssr_p50:
+            print(f'  ssr is {csr_p50 / ssr_p50:.1f}x faster at p50 ({csr_p50 - ssr_p50:.1f} ms saved)')
+        results[f'{rtt_ms:g}'] = rows
+
+    if args.json_path:
+        write_json(args.json_path, {'base_url': args.base_url, 'iterations': args.iterations, 'rtt_ms': results})
+
+
+if __name__ == '__main__':
+    main()
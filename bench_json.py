@@ -0,0 +1,102 @@
+"""JSON serialization and compression micro-benchmark.
+
+Compares Flask's stock ``jsonify`` with fastjson's stdlib and orjson backends on
+the two largest API payloads (the ``/api/products`` listing and ``/api/cart/get``)
+and reports the bytes on the wire for identity, gzip and brotli encodings.
+
+    python bench_json.py
+    python bench_json.py --products 2000 --cart-items 50 --iterations 500
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import Flask, jsonify as flask_jsonify
+
+import compression
+import fastjson
+from bench_common import print_table, summarize, write_json
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SPECS = ('Display: 6.1 inch OLED\nProcessor: A15 Bionic\nRAM: 6 GB\nStorage: 128 GB\n'
+         'Battery: 3279 mAh\nCamera: 12 MP dual\nOS: iOS 16')
+
+
+def build_products(n):
+    """Scale data/products.json up to ``n`` documents shaped like the API output."""
+    with open(os.path.join(HERE, 'data', 'products.json'), encoding='utf-8') as f:
+        seed = json.load(f).get('products', [])
+    out = []
+    for i in range(n):
+        p = dict(seed[i % len(seed)], id=i + 1)
+        p.update(description=f"{p['title']} in excellent condition with warranty.", specs=SPECS,
+                 stock=i % 40, brand=p['title'].split()[0], image_url=f'/api/products/{i + 1}/image')
+        out.append(p)
+    return out
+
+
+def build_cart(n):
+    now = datetime.now(timezone.utc)
+    items = [{
+        'user_identifier': '65f0c0ffee0123456789abcd',
+        'product_id': i + 1,
+        'product_title': f'Phone {i + 1}',
+        'product_price': 199.0 + i,
+        'product_image': f'/api/products/{i + 1}/image',
+        'quantity': 1 + i % 3,
+        'added_at': now - timedelta(minutes=i),
+    } for i in range(n)]
+    return {'cart_items': items, 'total': sum(i['product_price'] * i['quantity'] for i in items), 'count': n}
+
+
+def time_calls(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark JSON serialization and response compression.')
+    parser.add_argument('--products', type=int, default=500, help='documents in the products listing')
+    parser.add_argument('--cart-items', type=int, default=25)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--json', dest='json_path')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    payloads = {'products': build_products(args.products), 'cart': build_cart(args.cart_items)}
+    backends = ['stdlib'] + (['orjson'] if fastjson.orjson is not None else [])
+    encodings = ['gzip'] + (['br'] if compression.brotli is not None else [])
+
+    timing_rows, results = {}, {}
+    with app.test_request_context():
+        for name, payload in payloads.items():
+            raw = flask_jsonify(payload).get_data()
+            timing_rows[f'{name} flask.jsonify'] = summarize(time_calls(lambda: flask_jsonify(payload), args.iterations))
+            for backend in backends:
+                timing_rows[f'{name} fastjson/{backend}'] = summarize(
+                    time_calls(lambda: fastjson.dumps(payload, backend), args.iterations))
+            body = fastjson.dumps(payload)
+            sizes = {'flask': len(raw), 'fastjson': len(body)}
+            for enc in encodings:
+                sizes[enc] = len(compression.compress(body, enc))
+                timing_rows[f'{name} compress/{enc}'] = summarize(
+                    time_calls(lambda: compression.compress(body, enc), args.iterations))
+            results[name] = {'bytes': sizes}
+
+    print_table(f'Serialization and compression ({args.iterations} iterations)', timing_rows)
+    print(f"\n  {'payload':<12}" + ''.join(f'{k:>12}' for k in results['products']['bytes']))
+    for name, r in results.items():
+        print(f'  {name:<12}' + ''.join(f'{v:>12}' for v in r['bytes'].values()))
+    if args.json_path:
+        write_json(args.json_path, {'timings': timing_rows, 'payloads': results})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Spec filter benchmark: columnar NumPy masks vs a Python scan over dicts.
+
+Builds synthetic phone tables of each ``--rows`` size (attributes drawn around
+the models in data/mobile_phones.csv, ~5% of values unknown) and times a set
+of /api/phones/filter-style queries against them. The same queries run as a
+plain list-of-dicts scan at sizes up to ``--baseline-rows``, for comparison.
+
+    python bench_specs.py
+    python bench_specs.py --rows 100000,1000000,5000000 --iterations 50 --json results/specs.json
+"""
+import argparse
+import time
+
+import numpy as np
+
+import spec_store
+from bench_common import print_table, summarize, write_json
+from phone_specs import ATTRIBUTES, load_phones
+
+
+QUERIES = {
+    'ram>=8 batt>=5000 <$500': {'ranges': {'ram_gb': (8, None), 'battery_mah': (5000, None), 'price': (None, 500)}},
+    'brand+storage, sort -batt': {'ranges': {'storage_gb': (256, None)}, 'brands': ['samsung', 'google'],
+                                  'sort': '-battery_mah'},
+    '6.1-6.7in, 2022+, sort price': {'ranges': {'display_in': (6.1, 6.7), 'release_year': (2022, None)},
+                                     'sort': 'price'},
+    'ios, deep page': {'oses': ['ios'], 'offset': 500},
+}
+
+
+def synthetic_table(n, seed=1):
+    """A SpecTable of ``n`` rows built directly from arrays (no per-row parsing)."""
+    rng = np.random.default_rng(seed)
+    phones = load_phones()
+    pick = rng.integers(0, len(phones), n)
+    columns = {}
+    for attr in ATTRIBUTES:
+        base = np.array([p[attr] if p[attr] is not None else np.nan for p in phones], dtype=np.float64)[pick]
+        if attr == 'price':
+            col = base * rng.lognormal(0, 0.25, n)
+        elif attr in ('ram_gb', 'storage_gb'):
+            col = base * rng.choice([0.5, 1, 1, 2], n)
+        elif attr == 'battery_mah':
+            col = base + rng.normal(0, 250, n)
+        else:
+            col = base
+        col[rng.random(n) < 0.05] = np.nan
+        columns[attr] = col
+    brand_codes, brand_vocab = spec_store.encode([p['brand'] for p in phones])
+    os_codes, os_vocab = spec_store.encode([p['os'] for p in phones])
+    names = [p['name'] for p in phones]
+    return spec_store.SpecTable([names[i] for i in pick], brand_codes[pick], brand_vocab,
+                                os_codes[pick], os_vocab, np.zeros(n, dtype=np.int8), np.arange(n), columns)
+
+
+def as_dicts(table):
+    """The same rows as the list of dicts a naive implementation would scan."""
+    cols = {attr: table.columns[attr].tolist() for attr in ATTRIBUTES}
+    return [dict({attr: None if cols[attr][i] != cols[attr][i] else cols[attr][i] for attr in ATTRIBUTES},
+                 brand=table.brand_vocab[table.brand_codes[i]].lower(), os=table.os_vocab[table.os_codes[i]].lower())
+            for i in range(len(table))]
+
+
+def scan(rows, ranges=None, brands=None, oses=None, sort=None, limit=spec_store.DEFAULT_LIMIT, offset=0):
+    # Bounds at the columns' float32 precision, so both sides agree on edge values
+    ranges = {attr: tuple(None if b is None else float(np.float32(b)) for b in bounds)
+              for attr, bounds in (ranges or {}).items()}
+    out = []
+    for row in rows:
+        ok = True
+        for attr, (low, high) in ranges.items():
+            value = row[attr]
+            if value is None or (low is not None and value < low) or (high is not None and value > high):
+                ok = False
+                break
+        if ok and (not brands or row['brand'] in brands) and (not oses or row['os'] in oses):
+            out.append(row)
+    if sort:
+        attr = sort.lstrip('-')
+        sign = -1 if sort.startswith('-') else 1
+        out.sort(key=lambda r: (r[attr] is None, sign * (r[attr] or 0)))
+    return len(out), out[offset:offset + limit]
+
+
+def timed(fn, iterations):
+    samples, result = [], None
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - t0)
+    return samples, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Columnar spec filter vs Python scan.')
+    parser.add_argument('--rows', default='10000,100000,1000000', help='comma-separated table sizes')
+    parser.add_argument('--baseline-rows', type=int, default=100000, help='largest size to also run the Python scan on')
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--json', dest='json_path')
+    args = parser.parse_args()
+
+    results = {}
+    for n in [int(r) for r in args.rows.split(',') if r.strip()]:
+        t0 = time.perf_counter()
+        table = synthetic_table(n)
+        build_s = time.perf_counter() - t0
+        rows = {}
+        entry = {'build_s': round(build_s, 3), 'column_mb': round(table.nbytes() / 1e6, 1), 'queries': {}}
+        dicts = as_dicts(table) if n <= args.baseline_rows else None
+        for name, query in QUERIES.items():
+            samples, (total, _) = timed(lambda: table.filter(**query), args.iterations)
+            rows[f'numpy  {name}'] = summarize(samples)
+            entry['queries'][name] = {'matches': total, 'numpy': rows[f'numpy  {name}']}
+            if dicts is not None:
+                samples, (scan_total, _) = timed(lambda: scan(dicts, **query), max(1, args.iterations // 10))
+                assert scan_total == total, f'{name}: scan found {scan_total}, numpy {total}'
+                rows[f'scan   {name}'] = summarize(samples)
+                entry['queries'][name]['scan'] = rows[f'scan   {name}']
+        print_table(f'{n:,} rows (columns {entry["column_mb"]} MB, built in {build_s:.2f}s)', rows)
+        results[n] = entry
+
+    if args.json_path:
+        write_json(args.json_path, {'iterations': args.iterations, 'sizes': results})
+
+
+if __name__ == '__main__':
+    main()
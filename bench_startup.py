@@ -0,0 +1,82 @@
+"""Measure app import time and memory with each chatbot warm-up mode.
+
+Each mode runs in a fresh interpreter:
+
+* ``eager``      - build the chatbot stack during startup (the old import-time behaviour)
+* ``background`` - start serving immediately, build the stack on a daemon thread
+* ``lazy``       - build the stack on the first chat message
+
+Runs with the offline fake provider unless --real is given:
+
+    python bench_startup.py
+    python bench_startup.py --runs 5 --real
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from bench_common import write_json
+
+
+PROBE = r'''
+import json, resource, sys, time
+t0 = time.perf_counter()
+import app
+import_s = time.perf_counter() - t0
+rss_import = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+client = app.app.test_client()
+t1 = time.perf_counter()
+client.get('/api/products')
+first_request_s = time.perf_counter() - t1
+import chatbot_backend
+print(json.dumps({
+    'import_s': import_s,
+    'first_request_s': first_request_s,
+    'max_rss_mb': rss_import / 1024.0,
+    'langchain_loaded': any(m.startswith('langchain') for m in sys.modules),
+    'stack_ready_at_first_request': chatbot_backend.is_ready(),
+}))
+'''
+
+
+def measure(mode, runs, real):
+    env = dict(os.environ, CHATBOT_WARMUP=mode)
+    env.setdefault('CATALOG_SNAPSHOT_SECONDS', '0')  # probes must not write the catalog snapshot
+    if not real:
+        env.setdefault('CHATBOT_PROVIDER', 'fake')
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', PROBE], env=env, capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        if out.returncode != 0:
+            raise SystemExit(f'{mode} probe failed:\n{out.stderr}')
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    best = min(samples, key=lambda s: s['import_s'])
+    return {
+        'import_ms': round(best['import_s'] * 1000, 1),
+        'first_request_ms': round(best['first_request_s'] * 1000, 1),
+        'max_rss_mb': round(best['max_rss_mb'], 1),
+        'langchain_loaded': best['langchain_loaded'],
+        'stack_ready_at_first_request': best['stack_ready_at_first_request'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare startup cost of chatbot warm-up modes.')
+    parser.add_argument('--runs', type=int, default=3, help='runs per mode (best is reported)')
+    parser.add_argument('--real', action='store_true', help='use the configured provider instead of CHATBOT_PROVIDER=fake')
+    parser.add_argument('--json', dest='json_path')
+    args = parser.parse_args()
+
+    results = {mode: measure(mode, args.runs, args.real) for mode in ('eager', 'background', 'lazy')}
+    print(f"\n  {'mode':<12}{'import ms':>12}{'1st req ms':>12}{'max RSS MB':>12}  langchain loaded")
+    for mode, r in results.items():
+        print(f"  {mode:<12}{r['import_ms']:>12}{r['first_request_ms']:>12}{r['max_rss_mb']:>12}  {r['langchain_loaded']}")
+    if args.json_path:
+        write_json(args.json_path, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Flash-sale contention benchmark for inventory.py.
+
+Hundreds of concurrent buyers race for one SKU with ``--stock`` units. Each
+buyer reserves ``--qty`` units through ``inventory.hold`` (the path
+/api/cart/add uses). The run reports successes, the final stock counter, any
+oversell and the latency distribution. ``--naive`` runs the same race with a
+read-then-write update (what a find_one + update_one cart would do) to show
+the oversell the guarded ``$inc`` prevents.
+
+    python bench_stock.py --buyers 500 --stock 100
+    python bench_stock.py --buyers 500 --stock 100 --naive
+    python bench_stock.py --backend memory      # in-process stand-in (mongomock)
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_common import print_table, summarize, write_json
+import inventory
+
+
+SKU = 990000001
+
+
+def _naive_hold(user_identifier, product_id, qty):
+    product = inventory.products_col.find_one({'id': product_id}, {'stock': 1})
+    if product['stock'] < qty:
+        raise inventory.OutOfStock(product_id, qty, product['stock'])
+    inventory.products_col.update_one({'id': product_id}, {'$set': {'stock': product['stock'] - qty}})
+    inventory.reservations_col.insert_one({'user_identifier': user_identifier, 'product_id': product_id,
+                                           'quantity': qty, 'expires_at': inventory._now()})
+
+
+def race(buyers, stock, qty, naive):
+    inventory.products_col.delete_many({'id': SKU})
+    inventory.reservations_col.delete_many({'product_id': SKU})
+    inventory.products_col.insert_one({'id': SKU, 'title': 'Flash sale SKU', 'price': 1.0,
+                                       'category': 'Mobile phone', 'image': '', 'stock': stock, 'reserved': 0})
+    attempt = _naive_hold if naive else inventory.hold
+    barrier = threading.Barrier(buyers)
+    latencies, outcomes = [], {'ok': 0, 'out_of_stock': 0, 'error': 0}
+    lock = threading.Lock()
+
+    def buyer(n):
+        barrier.wait()
+        t0 = time.perf_counter()
+        try:
+            attempt(f'bench-buyer-{n}', SKU, qty)
+            outcome = 'ok'
+        except inventory.OutOfStock:
+            outcome = 'out_of_stock'
+        except Exception:
+            outcome = 'error'
+        elapsed = time.perf_counter() - t0
+        with lock:
+            latencies.append(elapsed)
+            outcomes[outcome] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=buyers) as pool:
+        list(pool.map(buyer, range(buyers)))
+    wall = time.perf_counter() - started
+
+    final = inventory.stock_level(SKU)
+    held = sum(r['quantity'] for r in inventory.reservations_col.find({'product_id': SKU}, {'quantity': 1}))
+    inventory.products_col.delete_many({'id': SKU})
+    inventory.reservations_col.delete_many({'product_id': SKU})
+    return {
+        'mode': 'naive read-then-write' if naive else 'guarded $inc',
+        'buyers': buyers,
+        'initial_stock': stock,
+        'qty_per_buyer': qty,
+        'outcomes': outcomes,
+        'units_reserved': held,
+        'final_stock': final['stock'],
+        'oversold_units': max(0, held - stock),
+        'consistent': final['stock'] + held == stock and final['stock'] >= 0,
+        'wall_s': round(wall, 3),
+        'latency': summarize(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark stock reservations under contention.')
+    parser.add_argument('--buyers', type=int, default=300)
+    parser.add_argument('--stock', type=int, default=100)
+    parser.add_argument('--qty', type=int, default=1)
+    parser.add_argument('--naive', action='store_true', help='also run the unguarded read-then-write variant')
+    parser.add_argument('--backend', choices=['mongo', 'memory'], default='mongo')
+    parser.add_argument('--json', dest='json_path')
+    args = parser.parse_args()
+
+    if args.backend == 'memory':
+        from loadtest import use_memory_backend
+        use_memory_backend()
+
+    results = [race(args.buyers, args.stock, args.qty, naive=False)]
+    if args.naive:
+        results.append(race(args.buyers, args.stock, args.qty, naive=True))
+    for r in results:
+        print(f"\n{r['mode']}: {r['outcomes']} | reserved {r['units_reserved']}/{r['initial_stock']}, "
+              f"final stock {r['final_stock']}, oversold {r['oversold_units']}, "
+              f"{'consistent' if r['consistent'] else 'INCONSISTENT'}")
+    print_table(f'{args.buyers} concurrent buyers, one SKU', {r['mode']: r['latency'] for r in results})
+    if args.json_path:
+        write_json(args.json_path, results)
+
+
+if __name__ == '__main__':
+    main()
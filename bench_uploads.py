@@ -0,0 +1,104 @@
+"""Upload memory benchmark: whole-body GridFS put vs chunked upload parts.
+
+For each ``--sizes`` (MB), stores a file of random bytes in the configured
+MongoDB two ways and reports the wall time and the peak Python heap
+(tracemalloc) of the storing code:
+
+* ``buffered``: the old admin path, ``fs.put(stream.read())``.
+* ``parts``: ``uploads.write_part`` for every part, then ``uploads.complete``
+  (which reads the file back once to verify its SHA-256).
+
+The source is a stream that generates bytes as they are read, so the input
+itself takes no memory. Files and sessions are deleted afterwards.
+
+    python bench_uploads.py --sizes 5,50,200 --json results/uploads.json
+"""
+import argparse
+import hashlib
+import os
+import time
+import tracemalloc
+
+import db
+import uploads
+from bench_common import write_json
+
+
+class RandomStream:
+    """``size`` bytes produced as they are read (one random block, repeated)."""
+
+    def __init__(self, size, block=os.urandom(64 * 1024)):
+        self.remaining = size
+        self.block = block
+        self.sha = hashlib.sha256()
+
+    def read(self, n=-1):
+        if n < 0:
+            n = self.remaining
+        n = min(n, self.remaining)
+        out = (self.block * (n // len(self.block) + 1))[:n]
+        self.remaining -= n
+        self.sha.update(out)
+        return out
+
+
+class Window:
+    """The slice of a stream that makes up one part."""
+
+    def __init__(self, stream, n):
+        self.stream, self.remaining = stream, n
+
+    def read(self, n=-1):
+        n = self.remaining if n < 0 else min(n, self.remaining)
+        self.remaining -= n
+        return self.stream.read(n)
+
+
+def measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, {'seconds': round(elapsed, 3), 'peak_mb': round(peak / 1e6, 1)}
+
+
+def buffered(size):
+    fs = db.get_gridfs()
+    file_id = fs.put(RandomStream(size).read(), filename='bench.bin')
+    fs.delete(file_id)
+
+
+def parts(size):
+    session = uploads.create('bench.mp4', size)
+    source = RandomStream(size)
+    for i in range(session['parts']):
+        uploads.write_part(session['_id'], i, Window(source, uploads.part_length(session, i)))
+    done = uploads.complete(session['_id'])
+    assert done['sha256'] == source.sha.hexdigest()
+    db.get_gridfs().delete(done['file_id'])
+    uploads.sessions_col.delete_one({'_id': session['_id']})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Peak memory of buffered vs chunked GridFS uploads.')
+    parser.add_argument('--sizes', default='5,50,200', help='comma-separated file sizes in MB')
+    parser.add_argument('--json', dest='json_path')
+    args = parser.parse_args()
+
+    results = {}
+    for mb in [float(s) for s in args.sizes.split(',') if s.strip()]:
+        size = int(mb * 1024 * 1024)
+        row = {}
+        for name, fn in (('buffered', buffered), ('parts', parts)):
+            _, row[name] = measure(lambda: fn(size))
+        results[f'{mb:g}'] = row
+        print(f'{mb:g} MB: ' + ', '.join(f"{name} {r['seconds']}s, peak {r['peak_mb']} MB" for name, r in row.items()))
+
+    if args.json_path:
+        write_json(args.json_path, {'part_size': uploads.PART_SIZE, 'sizes_mb': results})
+
+
+if __name__ == '__main__':
+    main()
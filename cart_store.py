@@ -0,0 +1,167 @@
+"""Cart API operations shared by app.py and async_app.py.
+
+Each operation is a generator of driver steps (``db.step``) that returns the
+JSON body and status code of its ``/api/cart/*`` endpoint. Calling it runs it
+with pymongo; async_app.py runs ``op.steps(...)`` with motor, so both apps
+serve carts from this one copy. Stock is reserved through ``inventory.hold``
+before a line is added or grown, and released when it is removed.
+"""
+from bson.objectid import ObjectId
+
+import db
+import inventory
+import popularity
+
+
+AUTH_REQUIRED = {'success': False, 'message': 'Authentication required'}
+NOT_IN_CART = {'success': False, 'message': 'Item not found in cart'}
+EMPTY_CART = {'cart_items': [], 'total': 0, 'count': 0}
+# The reservation kept changing under a concurrent update; nothing was changed
+BUSY = {'success': False, 'message': 'Your cart is being updated, please try again', 'retry': True}
+
+
+def owner(session):
+    """The cart owner for this session; cart actions require a signed-in user."""
+    return session.get('user_id')
+
+
+def out_of_stock(e, product=None):
+    title = (product or {}).get('title', 'This product')
+    message = f'{title} is out of stock' if e.available <= 0 else f'Only {e.available} more of {title} available'
+    return {'success': False, 'message': message, 'available': e.available}, 409
+
+
+def summary(user_identifier):
+    cart_items = yield db.step('cart', 'find', {'user_identifier': user_identifier}, {'_id': 0})
+    total = sum(item['product_price'] * item['quantity'] for item in cart_items)
+    return cart_items, round(total, 2)
+
+
+@db.runs_sync
+def add(user_identifier, data):
+    if not user_identifier:
+        return AUTH_REQUIRED, 401
+    try:
+        product_id = data.get('product_id')
+        quantity = int(data.get('quantity', 1))
+
+        if not product_id:
+            return {'success': False, 'message': 'Product ID required'}, 400
+        if quantity < 1:
+            return {'success': False, 'message': 'Invalid quantity'}, 400
+
+        product = yield db.step('products', 'find_one', {'id': product_id}, {'_id': 0})
+        if not product:
+            return {'success': False, 'message': 'Product not found'}, 404
+
+        existing_item = yield db.step('cart', 'find_one', {'user_identifier': user_identifier, 'product_id': product_id})
+
+        # Reserve stock for the whole line before touching the cart
+        new_quantity = existing_item['quantity'] + quantity if existing_item else quantity
+        try:
+            yield from inventory.hold.steps(user_identifier, product_id, new_quantity)
+        except inventory.OutOfStock as e:
+            return out_of_stock(e, product)
+        except inventory.ReservationConflict:
+            return BUSY, 409
+
+        if existing_item:
+            yield db.step('cart', 'update_one', {'_id': existing_item['_id']}, {'$set': {'quantity': new_quantity}})
+        else:
+            yield db.step('cart', 'insert_one', {
+                'user_identifier': user_identifier,
+                'product_id': product_id,
+                'product_title': product.get('title', ''),
+                # Prefer image_url (GridFS) then image field then placeholder
+                'product_image': product.get('image_url') or product.get('image') or '/static/images/products/placeholder.png',
+                'product_price': float(product.get('price', 0)),
+                'quantity': quantity,
+                'added_at': ObjectId().generation_time,
+            })
+        popularity.record(product_id, popularity.CART_ADD)
+
+        cart_count = yield db.step('cart', 'count_documents', {'user_identifier': user_identifier})
+        return {'success': True, 'message': f'{product["title"]} added to cart!', 'cart_count': cart_count}, 200
+    except Exception as e:
+        print(f"Error adding to cart: {e}")
+        return {'success': False, 'message': 'Failed to add item to cart'}, 500
+
+
+@db.runs_sync
+def get(user_identifier):
+    # Unauthenticated users see an empty cart
+    if not user_identifier:
+        return EMPTY_CART, 401
+    try:
+        cart_items, total = yield from summary(user_identifier)
+        return {'cart_items': cart_items, 'total': total, 'count': len(cart_items)}, 200
+    except Exception as e:
+        print(f"Error getting cart: {e}")
+        return EMPTY_CART, 500
+
+
+@db.runs_sync
+def update(user_identifier, data):
+    if not user_identifier:
+        return AUTH_REQUIRED, 401
+    try:
+        product_id = data.get('product_id')
+        quantity = int(data.get('quantity', 1))
+
+        if not product_id or quantity < 1:
+            return {'success': False, 'message': 'Invalid data'}, 400
+
+        item_filter = {'user_identifier': user_identifier, 'product_id': product_id}
+        if not (yield db.step('cart', 'find_one', item_filter, {'_id': 1})):
+            return NOT_IN_CART, 404
+        try:
+            yield from inventory.hold.steps(user_identifier, product_id, quantity)
+        except inventory.OutOfStock as e:
+            return out_of_stock(e)
+        except inventory.ReservationConflict:
+            return BUSY, 409
+
+        result = yield db.step('cart', 'update_one', item_filter, {'$set': {'quantity': quantity}})
+        if result.matched_count == 0:
+            yield from inventory.release.steps(user_identifier, product_id)
+            return NOT_IN_CART, 404
+
+        cart_items, total = yield from summary(user_identifier)
+        return {'success': True, 'total': total, 'count': len(cart_items)}, 200
+    except Exception as e:
+        print(f"Error updating cart: {e}")
+        return {'success': False, 'message': 'Failed to update cart'}, 500
+
+
+@db.runs_sync
+def remove(user_identifier, data):
+    if not user_identifier:
+        return AUTH_REQUIRED, 401
+    try:
+        product_id = data.get('product_id')
+        if not product_id:
+            return {'success': False, 'message': 'Product ID required'}, 400
+
+        result = yield db.step('cart', 'delete_one', {'user_identifier': user_identifier, 'product_id': product_id})
+        if result.deleted_count == 0:
+            return NOT_IN_CART, 404
+        yield from inventory.release.steps(user_identifier, product_id)
+
+        cart_items, total = yield from summary(user_identifier)
+        return {'success': True, 'message': 'Item removed from cart', 'total': total, 'count': len(cart_items)}, 200
+    except Exception as e:
+        print(f"Error removing from cart: {e}")
+        return {'success': False, 'message': 'Failed to remove item'}, 500
+
+
+@db.runs_sync
+def clear(user_identifier):
+    if not user_identifier:
+        return AUTH_REQUIRED, 401
+    try:
+        yield db.step('cart', 'delete_many', {'user_identifier': user_identifier})
+        yield from inventory.release_all.steps(user_identifier)
+        return {'success': True, 'message': 'Cart cleared', 'total': 0, 'count': 0}, 200
+    except Exception as e:
+        print(f"Error clearing cart: {e}")
+        return {'success': False, 'message': 'Failed to clear cart'}, 500
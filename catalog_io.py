@@ -0,0 +1,183 @@
+"""Streaming catalog export and bulk import for the admin API.
+
+Exports read a server-side cursor in batches and yield CSV or NDJSON chunks
+of roughly ``EXPORT_CHUNK_BYTES``, so memory use does not grow with the
+catalog. Imports accept CSV, NDJSON or a JSON array, validate every row, and
+upsert valid rows by ``id`` with unordered ``bulk_write`` batches; invalid rows
+are reported by row number and never block the rest. Only the product fields
+in ``IMPORT_FIELDS`` are written; other columns (such as the ``reserved`` or
+``image_file_id`` of an NDJSON export) are ignored and listed in the summary.
+"""
+import csv
+import io
+import json
+import os
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+import fastjson
+
+
+EXPORT_CHUNK_BYTES = 64 * 1024
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '1000'))
+MAX_REPORTED_ERRORS = 500
+
+CSV_FIELDS = ['id', 'title', 'brand', 'price', 'stock', 'category', 'status',
+              'image', 'description', 'specs', 'colors', 'storage_options']
+LIST_FIELDS = ('colors', 'storage_options')
+LIST_SEPARATOR = '|'
+REQUIRED_FIELDS = ('id', 'title', 'price', 'category')
+# Only these columns are imported; others (reserved, image_file_id, ...) belong to the server
+IMPORT_FIELDS = frozenset(CSV_FIELDS)
+
+
+# --- Export ---
+
+def _csv_value(doc, field):
+    value = doc.get(field, '')
+    if field in LIST_FIELDS and isinstance(value, list):
+        return LIST_SEPARATOR.join(str(v) for v in value)
+    return '' if value is None else value
+
+
+def iter_csv(cursor, fields=CSV_FIELDS):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(fields)
+    for doc in cursor:
+        writer.writerow([_csv_value(doc, f) for f in fields])
+        if buf.tell() >= EXPORT_CHUNK_BYTES:
+            yield buf.getvalue().encode('utf-8')
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode('utf-8')
+
+
+def iter_ndjson(cursor):
+    chunk = []
+    size = 0
+    for doc in cursor:
+        line = fastjson.dumps(doc) + b'\n'
+        chunk.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield b''.join(chunk)
+            chunk, size = [], 0
+    if chunk:
+        yield b''.join(chunk)
+
+
+# --- Import ---
+
+def read_rows(stream, fmt):
+    """Yield raw row dicts from a binary stream in ``fmt`` ('csv', 'ndjson' or 'json')."""
+    if fmt == 'csv':
+        yield from csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    elif fmt == 'ndjson':
+        for line in io.TextIOWrapper(stream, encoding='utf-8'):
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    yield {'__error__': f'Invalid JSON: {e}'}
+    else:
+        payload = json.load(stream)
+        rows = payload.get('products', []) if isinstance(payload, dict) else payload
+        if not isinstance(rows, list):
+            raise ValueError('Expected a JSON array of products')
+        yield from rows
+
+
+def validate_row(row):
+    """Coerce one imported row into a product document; returns (doc, error_message)."""
+    if not isinstance(row, dict):
+        return None, 'Row is not an object'
+    if '__error__' in row:
+        return None, row['__error__']
+    doc = {k: v for k, v in row.items() if k in IMPORT_FIELDS and v not in (None, '')}
+    missing = [k for k in REQUIRED_FIELDS if k not in doc]
+    if missing:
+        return None, 'Missing fields: ' + ', '.join(missing)
+    try:
+        doc['id'] = int(doc['id'])
+    except (TypeError, ValueError):
+        return None, 'Invalid id'
+    try:
+        doc['price'] = float(doc['price'])
+    except (TypeError, ValueError):
+        return None, 'Invalid price'
+    if doc['price'] < 0:
+        return None, 'Invalid price'
+    if 'stock' in doc:
+        try:
+            doc['stock'] = int(doc['stock'])
+        except (TypeError, ValueError):
+            return None, 'Invalid stock'
+        if doc['stock'] < 0:
+            return None, 'Invalid stock'
+    for field in ('title', 'category', 'brand', 'status', 'image', 'description', 'specs'):
+        if field in doc:
+            doc[field] = str(doc[field]).strip()
+    if not doc['title'] or not doc['category']:
+        return None, 'Missing fields: title, category'
+    for field in LIST_FIELDS:
+        if isinstance(doc.get(field), str):
+            doc[field] = [v.strip() for v in doc[field].split(LIST_SEPARATOR) if v.strip()]
+    doc.setdefault('image', '')
+    return doc, None
+
+
+def import_rows(col, rows, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+    """Validate and upsert ``rows``; returns a summary with per-row errors (1-based row numbers)."""
+    summary = {'received': 0, 'valid': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'errors': [], 'error_count': 0}
+    ignored = set()
+    batch = []  # (row_number, doc)
+
+    def error(row_number, message, pid=None):
+        summary['error_count'] += 1
+        if len(summary['errors']) < MAX_REPORTED_ERRORS:
+            summary['errors'].append({'row': row_number, 'id': pid, 'message': message})
+
+    def flush():
+        if not batch or dry_run:
+            batch.clear()
+            return
+        ops = [UpdateOne({'id': doc['id']}, {'$set': doc}, upsert=True) for _, doc in batch]
+        try:
+            result = col.bulk_write(ops, ordered=False)
+            details = result.bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+            for err in details.get('writeErrors', []):
+                row_number, doc = batch[err['index']]
+                error(row_number, err.get('errmsg', 'Write failed'), doc['id'])
+        upserted = len(details.get('upserted', []))
+        summary['inserted'] += upserted
+        summary['updated'] += details.get('nModified', 0)
+        summary['unchanged'] += details.get('nMatched', 0) - details.get('nModified', 0)
+        batch.clear()
+
+    seen = {}
+    for row_number, row in enumerate(rows, start=1):
+        summary['received'] += 1
+        if isinstance(row, dict):
+            ignored.update(str(k) for k in row if k and k not in IMPORT_FIELDS and k != '__error__')
+        doc, message = validate_row(row)
+        if message:
+            error(row_number, message, row.get('id') if isinstance(row, dict) else None)
+            continue
+        if doc['id'] in seen:
+            error(row_number, f"Duplicate id {doc['id']} (also row {seen[doc['id']]})", doc['id'])
+            continue
+        seen[doc['id']] = row_number
+        summary['valid'] += 1
+        batch.append((row_number, doc))
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    summary['ignored_fields'] = sorted(ignored)
+    summary['dry_run'] = dry_run
+    return summary
@@ -0,0 +1,375 @@
+"""Local catalog snapshot and MongoDB circuit breaker for degraded read-only mode.
+
+Every ``CATALOG_SNAPSHOT_SECONDS`` one process per snapshot directory (the
+one holding its ``writer.lock`` file lock) reads the catalog and, if it
+changed, writes a compact versioned snapshot (one JSON file, replaced
+atomically) to ``CATALOG_SNAPSHOT_DIR``. GridFS product images are copied next
+to it, and each product records a pointer to its cached file. The other
+workers only reload the file when it changes; if the writer exits, the next
+worker to get the lock takes over. At boot the snapshot is loaded from disk
+before any database call is made. A relative ``CATALOG_SNAPSHOT_DIR`` is taken
+relative to this module, not the working directory. Setting
+``CATALOG_SNAPSHOT_SECONDS=0`` (as the test and benchmark scripts do) turns
+writing off.
+
+Catalog reads go through ``breaker.call``. They run under a
+``CATALOG_READ_TIMEOUT_MS`` deadline, so a slow server fails fast instead of
+tying up a worker. After ``BREAKER_FAILURE_THRESHOLD`` consecutive failures
+the breaker opens. Reads are then answered from the snapshot without trying
+MongoDB, and writes are refused with 503. While open, a probe thread pings
+the server every ``BREAKER_PROBE_SECONDS`` and closes the breaker once a
+ping succeeds.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no file locks, so every process writes (fine for a single dev server)
+    fcntl = None
+
+import pymongo
+from bson import ObjectId
+from pymongo.errors import PyMongoError
+
+import db
+import fastjson
+
+
+SNAPSHOT_FORMAT = 1
+CATALOG_SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                    os.getenv('CATALOG_SNAPSHOT_DIR', 'catalog_snapshot'))
+CATALOG_SNAPSHOT_SECONDS = float(os.getenv('CATALOG_SNAPSHOT_SECONDS', '300'))
+CATALOG_SNAPSHOT_IMAGES = os.getenv('CATALOG_SNAPSHOT_IMAGES', 'true').lower() == 'true'
+CATALOG_READ_TIMEOUT_MS = int(os.getenv('CATALOG_READ_TIMEOUT_MS', '1500'))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '3'))
+BREAKER_PROBE_SECONDS = float(os.getenv('BREAKER_PROBE_SECONDS', '5'))
+
+products_col = db.CollectionProxy('products')
+fs = db.GridFSProxy()
+
+
+# --- Circuit breaker ---
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, probe_interval=BREAKER_PROBE_SECONDS,
+                 timeout_ms=CATALOG_READ_TIMEOUT_MS, probe=None):
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.timeout_ms = timeout_ms
+        self._probe = probe or (lambda: db.ping(timeout_ms=timeout_ms))
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._state = self.CLOSED
+        self._opened_at = None
+        self._probe_thread = None
+        self.stats = {'opened': 0, 'closed': 0, 'failures': 0, 'fallbacks': 0}
+
+    @property
+    def state(self):
+        return self._state
+
+    def is_open(self):
+        return self._state == self.OPEN
+
+    def record_success(self):
+        if self._failures:
+            with self._lock:
+                self._failures = 0
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self._failures += 1
+            self.stats['failures'] += 1
+            if self._state == self.CLOSED and self._failures >= self.failure_threshold:
+                self._open(error)
+
+    def _open(self, error):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self.stats['opened'] += 1
+        print(f'⚠️ MongoDB circuit opened after {self._failures} failures ({type(error).__name__}); serving the catalog snapshot')
+        if self._probe_thread is None or not self._probe_thread.is_alive():
+            self._probe_thread = threading.Thread(target=self._probe_loop, name='mongo-breaker-probe', daemon=True)
+            self._probe_thread.start()
+
+    def _probe_loop(self):
+        while self._state == self.OPEN:
+            time.sleep(self.probe_interval)
+            if self._probe():
+                with self._lock:
+                    self._state = self.CLOSED
+                    self._failures = 0
+                    self.stats['closed'] += 1
+                print(f'✅ MongoDB reachable again after {time.monotonic() - self._opened_at:.1f}s; circuit closed')
+
+    def call(self, primary, fallback):
+        """Run ``primary`` against MongoDB, or ``fallback`` if the circuit is open or the call fails.
+
+        Returns ``(result, degraded)``.
+        """
+        if self._state == self.OPEN:
+            self.stats['fallbacks'] += 1
+            return fallback(), True
+        try:
+            with pymongo.timeout(self.timeout_ms / 1000.0):
+                result = primary()
+        except PyMongoError as e:
+            self.record_failure(e)
+            self.stats['fallbacks'] += 1
+            return fallback(), True
+        self.record_success()
+        return result, False
+
+    async def call_async(self, primary, fallback):
+        """``call`` for a coroutine function (async_app.py under motor)."""
+        if self._state == self.OPEN:
+            self.stats['fallbacks'] += 1
+            return fallback(), True
+        try:
+            result = await asyncio.wait_for(primary(), self.timeout_ms / 1000.0)
+        except (PyMongoError, asyncio.TimeoutError) as e:
+            self.record_failure(e)
+            self.stats['fallbacks'] += 1
+            return fallback(), True
+        self.record_success()
+        return result, False
+
+
+breaker = CircuitBreaker()
+
+
+# --- Snapshot ---
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+_loaded_mtime = None  # mtime_ns of the catalog.json last loaded or written by this process
+
+
+def _path(*parts):
+    return os.path.join(CATALOG_SNAPSHOT_DIR, *parts)
+
+
+def current():
+    """The loaded snapshot dict, or None."""
+    return _snapshot
+
+
+def products():
+    return _snapshot['products'] if _snapshot else None
+
+
+def find_product(pid):
+    if not _snapshot:
+        return None
+    return _snapshot['index'].get(pid)
+
+
+def response_headers(degraded):
+    """Headers marking a response as served from the snapshot (none when it wasn't)."""
+    if not degraded:
+        return {}
+    headers = {'X-Catalog-Source': 'snapshot'}
+    if _snapshot:
+        headers['X-Catalog-Snapshot-Version'] = str(_snapshot['version'])
+    return headers
+
+
+def image_path(pid):
+    """(local path, content type) of the cached image for ``pid``, or None."""
+    entry = _snapshot['images'].get(str(pid)) if _snapshot else None
+    if entry:
+        path = _path('images', entry['file'])
+        if os.path.exists(path):
+            return path, entry.get('content_type') or 'application/octet-stream'
+    return None
+
+
+def _install(snapshot):
+    global _snapshot
+    snapshot.setdefault('images', {})
+    snapshot['index'] = {p['id']: p for p in snapshot['products'] if 'id' in p}
+    with _snapshot_lock:
+        _snapshot = snapshot
+
+
+def _mtime():
+    try:
+        return os.stat(_path('catalog.json')).st_mtime_ns
+    except OSError:
+        return None
+
+
+def load():
+    """Load the snapshot from disk; returns True if one was found and is readable."""
+    global _loaded_mtime
+    path = _path('catalog.json')
+    try:
+        mtime = _mtime()
+        with open(path, 'rb') as f:
+            snapshot = fastjson.loads(f.read())
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        print(f'⚠️ Ignoring unreadable catalog snapshot {path}: {e}')
+        return False
+    if snapshot.get('format') != SNAPSHOT_FORMAT:
+        print(f"⚠️ Ignoring catalog snapshot with format {snapshot.get('format')}")
+        return False
+    _install(snapshot)
+    _loaded_mtime = mtime
+    print(f"📦 Loaded catalog snapshot v{snapshot['version']} ({len(snapshot['products'])} products)")
+    return True
+
+
+def _cache_images(docs, previous):
+    """Copy each referenced GridFS image to the local cache once; returns {pid: pointer}.
+
+    Files are named by GridFS id, so a replaced image gets a new file and
+    unreferenced files are removed.
+    """
+    os.makedirs(_path('images'), exist_ok=True)
+    images = {}
+    for doc in docs:
+        file_id = doc.get('image_file_id')
+        if not file_id or 'id' not in doc:
+            continue
+        name = str(file_id)
+        path = _path('images', name)
+        old = previous.get(str(doc['id']))
+        content_type = old['content_type'] if old and old['file'] == name else None
+        if not os.path.exists(path) or content_type is None:
+            try:
+                grid_out = fs.get(ObjectId(name))
+                content_type = grid_out.content_type or 'application/octet-stream'
+                if not os.path.exists(path):
+                    tmp = f'{path}.{os.getpid()}.tmp'
+                    with open(tmp, 'wb') as f:
+                        f.write(grid_out.read())
+                    os.replace(tmp, path)
+            except Exception as e:
+                print(f"⚠️ Could not cache image for product {doc['id']}: {e}")
+                continue
+        images[str(doc['id'])] = {'file': name, 'content_type': content_type}
+    keep = {entry['file'] for entry in images.values()}
+    for name in os.listdir(_path('images')):
+        if name not in keep and not name.endswith('.tmp'):
+            try:
+                os.remove(_path('images', name))
+            except OSError:
+                pass
+    return images
+
+
+def refresh():
+    """Read the catalog from MongoDB and persist it if it changed; returns the snapshot version.
+
+    Only the writer process calls this (see ``_is_writer``).
+    """
+    global _loaded_mtime
+    with pymongo.timeout(max(CATALOG_READ_TIMEOUT_MS, 30000) / 1000.0):
+        docs = list(products_col.find({}, {'_id': 0}).sort('id', 1))
+    payload = fastjson.dumps(docs)
+    digest = hashlib.sha256(payload).hexdigest()[:16]
+    if _snapshot and _snapshot.get('checksum') == digest:
+        return _snapshot['version']
+    images = _cache_images(docs, _snapshot['images'] if _snapshot else {}) if CATALOG_SNAPSHOT_IMAGES else {}
+    snapshot = {
+        'format': SNAPSHOT_FORMAT,
+        'version': (_snapshot['version'] + 1) if _snapshot else 1,
+        'checksum': digest,
+        'created_at': time.time(),
+        # Round-trip through JSON so in-memory products match what load() reads back
+        'products': fastjson.loads(payload),
+        'images': images,
+    }
+    os.makedirs(CATALOG_SNAPSHOT_DIR, exist_ok=True)
+    tmp = _path(f'catalog.json.{os.getpid()}.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(fastjson.dumps(snapshot))
+    os.replace(tmp, _path('catalog.json'))
+    _install(snapshot)
+    _loaded_mtime = _mtime()
+    print(f"📦 Wrote catalog snapshot v{snapshot['version']} ({len(docs)} products, {len(images)} images)")
+    return snapshot['version']
+
+
+def age_seconds():
+    return time.time() - _snapshot['created_at'] if _snapshot else None
+
+
+_writer_lock_file = None
+
+
+def _is_writer():
+    """Hold (or try to take) the directory's writer lock; the holder keeps it until it exits."""
+    global _writer_lock_file
+    if fcntl is None:
+        return True
+    if _writer_lock_file is not None:
+        return True
+    os.makedirs(CATALOG_SNAPSHOT_DIR, exist_ok=True)
+    f = open(_path('writer.lock'), 'a')
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return False
+    _writer_lock_file = f
+    print(f'📦 Process {os.getpid()} writes the catalog snapshot')
+    return True
+
+
+def _reload_if_changed():
+    mtime = _mtime()
+    if mtime is not None and mtime != _loaded_mtime:
+        load()
+
+
+def _refresh_loop(interval):
+    while True:
+        try:
+            # Pick up the writer's latest file first, so a new writer continues its version count
+            _reload_if_changed()
+            if _is_writer() and not breaker.is_open():
+                refresh()
+        except PyMongoError as e:
+            breaker.record_failure(e)
+            print(f'Catalog snapshot refresh failed: {e}')
+        except Exception as e:
+            print(f'Catalog snapshot refresh failed: {e}')
+        time.sleep(interval)
+
+
+_refresher_lock = threading.Lock()
+_refresher_pid = None
+
+
+def init(interval=CATALOG_SNAPSHOT_SECONDS):
+    """Load the snapshot from disk and start the refresher thread, once per process."""
+    global _refresher_pid
+    with _refresher_lock:
+        if _refresher_pid == os.getpid():
+            return
+        _refresher_pid = os.getpid()
+    if _snapshot is None:
+        load()
+    if interval > 0:
+        threading.Thread(target=_refresh_loop, args=(interval,), name='catalog-snapshot', daemon=True).start()
+
+
+def gauges():
+    yield ('catalog_breaker_open', 'Whether catalog reads are being served from the local snapshot.', {},
+           int(breaker.is_open()))
+    for name in ('opened', 'failures', 'fallbacks'):
+        yield ('catalog_breaker_events', 'MongoDB circuit breaker events.', {'event': name}, breaker.stats[name])
+    if _snapshot:
+        yield ('catalog_snapshot_version', 'Version of the loaded catalog snapshot.', {}, _snapshot['version'])
+        yield ('catalog_snapshot_age_seconds', 'Age of the loaded catalog snapshot.', {}, age_seconds())
+        yield ('catalog_snapshot_products', 'Products in the loaded catalog snapshot.', {}, len(_snapshot['products']))
@@ -1,15 +1,21 @@
+"""RAG chatbot (LangChain + Chroma + Gemini).
+
+The LangChain / Chroma / Gemini stack is heavy to import and construct, so it
+is built lazily: on the first turn that needs it, or ahead of time by
+``warm_up()`` on a background thread. ``is_ready()`` reports whether it has
+been built. Importing this module only loads the standard library.
+
+A failed build is retried, but not on every turn: after the n-th failure
+the next attempt waits ``CHATBOT_RETRY_SECONDS * 2**(n-1)`` (at most
+``CHATBOT_RETRY_MAX_SECONDS``), and ``stack_state()`` reports "unavailable"
+until then. Catalog lookups (``answer_without_stack``) work in any state.
+"""
 import os
+import threading
+import time
 from dotenv import load_dotenv
-from langchain_google_genai import GoogleGenerativeAI
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_chroma import Chroma
-from langchain.chains import create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain.chains import create_history_aware_retriever
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain_core.chat_history import BaseChatMessageHistory
-from langchain_core.runnables.history import RunnableWithMessageHistory
+from chatbot_context import retriever_settings, assemble_context, log_prompt_tokens
+from chatbot_router import router, ROUTE_LOOKUP, ROUTE_FIRST_TURN
 
 
 load_dotenv()
@@ -17,25 +23,35 @@ load_dotenv()
 # Allow either GEMINI_API_KEY or GOOGLE_API_KEY from env/.env
 gemini_api_key = os.environ.get("GEMINI_API_KEY") or os.environ.get("GOOGLE_API_KEY")
 
-CHATBOT_READY = bool(gemini_api_key)
+# "gemini" (default) or "fake" for offline deterministic stand-ins (see chatbot_fakes.py)
+CHATBOT_PROVIDER = os.environ.get("CHATBOT_PROVIDER", "gemini").lower()
+USE_FAKE_PROVIDER = CHATBOT_PROVIDER == "fake"
 
-if CHATBOT_READY:
-    # Propagate to expected env var for the client lib
-    os.environ["GOOGLE_API_KEY"] = gemini_api_key
+# True when the chatbot is configured; the stack itself may not be built yet (see is_ready)
+CHATBOT_READY = USE_FAKE_PROVIDER or bool(gemini_api_key)
+CHATBOT_RETRY_SECONDS = float(os.environ.get("CHATBOT_RETRY_SECONDS", "30"))
+CHATBOT_RETRY_MAX_SECONDS = float(os.environ.get("CHATBOT_RETRY_MAX_SECONDS", "600"))
+# Fake embeddings have a different dimension, so they get their own store by default
+PERSIST_DIRECTORY = os.environ.get("CHROMA_PERSIST_DIR", "chroma_db_fake" if USE_FAKE_PROVIDER else "chroma_db")
 
-    LLModel = GoogleGenerativeAI(model="gemini-2.5-flash")
-    embedding_model = GoogleGenerativeAIEmbeddings(model="gemini-embedding-001")
-    vectorstore = Chroma(persist_directory="chroma_db", embedding_function=embedding_model)
-    retriever = vectorstore.as_retriever(
-        search_type="similarity",
-        #search_kwargs={"k": 4}
-    )
-else:
-    # Placeholders to avoid NameError if imported when not configured
-    LLModel = None
-    embedding_model = None
-    vectorstore = None
-    retriever = None
+# Populated by _build_stack()
+LLModel = None
+embedding_model = None
+vectorstore = None
+retriever = None
+QAchain = None
+RAGChain = None
+history_aware_retriever = None
+conversational_rag_chain = None
+ConvRAGChain = None
+
+_stack_lock = threading.Lock()
+_stack_ready = threading.Event()
+_warmup_thread = None
+stack_error = None
+stack_build_seconds = None
+stack_failures = 0
+_next_retry_at = 0.0
 
 system_prompt = """
 You are a helpful, customer-friendly mobile phone shop agent.
@@ -84,16 +100,6 @@ Here is the information about our available phones:
 {context}
 """
 
-prompt = ChatPromptTemplate.from_messages([
-    ("system", system_prompt),
-    ("human", "{input}")
-])
-
-QAchain = create_stuff_documents_chain(LLModel, prompt) if CHATBOT_READY else None
-
-# This was the old RAGChain, which was not history-aware.
-# RAGChain = create_retrieval_chain(retriever, QAchain)
-
 context_system_prompt = (
     "Given a chat history and the latest user question "
     "which might reference context in the chat history, "
@@ -101,56 +107,256 @@ context_system_prompt = (
     "Do NOT answer the question, just reformulate it if needed and otherwise return it as is."
 )
 
-context_prompt = ChatPromptTemplate.from_messages([
-    ("system", context_system_prompt),
-    MessagesPlaceholder("chat_history"),
-    ("human", "{input}"),
-])
 
-history_aware_retriever = (
-    create_history_aware_retriever(LLModel, retriever, context_prompt)
-    if CHATBOT_READY else None
-)
+def _build_stack():
+    global LLModel, embedding_model, vectorstore, retriever, QAchain, RAGChain
+    global history_aware_retriever, conversational_rag_chain, ConvRAGChain
+    from langchain_chroma import Chroma
+    from langchain.chains import create_retrieval_chain
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+    from langchain.chains import create_history_aware_retriever
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+    from langchain_core.runnables import RunnableLambda
+    from langchain_core.runnables.history import RunnableWithMessageHistory
 
-# Create the new conversational RAG chain
-conversational_rag_chain = (
-    create_retrieval_chain(history_aware_retriever, QAchain)
-    if CHATBOT_READY else None
-)
+    if USE_FAKE_PROVIDER:
+        from chatbot_fakes import FakeLLM, FakeEmbeddings
 
+        llm = FakeLLM(latency=float(os.environ.get("FAKE_LLM_LATENCY_MS", "300")) / 1000)
+        embeddings = FakeEmbeddings(latency=float(os.environ.get("FAKE_EMBED_LATENCY_MS", "30")) / 1000)
+    else:
+        from langchain_google_genai import GoogleGenerativeAI
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
 
-store = {}
+        # Propagate to expected env var for the client lib
+        os.environ["GOOGLE_API_KEY"] = gemini_api_key
+        llm = GoogleGenerativeAI(model="gemini-2.5-flash")
+        embeddings = GoogleGenerativeAIEmbeddings(model="gemini-embedding-001")
+
+    store_ = Chroma(persist_directory=PERSIST_DIRECTORY, embedding_function=embeddings)
+    search_type, search_kwargs = retriever_settings()
+    # Retrieved docs are deduplicated/trimmed/packed into a fixed token budget
+    retriever_ = store_.as_retriever(
+        search_type=search_type,
+        search_kwargs=search_kwargs,
+    ) | RunnableLambda(assemble_context)
 
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        ("human", "{input}")
+    ])
+    qa_chain = create_stuff_documents_chain(RunnableLambda(log_prompt_tokens) | llm, prompt)
 
-def get_session_history(session_id: str) -> BaseChatMessageHistory:
-    if session_id not in store:
-        store[session_id] = ChatMessageHistory()
-    return store[session_id]
+    # Plain (not history-aware) chain: used on the first turn of a session, where
+    # there is no history to reformulate against, so the rewrite LLM call is skipped.
+    rag_chain = create_retrieval_chain((lambda x: x["input"]) | retriever_, qa_chain)
 
+    context_prompt = ChatPromptTemplate.from_messages([
+        ("system", context_system_prompt),
+        MessagesPlaceholder("chat_history"),
+        ("human", "{input}"),
+    ])
+    # Tagged so StageTimer can tell reformulation apart from answer generation
+    history_retriever = create_history_aware_retriever(
+        llm.with_config(tags=["reformulate"]), retriever_, context_prompt
+    )
+    conv_chain = create_retrieval_chain(history_retriever, qa_chain)
 
-ConvRAGChain = (
-    RunnableWithMessageHistory(
-        conversational_rag_chain,
+    LLModel, embedding_model, vectorstore, retriever = llm, embeddings, store_, retriever_
+    QAchain, RAGChain = qa_chain, rag_chain
+    history_aware_retriever, conversational_rag_chain = history_retriever, conv_chain
+    ConvRAGChain = RunnableWithMessageHistory(
+        conv_chain,
         get_session_history,
         input_messages_key="input",
         history_messages_key="chat_history",
         output_messages_key="answer",
-    ) if CHATBOT_READY else None
-)
+    )
+
+
+def ensure_stack():
+    """Build the chatbot stack if needed (blocking). Returns True when it is usable."""
+    global stack_error, stack_build_seconds, stack_failures, _next_retry_at
+    if _stack_ready.is_set():
+        return True
+    if not CHATBOT_READY:
+        return False
+    with _stack_lock:
+        if not _stack_ready.is_set():
+            if stack_failures and time.monotonic() < _next_retry_at:
+                return False  # failed recently; don't rebuild on every turn
+            started = time.perf_counter()
+            try:
+                _build_stack()
+            except Exception as e:
+                stack_error = str(e)
+                stack_failures += 1
+                delay = min(CHATBOT_RETRY_MAX_SECONDS, CHATBOT_RETRY_SECONDS * 2 ** (stack_failures - 1))
+                _next_retry_at = time.monotonic() + delay
+                print(f"❌ Chatbot stack failed to load (attempt {stack_failures}, retrying in {delay:g}s): {e}")
+                return False
+            stack_error = None
+            stack_failures = 0
+            stack_build_seconds = round(time.perf_counter() - started, 3)
+            _stack_ready.set()
+            print(f"🤖 Chatbot stack ready in {stack_build_seconds}s")
+    return True
 
 
-def get_chatbot_response(message, session_id="default"):
+def is_ready():
+    return _stack_ready.is_set()
+
+
+def retry_in():
+    """Seconds until a failed stack is built again (0 if a build may start now)."""
+    return max(0.0, _next_retry_at - time.monotonic()) if stack_failures else 0.0
+
+
+def stack_state():
+    """One of "unconfigured", "ready", "warming" (being built, or about to be) and "unavailable"."""
     if not CHATBOT_READY:
+        return "unconfigured"
+    if _stack_ready.is_set():
+        return "ready"
+    building = _warmup_thread is not None and _warmup_thread.is_alive()
+    if stack_failures and not building:
+        return "unavailable"
+    return "warming"
+
+
+def warm_up(background=True):
+    """Start building the stack; on a daemon thread unless ``background`` is False."""
+    global _warmup_thread
+    if not CHATBOT_READY or _stack_ready.is_set() or retry_in() > 0:
+        return
+    if not background:
+        ensure_stack()
+        return
+    with _stack_lock:
+        if _warmup_thread is not None and _warmup_thread.is_alive():
+            return
+        _warmup_thread = threading.Thread(target=ensure_stack, name="chatbot-warmup", daemon=True)
+        _warmup_thread.start()
+
+
+store = {}
+# Lookup turns of sessions that have no LangChain history yet, as (message, answer)
+# pairs; they move into it when get_session_history first creates it
+_pending_turns = {}
+_history_lock = threading.Lock()
+
+
+def get_session_history(session_id: str):
+    history = store.get(session_id)
+    if history is None:
+        from langchain_community.chat_message_histories import ChatMessageHistory
+        with _history_lock:
+            history = store.get(session_id)
+            if history is None:
+                history = store[session_id] = ChatMessageHistory()
+                for message, answer in _pending_turns.pop(session_id, ()):
+                    history.add_user_message(message)
+                    history.add_ai_message(answer)
+    return history
+
+
+def _has_history(session_id):
+    with _history_lock:
+        history = store.get(session_id)
+        return bool(history.messages) if history is not None else bool(_pending_turns.get(session_id))
+
+
+def get_chatbot_response(message, session_id="default", timings=None, cancel_event=None):
+    """Answer ``message`` for ``session_id``, building the stack first if needed.
+
+    If a ``timings`` dict is passed it is filled with the chosen route and the
+    seconds spent in retrieval, reformulation, generation and in total. Setting
+    ``cancel_event`` stops the chain before its next retrieval or LLM call.
+    """
+    started = time.perf_counter()
+    try:
+        return _respond(message, session_id, timings, cancel_event)
+    finally:
+        if timings is not None:
+            timings["total"] = time.perf_counter() - started
+
+
+def _remember_lookup(session_id, message, answer):
+    # Structured lookup answered from the catalog; keep it in history for follow-ups.
+    # Without a LangChain history yet, keep it in a plain list so lookups never import LangChain.
+    with _history_lock:
+        history = store.get(session_id)
+        if history is None:
+            _pending_turns.setdefault(session_id, []).append((message, answer))
+            return
+    history.add_user_message(message)
+    history.add_ai_message(answer)
+
+
+def answer_without_stack(message, session_id="default"):
+    """Answer ``message`` if the router can do it from the catalog alone, else None.
+
+    Used while the stack is still building or unavailable, so lookups keep
+    working. Other turns are left uncounted for ``get_chatbot_response``.
+    """
+    answer = router.lookup(message)
+    if answer is None:
+        return None
+    router.record(ROUTE_LOOKUP)
+    _remember_lookup(session_id, message, answer)
+    return answer
+
+
+def _respond(message, session_id, timings, cancel_event):
+    route, answer = router.route(message, has_history=_has_history(session_id))
+    if timings is not None:
+        timings["route"] = route
+    if route == ROUTE_LOOKUP:
+        _remember_lookup(session_id, message, answer)
+        return answer
+    if not ensure_stack():
+        if CHATBOT_READY:
+            return "Sorry, the assistant is unavailable right now. Please try again later."
         return (
             "Chatbot is not configured. Please set GEMINI_API_KEY (or GOOGLE_API_KEY) in your .env file "
             "and restart the server."
         )
+    from chatbot_callbacks import StageTimer, CancelCheck, ChatCancelled
+
+    history = get_session_history(session_id)
+
+    timer = StageTimer()
+    callbacks = [timer] if cancel_event is None else [timer, CancelCheck(cancel_event)]
     try:
-        response = ConvRAGChain.invoke(
-            {"input": message},
-            config={"configurable": {"session_id": session_id}},
-        )
+        if route == ROUTE_FIRST_TURN:
+            response = RAGChain.invoke({"input": message}, config={"callbacks": callbacks})
+            history.add_user_message(message)
+            history.add_ai_message(response["answer"])
+        else:
+            response = ConvRAGChain.invoke(
+                {"input": message},
+                config={"configurable": {"session_id": session_id}, "callbacks": callbacks},
+            )
         return response["answer"]
+    except ChatCancelled:
+        return None
     except Exception as e:
         print(f"Error in chatbot response: {e}")
         return "Sorry, I encountered an error processing your request. Please try again."
+    finally:
+        if timings is not None:
+            timings.update(timer.timings)
+
+
+def get_chatbot_stats():
+    stats = router.stats()
+    stats["stack"] = {
+        "configured": CHATBOT_READY,
+        "ready": is_ready(),
+        "state": stack_state(),
+        "failures": stack_failures,
+        "retry_in_seconds": round(retry_in(), 1),
+        "build_seconds": stack_build_seconds,
+        "error": stack_error,
+    }
+    return stats
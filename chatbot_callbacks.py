@@ -0,0 +1,62 @@
+"""LangChain callback handlers used per chatbot turn (stage timing and cancellation)."""
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+class ChatCancelled(Exception):
+    pass
+
+
+class StageTimer(BaseCallbackHandler):
+    """Callback handler that accumulates retrieval / reformulation / generation time."""
+
+    def __init__(self):
+        self.timings = {}
+        self._starts = {}
+
+    def _start(self, run_id, stage):
+        self._starts[run_id] = (time.perf_counter(), stage)
+
+    def _end(self, run_id):
+        started = self._starts.pop(run_id, None)
+        if started:
+            t0, stage = started
+            self.timings[stage] = self.timings.get(stage, 0.0) + time.perf_counter() - t0
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._start(run_id, "retrieval")
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, tags=None, **kwargs):
+        self._start(run_id, "reformulation" if "reformulate" in (tags or []) else "generation")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+
+class CancelCheck(BaseCallbackHandler):
+    """Aborts the chain before its next retrieval or LLM call once ``event`` is set."""
+
+    raise_error = True
+
+    def __init__(self, event):
+        self.event = event
+
+    def _check(self):
+        if self.event.is_set():
+            raise ChatCancelled()
+
+    def on_retriever_start(self, serialized, query, **kwargs):
+        self._check()
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._check()
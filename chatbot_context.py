@@ -0,0 +1,79 @@
+"""Retrieval settings and token-budgeted context assembly for the chatbot.
+
+Retrieved documents are deduplicated, trimmed to a per-document cap and packed
+(in relevance order) into a fixed token budget before they are stuffed into
+the system prompt, so prompt size no longer grows with the catalog.
+"""
+import hashlib
+import os
+import re
+
+
+SEARCH_TYPE = os.environ.get("CHATBOT_SEARCH_TYPE", "similarity")  # similarity | mmr | similarity_score_threshold
+RETRIEVER_K = int(os.environ.get("CHATBOT_RETRIEVER_K", "6"))
+FETCH_K = int(os.environ.get("CHATBOT_FETCH_K", "20"))
+MMR_LAMBDA = float(os.environ.get("CHATBOT_MMR_LAMBDA", "0.5"))
+SCORE_THRESHOLD = float(os.environ.get("CHATBOT_SCORE_THRESHOLD", "0.3"))
+
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CHATBOT_CONTEXT_TOKENS", "1500"))
+MAX_DOC_TOKENS = int(os.environ.get("CHATBOT_MAX_DOC_TOKENS", "400"))
+
+# Rough chars-per-token ratio for English text; avoids a tokenizer round trip per turn
+CHARS_PER_TOKEN = 4
+
+
+def retriever_settings():
+    """Return ``(search_type, search_kwargs)`` for ``vectorstore.as_retriever``."""
+    search_kwargs = {"k": RETRIEVER_K}
+    if SEARCH_TYPE == "mmr":
+        search_kwargs.update(fetch_k=max(FETCH_K, RETRIEVER_K), lambda_mult=MMR_LAMBDA)
+    elif SEARCH_TYPE == "similarity_score_threshold":
+        search_kwargs["score_threshold"] = SCORE_THRESHOLD
+    elif SEARCH_TYPE != "similarity":
+        raise ValueError(f"Unsupported CHATBOT_SEARCH_TYPE: {SEARCH_TYPE}")
+    return SEARCH_TYPE, search_kwargs
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _trim(text, max_tokens):
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind("\n", 0, max_chars)
+    if cut < max_chars // 2:
+        cut = text.rfind(" ", 0, max_chars)
+    return text[:cut if cut > 0 else max_chars].rstrip() + " ..."
+
+
+def _fingerprint(text):
+    return hashlib.sha1(re.sub(r"\s+", " ", text).strip().lower().encode("utf-8")).hexdigest()
+
+
+def assemble_context(docs, budget=CONTEXT_TOKEN_BUDGET, max_doc_tokens=MAX_DOC_TOKENS):
+    """Deduplicate, trim and pack retrieved documents into ``budget`` tokens.
+
+    Documents keep their retrieval (relevance) order; one that does not fit in
+    the remaining budget is skipped so a smaller later one can still be used.
+    """
+    packed, seen, used = [], set(), 0
+    for doc in docs:
+        fingerprint = _fingerprint(doc.page_content)
+        if fingerprint in seen:
+            continue
+        seen.add(fingerprint)
+        text = _trim(doc.page_content, max_doc_tokens)
+        cost = estimate_tokens(text)
+        if used + cost > budget:
+            continue
+        used += cost
+        packed.append(doc if text == doc.page_content else type(doc)(page_content=text, metadata=doc.metadata))
+    return packed
+
+
+def log_prompt_tokens(prompt_value):
+    """Pass-through step placed in front of the answering LLM to log prompt size."""
+    print(f"[chatbot] prompt tokens~{estimate_tokens(prompt_value.to_string())}")
+    return prompt_value
@@ -0,0 +1,69 @@
+"""Offline, deterministic stand-ins for the Gemini LLM and embedding models.
+
+Enabled with ``CHATBOT_PROVIDER=fake``. Both providers sleep for a configurable
+artificial latency so the RAG path can be exercised and profiled without an API
+key, and both return the same output for the same input on every run.
+"""
+import hashlib
+import math
+import re
+import time
+from typing import Any, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class FakeLLM(LLM):
+    """Echoes the question when asked to reformulate, otherwise answers from the first context line."""
+
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        human_lines = [line[len("Human: "):] for line in prompt.splitlines() if line.startswith("Human: ")]
+        question = human_lines[-1] if human_lines else prompt[-200:]
+        if "standalone question" in prompt:
+            return question
+        marker = "Here is the information about our available phones:"
+        context = prompt.split(marker, 1)[1].strip() if marker in prompt else ""
+        first = next((line for line in context.splitlines() if line.strip()), "no matching products")
+        return f"Based on our catalog ({first.strip()}), here is what I found about: {question} [{_digest(prompt)[:8]}]"
+
+
+class FakeEmbeddings(Embeddings):
+    """Hashed bag-of-words vectors: texts sharing words land close together."""
+
+    def __init__(self, size=256, latency=0.0):
+        self.size = size
+        self.latency = latency
+
+    def _embed(self, text):
+        vec = [0.0] * self.size
+        for token in _TOKEN.findall(text.lower()):
+            h = int(_digest(token)[:8], 16)
+            vec[h % self.size] += 1.0 if h & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+        return [v / norm for v in vec]
+
+    def embed_documents(self, texts):
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._embed(text)
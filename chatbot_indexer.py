@@ -0,0 +1,305 @@
+"""Build and incrementally refresh the chatbot's Chroma vector store.
+
+Documents come from the MongoDB ``products`` collection and from
+data/mobile_phones.csv. Every record is rendered to text, split into chunks and
+fingerprinted with a SHA-256 content hash. A manifest of ``doc_id -> hash`` is
+kept next to the Chroma files so that a sync only re-embeds chunks whose hash
+changed and deletes chunks whose source record disappeared.
+
+Usage:
+    python chatbot_indexer.py             # incremental sync
+    python chatbot_indexer.py --full      # drop everything and rebuild
+    python chatbot_indexer.py --compare   # time a full rebuild vs an incremental sync
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PHONES_CSV = os.path.join(HERE, 'data', 'mobile_phones.csv')
+PERSIST_DIRECTORY = os.getenv('CHROMA_PERSIST_DIR', 'chroma_db')
+MANIFEST_NAME = 'index_manifest.json'
+
+CHUNK_SIZE = int(os.getenv('INDEXER_CHUNK_SIZE', '1000'))
+CHUNK_OVERLAP = int(os.getenv('INDEXER_CHUNK_OVERLAP', '100'))
+BATCH_SIZE = int(os.getenv('INDEXER_BATCH_SIZE', '64'))
+EMBED_WORKERS = int(os.getenv('INDEXER_EMBED_WORKERS', '4'))
+DEBOUNCE_SECONDS = float(os.getenv('INDEXER_DEBOUNCE_SECONDS', '5'))
+
+
+# --- Source records -> text ---
+
+def _format_specs(specs):
+    if isinstance(specs, dict):
+        return '\n'.join(f'{k}: {v}' for k, v in specs.items())
+    return str(specs or '').strip()
+
+
+def render_product(p):
+    lines = [
+        f"Product ID: {p.get('id')}",
+        f"Title: {p.get('title', '')}",
+        f"Category: {p.get('category', '')}",
+        f"Price (USD): {p.get('price', '')}",
+    ]
+    if p.get('brand'):
+        lines.append(f"Brand: {p['brand']}")
+    if p.get('stock') is not None:
+        lines.append(f"Stock: {p['stock']}")
+    if p.get('description'):
+        lines.append(f"Description: {p['description']}")
+    specs = _format_specs(p.get('specs'))
+    if specs:
+        lines.append('Specs:\n' + specs)
+    return '\n'.join(lines)
+
+
+def render_phone(row):
+    return '\n'.join(f'{k}: {v}' for k, v in row.items() if v not in (None, ''))
+
+
+def chunk_text(text, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """Split text into overlapping windows, preferring to break on newlines."""
+    if len(text) <= size:
+        return [text]
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            cut = text.rfind('\n', start + size // 2, end)
+            if cut != -1:
+                end = cut
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return [c for c in chunks if c]
+
+
+def _content_hash(text, metadata):
+    h = hashlib.sha256()
+    h.update(text.encode('utf-8'))
+    h.update(json.dumps(metadata, sort_keys=True, default=str).encode('utf-8'))
+    return h.hexdigest()
+
+
+def _clean_metadata(meta):
+    # Chroma only accepts str/int/float/bool metadata values
+    return {k: v for k, v in meta.items() if isinstance(v, (str, int, float, bool))}
+
+
+def load_phone_rows(csv_path=PHONES_CSV):
+    if not os.path.exists(csv_path):
+        return []
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def build_documents(products, phone_rows):
+    """Return {doc_id: {'text', 'metadata', 'hash'}} for every chunk."""
+    docs = {}
+    for p in products:
+        if p.get('id') is None:
+            continue
+        base = {
+            'source': 'product',
+            'product_id': p.get('id'),
+            'title': p.get('title'),
+            'category': p.get('category'),
+            'price': p.get('price'),
+        }
+        for i, chunk in enumerate(chunk_text(render_product(p))):
+            meta = _clean_metadata(dict(base, chunk=i))
+            docs[f"product:{p['id']}:{i}"] = {'text': chunk, 'metadata': meta, 'hash': _content_hash(chunk, meta)}
+    for row in phone_rows:
+        key = f"{row.get('Brand', '')}-{row.get('Model', '')}".strip('-').lower().replace(' ', '-')
+        if not key:
+            continue
+        base = {'source': 'phone_specs', 'brand': row.get('Brand'), 'model': row.get('Model')}
+        for i, chunk in enumerate(chunk_text(render_phone(row))):
+            meta = _clean_metadata(dict(base, chunk=i))
+            docs[f'phone:{key}:{i}'] = {'text': chunk, 'metadata': meta, 'hash': _content_hash(chunk, meta)}
+    return docs
+
+
+# --- Manifest ---
+
+def _manifest_path(persist_directory):
+    return os.path.join(persist_directory, MANIFEST_NAME)
+
+
+def load_manifest(persist_directory=PERSIST_DIRECTORY):
+    try:
+        with open(_manifest_path(persist_directory), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest, persist_directory=PERSIST_DIRECTORY):
+    os.makedirs(persist_directory, exist_ok=True)
+    path = _manifest_path(persist_directory)
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(tmp, path)
+
+
+# --- Sync ---
+
+def diff_documents(docs, manifest):
+    """Split doc ids into (to_upsert, to_delete, unchanged_count)."""
+    to_upsert = [doc_id for doc_id, d in docs.items() if manifest.get(doc_id) != d['hash']]
+    to_delete = [doc_id for doc_id in manifest if doc_id not in docs]
+    return to_upsert, to_delete, len(docs) - len(to_upsert)
+
+
+def _batches(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def sync_index(vectorstore, embedding_model, docs, full=False, batch_size=BATCH_SIZE,
+               workers=EMBED_WORKERS, persist_directory=PERSIST_DIRECTORY):
+    """Bring the vector store in line with ``docs`` and return sync stats.
+
+    Embeddings for each batch are requested in parallel; the upserts into
+    Chroma happen on the calling thread as batches complete.
+    """
+    started = time.perf_counter()
+    manifest = {} if full else load_manifest(persist_directory)
+    if full:
+        existing = vectorstore.get(include=[]).get('ids', [])
+        for batch in _batches(existing, 5000):
+            vectorstore.delete(ids=batch)
+
+    to_upsert, to_delete, unchanged = diff_documents(docs, manifest)
+
+    for batch in _batches(to_delete, 5000):
+        vectorstore.delete(ids=batch)
+        for doc_id in batch:
+            manifest.pop(doc_id, None)
+
+    def embed(batch_ids):
+        return batch_ids, embedding_model.embed_documents([docs[i]['text'] for i in batch_ids])
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for batch_ids, vectors in pool.map(embed, list(_batches(to_upsert, batch_size))):
+            vectorstore._collection.upsert(
+                ids=batch_ids,
+                embeddings=vectors,
+                documents=[docs[i]['text'] for i in batch_ids],
+                metadatas=[docs[i]['metadata'] for i in batch_ids],
+            )
+            for doc_id in batch_ids:
+                manifest[doc_id] = docs[doc_id]['hash']
+            # Persist progress so an interrupted run does not redo finished batches
+            save_manifest(manifest, persist_directory)
+
+    save_manifest(manifest, persist_directory)
+    return {
+        'mode': 'full' if full else 'incremental',
+        'documents': len(docs),
+        'upserted': len(to_upsert),
+        'deleted': len(to_delete),
+        'unchanged': unchanged,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def sync_from_sources(products_col, full=False, **kwargs):
+    """Read products + CSV specs and sync them into the chatbot's vector store."""
+    import chatbot_backend
+    if not chatbot_backend.ensure_stack():
+        return None
+    products = list(products_col.find({}, {'_id': 0})) if products_col is not None else []
+    docs = build_documents(products, load_phone_rows())
+    kwargs.setdefault('persist_directory', chatbot_backend.PERSIST_DIRECTORY)
+    return sync_index(chatbot_backend.vectorstore, chatbot_backend.embedding_model, docs, full=full, **kwargs)
+
+
+# --- In-app hook ---
+
+_sync_lock = threading.Lock()
+_timer_lock = threading.Lock()
+_pending_timer = None
+
+
+def _run_scheduled_sync(products_col):
+    global _pending_timer
+    with _timer_lock:
+        _pending_timer = None
+    with _sync_lock:
+        try:
+            stats = sync_from_sources(products_col)
+            if stats:
+                print(f"🔄 Chatbot index synced: {stats}")
+        except Exception as e:
+            print(f"Chatbot index sync failed: {e}")
+
+
+def schedule_sync(products_col, delay=DEBOUNCE_SECONDS):
+    """Debounced background sync, called after admin product writes.
+
+    A burst of edits within ``delay`` seconds collapses into a single sync.
+    """
+    global _pending_timer
+    with _timer_lock:
+        if _pending_timer is not None:
+            _pending_timer.cancel()
+        _pending_timer = threading.Timer(delay, _run_scheduled_sync, args=(products_col,))
+        _pending_timer.daemon = True
+        _pending_timer.start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sync products and phone specs into the chatbot vector store.')
+    parser.add_argument('--full', action='store_true', help='drop all vectors and rebuild from scratch')
+    parser.add_argument('--compare', action='store_true', help='run a full rebuild then an incremental sync and report both timings')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=EMBED_WORKERS, help='parallel embedding requests')
+    args = parser.parse_args()
+
+    from pymongo import MongoClient
+    import chatbot_backend
+    if not chatbot_backend.CHATBOT_READY:
+        raise SystemExit('Chatbot is not configured (set GEMINI_API_KEY); nothing to index.')
+
+    mongo_uri = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
+    db_name = os.getenv('MONGO_DB_NAME', 'phonestoredb')
+    products_col = MongoClient(mongo_uri).get_database(db_name)['products']
+    opts = {'batch_size': args.batch_size, 'workers': args.workers}
+
+    def run(full=False):
+        stats = sync_from_sources(products_col, full=full, **opts)
+        if stats is None:
+            # sync_from_sources skips the pass when the stack cannot be built
+            raise SystemExit(f'Chatbot stack failed to load; nothing indexed: {chatbot_backend.stack_error}')
+        return stats
+
+    if args.compare:
+        full_stats = run(full=True)
+        incr_stats = run()
+        print(f"Full rebuild:     {full_stats['upserted']} docs in {full_stats['seconds']}s")
+        print(f"Incremental sync: {incr_stats['upserted']} upserted, {incr_stats['deleted']} deleted, "
+              f"{incr_stats['unchanged']} unchanged in {incr_stats['seconds']}s")
+        if incr_stats['seconds']:
+            print(f"Speedup: {full_stats['seconds'] / incr_stats['seconds']:.1f}x")
+        return
+
+    print(json.dumps(run(full=args.full), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""Bounded executor for chatbot chain invocations.
+
+LLM calls run on a small dedicated thread pool instead of the request threads.
+The request thread still waits for its turn, so admission is capped at
+``CHATBOT_MAX_INFLIGHT`` jobs per process (a quarter of the gunicorn threads by
+default, and never more than ``workers + max_queue``). A burst of chat messages
+is rejected fast (429) instead of tying up every server thread and starving
+catalog and cart requests. Each job carries a cancel event that the
+chain checks between stages, so a timed-out or abandoned turn stops before
+its next LLM call.
+"""
+import os
+import select
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+
+CHATBOT_WORKERS = int(os.getenv('CHATBOT_WORKERS', '4'))
+CHATBOT_MAX_QUEUE = int(os.getenv('CHATBOT_MAX_QUEUE', '16'))
+# Each admitted turn holds a gthread request thread while it waits; streams take
+# up to half of them (FEED_MAX_SUBSCRIBERS), so chat gets a quarter by default
+CHATBOT_MAX_INFLIGHT = int(os.getenv('CHATBOT_MAX_INFLIGHT', str(max(1, int(os.getenv('GUNICORN_THREADS', '4')) // 4))))
+CHATBOT_TIMEOUT_SECONDS = float(os.getenv('CHATBOT_TIMEOUT_SECONDS', '30'))
+DISCONNECT_POLL_SECONDS = 0.25
+
+
+class QueueFull(Exception):
+    pass
+
+
+class PoolClosed(Exception):
+    pass
+
+
+class JobTimeout(Exception):
+    pass
+
+
+class ClientGone(Exception):
+    pass
+
+
+class ChatJob:
+    def __init__(self, future, cancel_event):
+        self.future = future
+        self.cancel_event = cancel_event
+
+    def cancel(self):
+        self.cancel_event.set()
+        self.future.cancel()
+
+    def wait(self, timeout, disconnected=None):
+        """Wait for the result, polling ``disconnected()`` so abandoned turns get cancelled."""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.cancel()
+                raise JobTimeout()
+            try:
+                return self.future.result(timeout=min(remaining, DISCONNECT_POLL_SECONDS))
+            except FutureTimeout:
+                if disconnected is not None and disconnected():
+                    self.cancel()
+                    raise ClientGone()
+
+
+class ChatExecutor:
+    def __init__(self, workers=CHATBOT_WORKERS, max_queue=CHATBOT_MAX_QUEUE, max_inflight=CHATBOT_MAX_INFLIGHT):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_inflight = max(1, min(max_inflight, workers + max_queue))
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='chatbot')
+        self._slots = threading.BoundedSemaphore(self.max_inflight)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._closed = False
+        self._waits = deque(maxlen=1024)
+        self._counters = {'submitted': 0, 'completed': 0, 'rejected': 0, 'timed_out': 0, 'cancelled': 0}
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue ``fn(*args, cancel_event=..., **kwargs)``; raises QueueFull when saturated."""
+        if self._closed:
+            raise PoolClosed()
+        if not self._slots.acquire(blocking=False):
+            self.count('rejected')
+            raise QueueFull()
+        cancel_event = threading.Event()
+        submitted_at = time.monotonic()
+
+        def run():
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._waits.append(time.monotonic() - submitted_at)
+            try:
+                if cancel_event.is_set():
+                    return None
+                return fn(*args, cancel_event=cancel_event, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._counters['completed'] += 1
+
+        with self._lock:
+            self._queued += 1
+            self._counters['submitted'] += 1
+        try:
+            future = self._pool.submit(run)
+        except RuntimeError:
+            with self._lock:
+                self._queued -= 1
+            self._slots.release()
+            raise PoolClosed()
+
+        def on_done(f):
+            if f.cancelled():
+                # Cancelled before it started, so run() never decremented the queue
+                with self._lock:
+                    self._queued -= 1
+            self._slots.release()
+
+        future.add_done_callback(on_done)
+        return ChatJob(future, cancel_event)
+
+    def count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def shutdown(self):
+        self._closed = True
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            stats = dict(self._counters)
+            stats.update(
+                workers=self.workers,
+                max_queue=self.max_queue,
+                max_inflight=self.max_inflight,
+                queue_depth=self._queued,
+                running=self._running,
+            )
+        stats['wait_ms_p50'] = round(waits[len(waits) // 2] * 1000, 2) if waits else 0.0
+        stats['wait_ms_max'] = round(waits[-1] * 1000, 2) if waits else 0.0
+        return stats
+
+
+def client_disconnected(environ):
+    """Best-effort check whether the client socket has been closed.
+
+    Only possible when the WSGI server exposes the raw socket (gunicorn does);
+    otherwise the per-call deadline is the only bound.
+    """
+    sock = environ.get('gunicorn.socket') or environ.get('werkzeug.socket')
+    if sock is None:
+        return False
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        if not readable:
+            return False
+        return sock.recv(1, socket.MSG_PEEK) == b''
+    except (OSError, ValueError):
+        return True
+
+
+chat_executor = ChatExecutor()
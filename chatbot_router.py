@@ -0,0 +1,175 @@
+"""Route chatbot turns to the cheapest path that can answer them.
+
+* ``lookup``     - a single attribute of a single known phone ("price of Galaxy S23",
+                   "RAM of iPhone 14"). Answered from the catalog / specs CSV with a
+                   template; no LLM calls.
+* ``first_turn`` - no chat history yet, so the question is already standalone and
+                   the reformulation LLM call is skipped (one LLM call instead of two).
+* ``llm``        - everything else goes through the full history-aware RAG chain.
+"""
+import re
+import threading
+import time
+
+from phone_specs import load_phones, numeric_specs, parse_specs
+
+
+ROUTE_LOOKUP = 'lookup'
+ROUTE_FIRST_TURN = 'first_turn'
+ROUTE_LLM = 'llm'
+
+# LLM calls a full history-aware turn costs: reformulate + answer
+FULL_CHAIN_LLM_CALLS = 2
+LLM_CALLS_AVOIDED = {ROUTE_LOOKUP: 2, ROUTE_FIRST_TURN: 1, ROUTE_LLM: 0}
+
+CATALOG_TTL_SECONDS = 60
+
+ATTRIBUTES = {
+    'price': (r'price|cost|how much', 'The {name} is priced at ${value:,.2f}.'),
+    'ram_gb': (r'\bram\b|memory', 'The {name} has {value:g} GB of RAM.'),
+    'storage_gb': (r'storage|\brom\b', 'The {name} comes with {value:g} GB of storage.'),
+    'battery_mah': (r'battery|\bmah\b', 'The {name} has a {value:g} mAh battery.'),
+    'display_in': (r'display|screen', 'The {name} has a {value:g}-inch display.'),
+    'release_year': (r'release|launch|came out', 'The {name} was released in {value:.0f}.'),
+    'os': (r'\bos\b|operating system', 'The {name} runs {value}.'),
+    'stock': (r'in stock|stock|available', 'We currently have {value:.0f} units of the {name} in stock.'),
+}
+
+# Turns that need reasoning (comparison, advice, purchase flow) always go to the LLM
+OPEN_ENDED = re.compile(
+    r'\b(compare|vs\.?|versus|better|best|recommend|suggest|should|which|buy|order|checkout|'
+    r'difference|cheaper|why|between)\b|\band\b.*\b(price|ram|storage|battery)\b',
+    re.IGNORECASE,
+)
+MAX_LOOKUP_WORDS = 14
+
+_ATTRIBUTE_PATTERNS = {attr: re.compile(pattern, re.IGNORECASE) for attr, (pattern, _) in ATTRIBUTES.items()}
+
+
+def _norm(text):
+    return re.sub(r'[^a-z0-9]+', ' ', str(text).lower()).strip()
+
+
+class Router:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {ROUTE_LOOKUP: 0, ROUTE_FIRST_TURN: 0, ROUTE_LLM: 0}
+        self._catalog_provider = None
+        self._catalog = []
+        self._catalog_loaded_at = 0.0
+        self._phones = load_phones()
+
+    def set_catalog_provider(self, provider):
+        """Register a callable returning product dicts (id, title, price, stock, specs)."""
+        self._catalog_provider = provider
+        self._catalog_loaded_at = 0.0
+
+    def _products(self):
+        if self._catalog_provider is None:
+            return []
+        if time.monotonic() - self._catalog_loaded_at > CATALOG_TTL_SECONDS:
+            try:
+                self._catalog = list(self._catalog_provider())
+            except Exception as e:
+                print(f"Router catalog refresh failed: {e}")
+            self._catalog_loaded_at = time.monotonic()
+        return self._catalog
+
+    def _find_attribute(self, message):
+        found = [attr for attr, pattern in _ATTRIBUTE_PATTERNS.items() if pattern.search(message)]
+        return found[0] if len(found) == 1 else None
+
+    def _find_entries(self, message):
+        """Return (name, [entries]) for the longest known phone/product name in the message."""
+        text = f' {_norm(message)} '
+        best_key, best_name, best = '', None, []
+        candidates = [(p['name'], p['name'], p, 'csv') for p in self._phones]
+        candidates += [(p['model'], p['name'], p, 'csv') for p in self._phones]
+        candidates += [(p.get('title', ''), p.get('title', ''), p, 'catalog') for p in self._products()]
+        for alias, name, entry, source in candidates:
+            key = _norm(alias)
+            if not key or f' {key} ' not in text:
+                continue
+            if len(key) > len(best_key):
+                best_key, best_name, best = key, name, [(entry, source)]
+            elif key == best_key and all(e is not entry for e, _ in best):
+                best.append((entry, source))
+        return best_name, best
+
+    @staticmethod
+    def _value(entry, source, attr):
+        if source == 'csv':
+            value = entry.get(attr)
+        elif attr in ('price', 'stock'):
+            value = entry.get(attr)
+        else:
+            specs = parse_specs(entry.get('specs'))
+            if attr == 'os':
+                return specs.get('OS') or specs.get('os')
+            value = numeric_specs(specs).get(attr)
+        if attr == 'os' or value is None:
+            return value
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    def lookup(self, message):
+        """Answer a structured single-attribute question, or return None."""
+        if OPEN_ENDED.search(message) or len(message.split()) > MAX_LOOKUP_WORDS:
+            return None
+        attr = self._find_attribute(message)
+        if not attr:
+            return None
+        name, entries = self._find_entries(message)
+        if not entries:
+            return None
+        # Catalog values (our actual prices/stock) win over list values from the CSV
+        entries.sort(key=lambda e: e[1] != 'catalog')
+        values = []
+        for entry, source in entries:
+            value = self._value(entry, source, attr)
+            if value not in (None, '') and value not in values:
+                values.append(value)
+            if values and source == 'csv':
+                break
+        if not values:
+            return None
+        template = ATTRIBUTES[attr][1]
+        if len(values) == 1:
+            return template.format(name=name, value=values[0])
+        if attr == 'price':
+            listed = ', '.join(f'${float(v):,.2f}' for v in sorted(values))
+            return f'We have several {name} listings, priced at {listed}.'
+        return None
+
+    def route(self, message, has_history):
+        """Pick a route; returns (route, templated_answer_or_None)."""
+        answer = self.lookup(message)
+        if answer is not None:
+            chosen = ROUTE_LOOKUP
+        elif not has_history:
+            chosen = ROUTE_FIRST_TURN
+        else:
+            chosen = ROUTE_LLM
+        self.record(chosen)
+        return chosen, answer
+
+    def record(self, route):
+        with self._lock:
+            self._counts[route] += 1
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        turns = sum(counts.values())
+        avoided = sum(LLM_CALLS_AVOIDED[r] * n for r, n in counts.items())
+        return {
+            'routes': counts,
+            'turns': turns,
+            'llm_calls': turns * FULL_CHAIN_LLM_CALLS - avoided,
+            'llm_calls_avoided': avoided,
+        }
+
+
+router = Router()
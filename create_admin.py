@@ -25,7 +25,6 @@ def main():
             'email': email,
             'password_hash': password_hash,
             'role': 'admin',
-            'reset_code': None
         }},
         upsert=True
     )
@@ -0,0 +1,182 @@
+"""Per-process MongoDB client.
+
+The client is created lazily on first use and re-created if the process id
+changes, so nothing opened before a pre-fork server forks (sockets, monitor
+threads) is shared with the workers. Collections are exposed as proxies that
+resolve against the current process's client on every attribute access.
+
+Logic that both app.py (pymongo) and async_app.py (motor) need is written once
+as a generator of driver steps (see ``step``): ``run`` executes it with this
+client and ``run_async`` with a motor database.
+"""
+import asyncio
+import functools
+import os
+import threading
+import time
+
+import pymongo
+from dotenv import load_dotenv
+from gridfs import GridFS
+from pymongo import MongoClient
+
+
+load_dotenv()
+
+MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
+MONGO_DB_NAME = os.getenv('MONGO_DB_NAME', 'phonestoredb')
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', '50'))
+MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', '0'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', '2000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+# primary | primaryPreferred | secondary | secondaryPreferred | nearest
+MONGO_READ_PREFERENCE = os.getenv('MONGO_READ_PREFERENCE', 'primary')
+
+_lock = threading.Lock()
+_client = None
+_client_pid = None
+_gridfs = None
+_event_listeners = []
+
+
+def add_event_listener(listener):
+    """Register a pymongo monitoring listener for clients created from now on."""
+    _event_listeners.append(listener)
+
+
+def get_client():
+    global _client, _client_pid, _gridfs
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+    with _lock:
+        if _client is None or _client_pid != pid:
+            _client = MongoClient(
+                MONGO_URI,
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                minPoolSize=MONGO_MIN_POOL_SIZE,
+                waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+                readPreference=MONGO_READ_PREFERENCE,
+                event_listeners=list(_event_listeners),
+                connect=False,
+            )
+            _client_pid = pid
+            _gridfs = None
+    return _client
+
+
+def set_client(client):
+    """Use ``client`` for this process instead of building one (e.g. an in-memory stand-in)."""
+    global _client, _client_pid, _gridfs
+    with _lock:
+        _client = client
+        _client_pid = os.getpid()
+        _gridfs = None
+
+
+def get_db():
+    return get_client().get_database(MONGO_DB_NAME)
+
+
+def get_gridfs():
+    global _gridfs
+    db = get_db()
+    if _gridfs is None:
+        _gridfs = GridFS(db)
+    return _gridfs
+
+
+def ping(timeout_ms=1000):
+    """Return True if the server answers a ping within ``timeout_ms``."""
+    try:
+        # pymongo.timeout also bounds server selection, not just the command
+        with pymongo.timeout(timeout_ms / 1000.0):
+            get_client().admin.command('ping')
+        return True
+    except Exception:
+        return False
+
+
+class CollectionProxy:
+    """Stands in for a Collection and resolves it against the per-process client."""
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(get_db()[self._name], attr)
+
+    def __repr__(self):
+        return f'CollectionProxy({self._name!r})'
+
+
+class GridFSProxy:
+    def __getattr__(self, attr):
+        return getattr(get_gridfs(), attr)
+
+
+# --- Driver-agnostic operations ---
+
+def step(collection, method, *args, **kwargs):
+    """One driver call, e.g. ``result = yield step('products', 'find_one', {'id': 1})``.
+
+    ``find`` results are sent back as a list. Errors are thrown into the generator.
+    """
+    return collection, method, args, kwargs
+
+
+def pause(seconds):
+    """Sleep between steps (time.sleep under ``run``, asyncio.sleep under ``run_async``)."""
+    return None, 'sleep', (seconds,), {}
+
+
+def run(steps):
+    """Drive a step generator with the per-process client; returns its return value."""
+    result, error = None, None
+    while True:
+        try:
+            collection, method, args, kwargs = steps.throw(error) if error else steps.send(result)
+        except StopIteration as done:
+            return done.value
+        result, error = None, None
+        try:
+            if collection is None:
+                time.sleep(*args)
+            elif method == 'find':
+                result = list(get_db()[collection].find(*args, **kwargs))
+            else:
+                result = getattr(get_db()[collection], method)(*args, **kwargs)
+        except Exception as e:
+            error = e
+
+
+async def run_async(steps, database):
+    """Drive a step generator with a motor ``database``; returns its return value."""
+    result, error = None, None
+    while True:
+        try:
+            collection, method, args, kwargs = steps.throw(error) if error else steps.send(result)
+        except StopIteration as done:
+            return done.value
+        result, error = None, None
+        try:
+            if collection is None:
+                await asyncio.sleep(*args)
+            elif method == 'find':
+                result = await database[collection].find(*args, **kwargs).to_list(None)
+            else:
+                result = await getattr(database[collection], method)(*args, **kwargs)
+        except Exception as e:
+            error = e
+
+
+def runs_sync(steps_fn):
+    """Make calling ``steps_fn`` run it with ``run``; the generator stays available as ``.steps``."""
+    @functools.wraps(steps_fn)
+    def call(*args, **kwargs):
+        return run(steps_fn(*args, **kwargs))
+    call.steps = steps_fn
+    return call
@@ -0,0 +1,94 @@
+"""JSON responses for the API.
+
+``jsonify`` is a drop-in replacement for Flask's that serializes with orjson
+when it is installed and with the standard library otherwise. Both backends
+understand the types our Mongo documents carry (ObjectId, datetime, Decimal128),
+so cart items with ``added_at`` timestamps serialize without pre-processing.
+Set ``JSON_BACKEND=stdlib`` to force the standard library path.
+"""
+import datetime
+import decimal
+import json
+import os
+
+from bson import Decimal128, ObjectId
+from flask import current_app
+from flask.json import JSONEncoder as FlaskJSONEncoder
+from markupsafe import Markup
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+JSON_BACKEND = os.getenv('JSON_BACKEND', 'orjson' if orjson is not None else 'stdlib').lower()
+if JSON_BACKEND == 'orjson' and orjson is None:
+    print('⚠️ JSON_BACKEND=orjson but orjson is not installed; using the standard library')
+    JSON_BACKEND = 'stdlib'
+
+MIMETYPE = 'application/json'
+
+
+def _default(obj):
+    """Fallback for types neither backend handles natively."""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal128):
+        return float(obj.to_decimal())
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def dumps(obj, backend=None):
+    """Serialize ``obj`` to UTF-8 JSON bytes with ``backend`` (default: JSON_BACKEND)."""
+    if (backend or JSON_BACKEND) == 'orjson':
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+# Characters that could end a <script> block or confuse an HTML parser
+_SCRIPT_ESCAPES = {'<': '\\u003c', '>': '\\u003e', '&': '\\u0026', '\u2028': '\\u2028', '\u2029': '\\u2029'}
+
+
+def dumps_for_script(obj):
+    """JSON text that is safe to embed in an inline ``<script type="application/json">``."""
+    text = dumps(obj).decode('utf-8')
+    for char, escaped in _SCRIPT_ESCAPES.items():
+        text = text.replace(char, escaped)
+    return Markup(text)
+
+
+def loads(data):
+    if JSON_BACKEND == 'orjson':
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def jsonify(*args, **kwargs):
+    if args and kwargs:
+        raise TypeError('jsonify() behavior undefined when passed both args and kwargs')
+    if len(args) == 1:
+        data = args[0]
+    else:
+        data = args or kwargs
+    return current_app.response_class(dumps(data), mimetype=MIMETYPE)
+
+
+class JSONEncoder(FlaskJSONEncoder):
+    """Used by Flask's own JSON helpers (``tojson`` in templates, flask.json.dumps)."""
+
+    def default(self, o):
+        try:
+            return _default(o)
+        except TypeError:
+            return super().default(o)
+
+
+def init_app(app):
+    app.json_encoder = JSONEncoder
@@ -0,0 +1,282 @@
+"""Generate a synthetic catalog, users and carts for scale testing.
+
+Everything is derived from ``--seed``, so two runs with the same arguments
+produce the same documents (including ObjectIds and image bytes). Documents are
+built lazily and written with unordered ``insert_many`` batches.
+
+* Products: brands/models from data/mobile_phones.csv plus headphones and
+  laptops, with ``key: value`` spec strings, stock, and an image drawn from a
+  pool of ``--image-pool`` generated PNGs stored once in GridFS.
+* Users: ``user<N>@example.com`` with password ``password<N % password-pool>``.
+  Each distinct password is hashed once with ``--hash-method``, so hashes are
+  real werkzeug hashes without paying for a KDF per user.
+* Carts: ``--cart-users`` of the users get 1-5 items, with products drawn from a
+  Zipf distribution (a few hot products, a long tail).
+
+Usage:
+    python generate_data.py --products 100000 --users 100000
+    python generate_data.py --products 1000000 --users 1000000 --batch-size 5000 --drop
+"""
+import argparse
+import bisect
+import csv
+import hashlib
+import itertools
+import os
+import random
+import struct
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from gridfs import GridFS
+from pymongo import MongoClient
+from werkzeug.security import generate_password_hash
+
+from batch_tools import Progress
+
+
+MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
+MONGO_DB_NAME = os.getenv('MONGO_DB_NAME', 'phonestoredb')
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+COLORS = ['Black', 'White', 'Blue', 'Green', 'Red', 'Silver', 'Gold', 'Purple', 'Graphite']
+HEADPHONES = [('Sony', 'WH-1000XM'), ('Bose', 'QuietComfort'), ('JBL', 'Tune'), ('Sennheiser', 'Momentum'),
+              ('Apple', 'AirPods'), ('Beats', 'Studio')]
+LAPTOPS = [('Apple', 'MacBook Air'), ('Dell', 'XPS'), ('Lenovo', 'ThinkPad X1'), ('HP', 'Spectre'),
+           ('Asus', 'Zenbook'), ('Acer', 'Swift')]
+# (category, weight)
+CATEGORIES = [('Mobile phone', 0.7), ('Headphone', 0.15), ('Laptops', 0.15)]
+
+
+def _object_id(seed, kind, n):
+    # Derived from (seed, kind, n) rather than the RNG stream, so a second run
+    # that appends more users or images does not collide with the first
+    return ObjectId(hashlib.blake2b(f'{seed}:{kind}:{n}'.encode(), digest_size=12).digest())
+
+
+def _batched(iterable, size):
+    it = iter(iterable)
+    while True:
+        batch = list(itertools.islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _png(width, height, rgb):
+    """A valid solid-colour PNG, built without an imaging library."""
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+    row = b'\x00' + bytes(rgb) * width
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(row * height, 9))
+            + chunk(b'IEND', b''))
+
+
+def load_phone_models():
+    path = os.path.join(HERE, 'data', 'mobile_phones.csv')
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+# --- Generators ---
+
+def store_images(fs, rng, count, seed):
+    """Put ``count`` generated PNGs into GridFS (reusing existing ones) and return their ids as strings."""
+    ids = []
+    for i in range(count):
+        rgb = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        file_id = _object_id(seed, 'image', i)
+        if not fs.exists(file_id):
+            fs.put(_png(64, 64, rgb), _id=file_id, filename=f'synthetic-{i}.png', content_type='image/png')
+        ids.append(str(file_id))
+    return ids
+
+
+def _phone(rng, row):
+    storage = rng.choice([64, 128, 256, 512])
+    ram = max(2, int(float(row['RAM (GB)'])) + rng.choice([-2, 0, 0, 2]))
+    price = round(float(row['Price (USD)']) * rng.uniform(0.8, 1.4) + storage * 0.5, 2)
+    color = rng.choice(COLORS)
+    specs = '\n'.join([
+        f"Display: {row['Display Size (inches)']} inch",
+        f'RAM: {ram} GB',
+        f'Storage: {storage} GB',
+        f"Battery: {int(row['Battery (mAh)']) + rng.randrange(-200, 400, 50)} mAh",
+        f"OS: {row['OS']}",
+        f"Release Year: {row['Release Year']}",
+        f'Color: {color}',
+    ])
+    return f"{row['Brand']} {row['Model']} {storage}GB {color}", row['Brand'], price, specs
+
+
+def _accessory(rng, names, category):
+    brand, model = rng.choice(names)
+    color = rng.choice(COLORS)
+    generation = rng.randint(1, 6)
+    price = round(rng.lognormvariate(5.5 if category == 'Headphone' else 7, 0.4), 2)
+    if category == 'Headphone':
+        specs = f'Type: Over-ear\nBattery: {rng.randrange(20, 60)} hours\nNoise cancelling: {rng.choice(["Yes", "No"])}'
+    else:
+        specs = f'RAM: {rng.choice([8, 16, 32])} GB\nStorage: {rng.choice([256, 512, 1024])} GB\nDisplay: {rng.choice([13.3, 14, 15.6])} inch'
+    return f'{brand} {model} {generation} {color}', brand, price, specs
+
+
+def generate_products(rng, count, first_id, image_ids, phone_models):
+    categories = [c for c, _ in CATEGORIES]
+    weights = [w for _, w in CATEGORIES]
+    for pid in range(first_id, first_id + count):
+        category = rng.choices(categories, weights)[0]
+        if category == 'Mobile phone':
+            title, brand, price, specs = _phone(rng, rng.choice(phone_models))
+        else:
+            title, brand, price, specs = _accessory(rng, HEADPHONES if category == 'Headphone' else LAPTOPS, category)
+        doc = {
+            'id': pid,
+            'title': title,
+            'brand': brand,
+            'category': category,
+            'price': price,
+            'stock': 0 if rng.random() < 0.05 else rng.randint(1, 200),
+            'description': f'{title} with {rng.randint(1, 3)} year warranty.',
+            'specs': specs,
+            'image': '/static/images/products/placeholder.png',
+            'synthetic': True,
+        }
+        if image_ids:
+            doc['image_file_id'] = rng.choice(image_ids)
+        yield doc
+
+
+def generate_users(seed, count, start, password_hashes):
+    for n in range(start, start + count):
+        yield {
+            '_id': _object_id(seed, 'user', n),
+            'name': f'User {n}',
+            'email': f'user{n}@example.com',
+            'password_hash': password_hashes[n % len(password_hashes)],
+            'role': 'user',
+            'synthetic': True,
+        }
+
+
+def zipf_cum_weights(n, s):
+    total = 0.0
+    cum = []
+    for rank in range(1, n + 1):
+        total += 1.0 / rank ** s
+        cum.append(total)
+    return cum
+
+
+def generate_carts(rng, user_ids, products, zipf_s):
+    """Yield cart items; ``products`` is a list of (id, title, price, image) in popularity order."""
+    cum = zipf_cum_weights(len(products), zipf_s)
+    top = cum[-1]
+    now = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for user_id in user_ids:
+        chosen = set()
+        for _ in range(rng.randint(1, 5)):
+            idx = bisect.bisect_left(cum, rng.random() * top)
+            if idx in chosen:
+                continue
+            chosen.add(idx)
+            pid, title, price, image = products[idx]
+            yield {
+                'user_identifier': str(user_id),
+                'product_id': pid,
+                'product_title': title,
+                'product_image': image,
+                'product_price': float(price),
+                'quantity': rng.choices([1, 2, 3], [0.8, 0.15, 0.05])[0],
+                'added_at': now - timedelta(minutes=rng.randrange(60 * 24 * 30)),
+                'synthetic': True,
+            }
+
+
+# --- Writing ---
+
+def insert_batches(col, docs, total, batch_size, label):
+    progress = Progress(label, total)
+    written = 0
+    for batch in _batched(docs, batch_size):
+        col.insert_many(batch, ordered=False)
+        written += len(batch)
+        progress.add(len(batch))
+    return written
+
+
+def drop_synthetic(db):
+    fs_ids = [d['_id'] for d in db['fs.files'].find({'filename': {'$regex': '^synthetic-'}}, {'_id': 1})]
+    for name in ('products', 'users', 'cart'):
+        res = db[name].delete_many({'synthetic': True})
+        print(f'  removed {res.deleted_count:,} synthetic {name}')
+    if fs_ids:
+        db['fs.chunks'].delete_many({'files_id': {'$in': fs_ids}})
+        db['fs.files'].delete_many({'_id': {'$in': fs_ids}})
+        print(f'  removed {len(fs_ids)} synthetic images')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic products, users and carts.')
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--cart-users', type=float, default=0.3, help='fraction of generated users with a cart')
+    parser.add_argument('--zipf', type=float, default=1.1, help='Zipf exponent for product popularity in carts')
+    parser.add_argument('--image-pool', type=int, default=50, help='distinct GridFS images shared by products (0 = none)')
+    parser.add_argument('--password-pool', type=int, default=100, help='distinct passwords (each hashed once)')
+    parser.add_argument('--hash-method', default='pbkdf2:sha256:260000',
+                        help='werkzeug hash method, e.g. pbkdf2:sha256:1000 for cheap logins under load')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--drop', action='store_true', help='remove previously generated (synthetic) documents first')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    client = MongoClient(MONGO_URI)
+    db = client.get_database(MONGO_DB_NAME)
+    started = time.perf_counter()
+    print(f'Generating into "{MONGO_DB_NAME}" with seed {args.seed}')
+
+    if args.drop:
+        drop_synthetic(db)
+
+    image_ids = store_images(GridFS(db), rng, args.image_pool, args.seed) if args.image_pool else []
+    if image_ids:
+        print(f'  stored {len(image_ids)} images in GridFS')
+
+    last = db['products'].find_one({}, {'id': 1}, sort=[('id', -1)])
+    first_id = (last['id'] + 1) if last and isinstance(last.get('id'), int) else 1
+    products = generate_products(rng, args.products, first_id, image_ids, load_phone_models())
+    insert_batches(db['products'], products, args.products, args.batch_size, 'products')
+
+    password_hashes = [generate_password_hash(f'password{i}', method=args.hash_method)
+                       for i in range(max(1, args.password_pool))] if args.users else []
+    user_start = db['users'].count_documents({'synthetic': True})
+    user_ids = []
+
+    def users_with_ids():
+        for u in generate_users(args.seed, args.users, user_start, password_hashes):
+            user_ids.append(u['_id'])
+            yield u
+    insert_batches(db['users'], users_with_ids(), args.users, args.batch_size, 'users')
+
+    cart_users = user_ids[:int(len(user_ids) * args.cart_users)]
+    if cart_users and args.products:
+        # Popularity order is a seeded shuffle of the generated products
+        catalog = [(p['id'], p['title'], p['price'], p['image'])
+                   for p in db['products'].find({'synthetic': True, 'id': {'$gte': first_id}},
+                                                {'_id': 0, 'id': 1, 'title': 1, 'price': 1, 'image': 1}).sort('id', 1)]
+        rng.shuffle(catalog)
+        items = generate_carts(rng, cart_users, catalog, args.zipf)
+        insert_batches(db['cart'], items, None, args.batch_size, 'cart items')
+
+    print(f'Done in {time.perf_counter() - started:.1f}s. Users log in as user<N>@example.com / '
+          f'password<N % {args.password_pool}>.')
+
+
+if __name__ == '__main__':
+    main()
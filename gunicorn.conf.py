@@ -0,0 +1,15 @@
+"""gunicorn settings: gunicorn -c gunicorn.conf.py app:app
+
+Each worker imports the app itself (no preload), so the MongoDB client and the
+chatbot warm-up thread are created after the fork in every worker.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+worker_class = 'gthread'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+keepalive = 5
+preload_app = False
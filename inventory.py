@@ -0,0 +1,255 @@
+"""Product stock with cart reservations.
+
+``products.stock`` is the number of units still available to put in a cart.
+Reserving is a single conditional update, ``{'id': pid, 'stock': {'$gte': qty}}``
+with ``$inc: {stock: -qty, reserved: +qty}``. MongoDB applies it atomically to
+the one document, so concurrent buyers of the last unit can never drive stock
+below zero, whatever the interleaving.
+
+Each cart line holds one document in ``reservations``, keyed by
+(user_identifier, product_id), with an ``expires_at`` that is refreshed on every
+change. A background reaper returns the stock of expired reservations. It is
+the only thing that deletes an expired reservation, and only after its stock
+is back, so a reaper that is down or behind delays the return but never
+loses stock. The return records the reservation id on the product in the
+same update, so a retried reap never returns it twice. (There is
+deliberately no TTL index on ``expires_at``.)
+
+The cart-facing operations are written once as generators of driver steps
+(``db.step``), so app.py runs them with pymongo and async_app.py with motor.
+
+Products without a ``stock`` field (e.g. the sample catalog) are untracked and
+never run out.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+import db
+
+
+INVENTORY_ENABLED = os.getenv('INVENTORY_ENABLED', 'true').lower() == 'true'
+RESERVATION_TTL_SECONDS = int(os.getenv('RESERVATION_TTL_SECONDS', '900'))
+RESERVATION_REAP_SECONDS = float(os.getenv('RESERVATION_REAP_SECONDS', '30'))
+# How long a reaper may hold a claimed reservation before another reaper may retry it
+REAP_CLAIM_SECONDS = 60
+# Reservations a reaper has claimed belong to it; carts treat them as already gone
+UNCLAIMED = {'reap_claimed_until': {'$exists': False}}
+MAX_RETRIES = 5
+
+products_col = db.CollectionProxy('products')
+reservations_col = db.CollectionProxy('reservations')
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_id, requested, available):
+        super().__init__(f'Product {product_id}: requested {requested}, {available} available')
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+
+
+class ReservationConflict(Exception):
+    """The reservation kept changing (or being reaped) under us; the caller may retry."""
+
+    def __init__(self, product_id):
+        super().__init__(f'Reservation for product {product_id} is busy; try again')
+        self.product_id = product_id
+
+
+def ensure_indexes(database):
+    col = database['reservations']
+    col.create_index([('user_identifier', ASCENDING), ('product_id', ASCENDING)], unique=True)
+    # A TTL index here used to delete reservations without returning their stock
+    if 'expireAfterSeconds' in col.index_information().get('expires_at_1', {}):
+        col.drop_index('expires_at_1')
+    col.create_index([('expires_at', ASCENDING)])
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+# --- Stock counters ---
+# Each operation yields driver steps (db.step) so async_app.py runs the same
+# code under motor via ``.steps``; calling it directly runs it with pymongo.
+
+@db.runs_sync
+def take(product_id, qty):
+    """Atomically move ``qty`` units from stock to reserved.
+
+    Returns True if taken, None if the product does not track stock; raises
+    OutOfStock otherwise.
+    """
+    res = yield db.step('products', 'update_one',
+                        {'id': product_id, 'stock': {'$gte': qty}},
+                        {'$inc': {'stock': -qty, 'reserved': qty}})
+    if res.modified_count:
+        return True
+    product = yield db.step('products', 'find_one', {'id': product_id}, {'_id': 0, 'stock': 1})
+    if product is not None and 'stock' not in product:
+        return None
+    raise OutOfStock(product_id, qty, (product or {}).get('stock', 0))
+
+
+@db.runs_sync
+def give_back(product_id, qty):
+    if qty:
+        yield db.step('products', 'update_one', {'id': product_id, 'stock': {'$exists': True}},
+                      {'$inc': {'stock': qty, 'reserved': -qty}})
+
+
+def purchase(product_id, qty=1):
+    """Sell ``qty`` units directly (no reservation); returns True if there was enough stock."""
+    res = products_col.update_one({'id': product_id, 'stock': {'$gte': qty}}, {'$inc': {'stock': -qty}})
+    return bool(res.modified_count)
+
+
+# --- Reservations ---
+
+@db.runs_sync
+def hold(user_identifier, product_id, qty):
+    """Set this user's reservation for ``product_id`` to ``qty`` units (0 releases it).
+
+    Only the difference from the current reservation touches the stock
+    counter. The reservation is updated conditionally on the quantity that was
+    read, so a concurrent reap or change of the same line is retried rather
+    than double-counted.
+    """
+    if not INVENTORY_ENABLED:
+        return None
+    if qty <= 0:
+        yield from release.steps(user_identifier, product_id)
+        return None
+    key = {'user_identifier': user_identifier, 'product_id': product_id}
+    for _ in range(MAX_RETRIES):
+        current = yield db.step('reservations', 'find_one', key, {'quantity': 1, 'reap_claimed_until': 1})
+        if current and 'reap_claimed_until' in current:
+            yield db.pause(0.05)  # being reaped; it is deleted as soon as its stock is back
+            continue
+        held = current['quantity'] if current else 0
+        delta = qty - held
+        tracked = True
+        if delta > 0:
+            tracked = yield from take.steps(product_id, delta)
+            if tracked is None:
+                return None
+        expires_at = _now() + timedelta(seconds=RESERVATION_TTL_SECONDS)
+        if current:
+            res = yield db.step('reservations', 'update_one',
+                                dict(UNCLAIMED, _id=current['_id'], quantity=held),
+                                {'$set': {'quantity': qty, 'expires_at': expires_at}})
+            ok = res.matched_count == 1
+        else:
+            try:
+                yield db.step('reservations', 'insert_one',
+                              dict(key, quantity=qty, expires_at=expires_at, created_at=_now()))
+                ok = True
+            except DuplicateKeyError:
+                ok = False
+        if ok:
+            if delta < 0:
+                yield from give_back.steps(product_id, -delta)
+            return tracked
+        # Lost a race with another change to this line: undo our stock move and retry
+        if delta > 0:
+            yield from give_back.steps(product_id, delta)
+    raise ReservationConflict(product_id)
+
+
+@db.runs_sync
+def release(user_identifier, product_id):
+    doc = yield db.step('reservations', 'find_one_and_delete',
+                        dict(UNCLAIMED, user_identifier=user_identifier, product_id=product_id))
+    if doc:
+        yield from give_back.steps(product_id, doc['quantity'])
+    return doc is not None
+
+
+@db.runs_sync
+def release_all(user_identifier):
+    released = 0
+    while True:
+        doc = yield db.step('reservations', 'find_one_and_delete', dict(UNCLAIMED, user_identifier=user_identifier))
+        if doc is None:
+            return released
+        yield from give_back.steps(doc['product_id'], doc['quantity'])
+        released += 1
+
+
+def _return_reaped(doc):
+    """Give an expired reservation's stock back exactly once, then delete it.
+
+    The reservation id is pushed onto the product in the same update as the
+    ``$inc`` and the update only matches while it is absent, so a second
+    reaper (or a retry after a crash) finds the stock already returned. The
+    marker is pulled once the reservation is gone.
+    """
+    qty = doc['quantity']
+    if qty:
+        products_col.update_one(
+            {'id': doc['product_id'], 'stock': {'$exists': True}, 'returned_reservations': {'$ne': doc['_id']}},
+            {'$inc': {'stock': qty, 'reserved': -qty}, '$push': {'returned_reservations': doc['_id']}})
+    reservations_col.delete_one({'_id': doc['_id']})
+    products_col.update_one({'id': doc['product_id'], 'returned_reservations': doc['_id']},
+                            {'$pull': {'returned_reservations': doc['_id']}})
+
+
+def reap_expired(limit=1000):
+    """Return the stock of up to ``limit`` expired reservations; safe to run in every worker.
+
+    Each reservation is claimed first, so normally only one reaper handles
+    it, and deleted only once its stock is back. A reaper that dies or stalls
+    in between leaves the claim to lapse after REAP_CLAIM_SECONDS; the give-back
+    is idempotent, so the reaper that retries it never returns the stock twice.
+    """
+    reaped = 0
+    while reaped < limit:
+        now = _now()
+        doc = reservations_col.find_one_and_update(
+            {'expires_at': {'$lte': now},
+             '$or': [{'reap_claimed_until': {'$exists': False}}, {'reap_claimed_until': {'$lte': now}}]},
+            {'$set': {'reap_claimed_until': now + timedelta(seconds=REAP_CLAIM_SECONDS)}},
+            sort=[('expires_at', ASCENDING)])
+        if doc is None:
+            break
+        _return_reaped(doc)
+        reaped += 1
+    return reaped
+
+
+def stock_level(product_id):
+    return products_col.find_one({'id': product_id}, {'_id': 0, 'stock': 1, 'reserved': 1})
+
+
+# --- Background reaper ---
+
+_reaper_lock = threading.Lock()
+_reaper_pid = None
+
+
+def _reap_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            n = reap_expired()
+            if n:
+                print(f'🧹 Released {n} expired stock reservations')
+        except Exception as e:
+            print(f'Reservation reaper error: {e}')
+
+
+def start_reaper(interval=RESERVATION_REAP_SECONDS):
+    """Start the reaper thread once per process."""
+    global _reaper_pid
+    if not INVENTORY_ENABLED or interval <= 0:
+        return
+    with _reaper_lock:
+        if _reaper_pid == os.getpid():
+            return
+        _reaper_pid = os.getpid()
+        threading.Thread(target=_reap_loop, args=(interval,), name='reservation-reaper', daemon=True).start()
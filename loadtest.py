@@ -0,0 +1,267 @@
+"""Load test for the storefront, cart and auth flows.
+
+Scenarios (each virtual user loops over its scenario until the run ends):
+
+* ``browse`` - anonymous: /, /api/products, /product/<pid>, product images
+* ``cart``   - logged-in: add, get, update, remove, get
+* ``login``  - login storm: /api/login, /api/check-auth, /api/logout
+
+Targets either a running server (``--base-url``) or the app served in-process on
+a local port. The in-process server uses the configured MongoDB, or an in-memory
+stand-in with ``--backend memory`` (needs ``mongomock``), and is seeded with the
+sample catalog and load-test users. Runs are reproducible for a given ``--seed``:
+each virtual user draws its product ids from its own seeded RNG.
+
+    python loadtest.py --backend memory --duration 20
+    python loadtest.py --base-url http://localhost:5000 --seed-users --scenarios browse,cart --users 16
+    python loadtest.py --backend memory --json results/loadtest.json
+
+Reports RPS, error counts and p50/p95/p99 per endpoint; ``--json`` writes the
+same report in machine-readable form so runs can be compared.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+from bench_common import print_table, summarize, write_json
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCENARIOS = ('browse', 'cart', 'login')
+USER_EMAIL = 'loadtest+{}@example.com'
+USER_PASSWORD = 'loadtest-password'
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.errors = defaultdict(int)
+
+    def record(self, name, seconds, status):
+        with self._lock:
+            self.latencies[name].append(seconds)
+            self.statuses[name][str(status)] += 1
+            if status == 0 or status >= 500:
+                self.errors[name] += 1
+
+    def report(self, elapsed):
+        endpoints = {}
+        for name in sorted(self.latencies):
+            samples = self.latencies[name]
+            endpoints[name] = dict(summarize(samples),
+                                   rps=round(len(samples) / elapsed, 2),
+                                   errors=self.errors[name],
+                                   statuses=dict(self.statuses[name]))
+        total = sum(len(v) for v in self.latencies.values())
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'requests': total,
+            'rps': round(total / elapsed, 2) if elapsed else 0.0,
+            'errors': sum(self.errors.values()),
+            'endpoints': endpoints,
+        }
+
+
+class Client:
+    """One virtual user: its own cookie jar, so sessions don't leak between users."""
+
+    def __init__(self, base_url, recorder):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def call(self, name, path, payload=None, method=None):
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'} if data else {})
+        t0 = time.perf_counter()
+        body = b''
+        try:
+            with self.opener.open(req, timeout=30) as resp:
+                body = resp.read()
+                status = resp.status
+        except urllib.error.HTTPError as e:
+            body = e.read()
+            status = e.code
+        except (urllib.error.URLError, OSError):
+            status = 0
+        self.recorder.record(name, time.perf_counter() - t0, status)
+        return status, body
+
+
+def _product_ids(base_url):
+    with urllib.request.urlopen(base_url + '/api/products', timeout=30) as resp:
+        products = json.loads(resp.read())
+    return [p['id'] for p in products], [p['id'] for p in products if p.get('image_url')]
+
+
+def browse(client, rng, catalog):
+    ids, with_images = catalog
+    client.call('GET /', '/')
+    client.call('GET /api/products', '/api/products')
+    for pid in rng.sample(ids, min(3, len(ids))):
+        client.call('GET /product/<pid>', f'/product/{pid}')
+        if pid in with_images:
+            client.call('GET /api/products/<pid>/image', f'/api/products/{pid}/image')
+
+
+def cart(client, rng, catalog, user_index):
+    if not getattr(client, 'logged_in', False):
+        status, _ = client.call('POST /api/login', '/api/login',
+                                {'email': USER_EMAIL.format(user_index), 'password': USER_PASSWORD})
+        client.logged_in = status == 200
+        if not client.logged_in:
+            return
+    ids = catalog[0]
+    pid = rng.choice(ids)
+    client.call('POST /api/cart/add', '/api/cart/add', {'product_id': pid, 'quantity': 1})
+    client.call('GET /api/cart/get', '/api/cart/get')
+    client.call('POST /api/cart/update', '/api/cart/update', {'product_id': pid, 'quantity': rng.randint(1, 4)})
+    client.call('POST /api/cart/remove', '/api/cart/remove', {'product_id': pid})
+    client.call('GET /api/cart/get', '/api/cart/get')
+
+
+def login(client, rng, catalog, user_index):
+    client.call('POST /api/login', '/api/login', {'email': USER_EMAIL.format(user_index), 'password': USER_PASSWORD})
+    client.call('GET /api/check-auth', '/api/check-auth')
+    client.call('POST /api/logout', '/api/logout', method='POST')
+
+
+def run(base_url, scenarios, users, duration, seed):
+    recorder = Recorder()
+    catalog = _product_ids(base_url)
+    if not catalog[0]:
+        raise SystemExit('No products returned by /api/products; seed the catalog first.')
+    deadline = time.monotonic() + duration
+    threads = []
+
+    def worker(scenario, index):
+        rng = random.Random(f'{seed}:{scenario}:{index}')
+        client = Client(base_url, recorder)
+        while time.monotonic() < deadline:
+            if scenario == 'browse':
+                browse(client, rng, catalog)
+            elif scenario == 'cart':
+                cart(client, rng, catalog, index)
+            else:
+                login(client, rng, catalog, index)
+
+    started = time.perf_counter()
+    for scenario in scenarios:
+        for i in range(users):
+            t = threading.Thread(target=worker, args=(scenario, i), name=f'{scenario}-{i}', daemon=True)
+            t.start()
+            threads.append(t)
+    for t in threads:
+        t.join()
+    return recorder.report(time.perf_counter() - started)
+
+
+# --- Target setup ---
+
+def use_memory_backend():
+    """Point db.py at an in-memory mongomock client for this process."""
+    try:
+        import mongomock
+        import mongomock.gridfs
+    except ImportError:
+        raise SystemExit('--backend memory needs mongomock (pip install mongomock)')
+    import db
+    mongomock.gridfs.enable_gridfs_integration()
+    db.set_client(mongomock.MongoClient())
+
+
+def seed(users, with_catalog):
+    """Create load-test users (idempotent) and, for the in-memory backend, the sample catalog."""
+    from werkzeug.security import generate_password_hash
+    import db
+    database = db.get_db()
+    if with_catalog and database['products'].count_documents({}) == 0:
+        with open(os.path.join(HERE, 'data', 'products.json'), encoding='utf-8') as f:
+            products = json.load(f).get('products', [])
+        fs = db.get_gridfs()
+        for p in products:
+            # A small placeholder image so the image route and GridFS reads are exercised
+            file_id = fs.put(os.urandom(16 * 1024), filename=f"{p['id']}.jpg", content_type='image/jpeg')
+            p['image_file_id'] = str(file_id)
+        database['products'].insert_many(products)
+    password_hash = generate_password_hash(USER_PASSWORD)
+    for i in range(users):
+        database['users'].update_one(
+            {'email': USER_EMAIL.format(i)},
+            {'$setOnInsert': {'name': f'Load Test {i}', 'password_hash': password_hash, 'role': 'user'}},
+            upsert=True,
+        )
+
+
+def serve_in_process():
+    """Serve the app on an ephemeral local port in a background thread; returns the base URL."""
+    from werkzeug.serving import make_server
+    from app import app
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='loadtest-server', daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the storefront, cart and auth flows.')
+    parser.add_argument('--base-url', help='target a running server instead of serving the app in-process')
+    parser.add_argument('--backend', choices=['mongo', 'memory'], default='mongo',
+                        help='in-process only: the configured MongoDB or an in-memory stand-in')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--users', type=int, default=8, help='virtual users per scenario')
+    parser.add_argument('--duration', type=float, default=30, help='seconds')
+    parser.add_argument('--seed', type=int, default=1, help='RNG seed for reproducible request mixes')
+    parser.add_argument('--seed-users', action='store_true', help='create the load-test users in the target database')
+    parser.add_argument('--json', dest='json_path', help='write the report to this file')
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f'Unknown scenarios: {", ".join(sorted(unknown))}')
+
+    os.environ.setdefault('CHATBOT_WARMUP', 'lazy')
+    # Don't let the in-process app overwrite the real catalog snapshot with load-test data
+    os.environ.setdefault('CATALOG_SNAPSHOT_SECONDS', '0')
+    if args.base_url:
+        base_url = args.base_url.rstrip('/')
+        if args.seed_users:
+            seed(args.users, with_catalog=False)
+    else:
+        if args.backend == 'memory':
+            use_memory_backend()
+        seed(args.users, with_catalog=args.backend == 'memory')
+        base_url = serve_in_process()
+
+    print(f"🏋️ {', '.join(scenarios)} x {args.users} users for {args.duration:g}s against {base_url}")
+    report = run(base_url, scenarios, args.users, args.duration, args.seed)
+    report['config'] = {
+        'base_url': args.base_url or 'in-process',
+        'backend': None if args.base_url else args.backend,
+        'scenarios': scenarios,
+        'users': args.users,
+        'duration_s': args.duration,
+        'seed': args.seed,
+    }
+    print_table(f"{report['requests']} requests in {report['elapsed_s']}s "
+                f"({report['rps']} req/s, {report['errors']} errors)", report['endpoints'])
+    print(f"\n  {'endpoint':<34}{'rps':>10}{'errors':>8}  statuses")
+    for name, r in report['endpoints'].items():
+        print(f"  {name:<34}{r['rps']:>10}{r['errors']:>8}  {r['statuses']}")
+    if args.json_path:
+        write_json(args.json_path, report)
+
+
+if __name__ == '__main__':
+    main()
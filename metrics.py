@@ -0,0 +1,234 @@
+"""Request and MongoDB metrics in Prometheus text format.
+
+``init_app`` installs request hooks that time every request per endpoint and
+count responses per status code. They are recorded at teardown, so requests
+whose view raised are counted too (as 500). A pymongo ``CommandListener``
+(registered through ``db.add_event_listener``) attributes every command to the
+collection it touched and, when it runs on a request thread, to that request.
+Each response gets a ``Server-Timing: mongo`` entry with the request's command
+count and time.
+
+Everything is kept in plain dicts behind one lock; recording a sample is a
+bisect plus a few additions, so the hooks add microseconds per request.
+``render()`` produces the text served at ``/metrics``.
+"""
+import bisect
+import os
+import threading
+import time
+
+from flask import request
+from pymongo import monitoring
+
+import db
+
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+# Upper bounds in seconds; shared by request latency and Mongo command histograms
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds for "Mongo commands issued by one request"
+COMMAND_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50)
+
+_lock = threading.Lock()
+_histograms = {}  # (metric, labels) -> [bucket counts..., sum, count]
+_counters = {}    # (metric, labels) -> value
+_gauge_providers = []
+_local = threading.local()
+_listener_registered = False
+
+HELP = {
+    'http_request_duration_seconds': ('histogram', 'Request latency by endpoint.'),
+    'http_requests_total': ('counter', 'Responses by endpoint, method and status code.'),
+    'http_request_mongo_commands': ('histogram', 'MongoDB commands issued per request, by endpoint.'),
+    'mongodb_command_duration_seconds': ('histogram', 'MongoDB command latency by collection and command.'),
+    'mongodb_commands_total': ('counter', 'MongoDB commands by collection, command and outcome.'),
+    'mongodb_request_command_seconds_total': ('counter', 'MongoDB time spent inside requests, by endpoint and collection.'),
+}
+
+
+def _observe(metric, labels, value, buckets):
+    key = (metric, labels)
+    idx = bisect.bisect_left(buckets, value)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * (len(buckets) + 3)  # buckets, overflow, sum, count
+        h[idx] += 1
+        h[-2] += value
+        h[-1] += 1
+
+
+def _inc(metric, labels, value=1):
+    key = (metric, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def register_gauges(provider):
+    """Add a callable returning ``[(name, help, {labels}, value), ...]`` evaluated on every scrape."""
+    _gauge_providers.append(provider)
+
+
+# --- Request hooks ---
+
+def _endpoint():
+    if request.url_rule is None:
+        return 'unmatched'
+    return request.endpoint or 'unknown'
+
+
+def current_request_stats():
+    """Mongo commands and seconds recorded so far on this request thread, or None."""
+    return getattr(_local, 'request', None)
+
+
+def _before_request():
+    _local.request = {'started': time.perf_counter(), 'commands': 0, 'mongo_seconds': 0.0, 'by_collection': {}}
+
+
+def _after_request(response):
+    stats = getattr(_local, 'request', None)
+    if stats is None:
+        return response
+    stats['status'] = response.status_code
+    if stats['commands']:
+        entry = f"mongo;dur={stats['mongo_seconds'] * 1000:.1f};desc=\"{stats['commands']} cmds\""
+        existing = response.headers.get('Server-Timing')
+        response.headers['Server-Timing'] = f'{existing}, {entry}' if existing else entry
+    return response
+
+
+def _teardown_request(exc=None):
+    # Recorded here rather than in after_request, which is skipped when the view raises
+    stats = getattr(_local, 'request', None)
+    if stats is None:
+        return
+    _local.request = None
+    status = 500 if exc is not None else stats.get('status', 500)
+    elapsed = time.perf_counter() - stats['started']
+    endpoint = _endpoint()
+    _observe('http_request_duration_seconds', (('endpoint', endpoint),), elapsed, LATENCY_BUCKETS)
+    _inc('http_requests_total', (('endpoint', endpoint), ('method', request.method), ('status', str(status))))
+    _observe('http_request_mongo_commands', (('endpoint', endpoint),), stats['commands'], COMMAND_COUNT_BUCKETS)
+    for collection, seconds in stats['by_collection'].items():
+        _inc('mongodb_request_command_seconds_total', (('endpoint', endpoint), ('collection', collection)), seconds)
+
+
+# --- MongoDB command listener ---
+
+def _collection_of(event):
+    name = event.command_name
+    if name == 'getMore':
+        target = event.command.get('collection')
+    else:
+        target = event.command.get(name)
+    if isinstance(target, str) and event.database_name != 'admin':
+        return target
+    return '_admin' if event.database_name == 'admin' else '_db'
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Counts and times every command; pymongo calls these on the issuing thread."""
+
+    def started(self, event):
+        pending = getattr(_local, 'pending', None)
+        if pending is None:
+            pending = _local.pending = {}
+        pending[event.request_id] = _collection_of(event)
+
+    def _finish(self, event, outcome):
+        pending = getattr(_local, 'pending', None) or {}
+        collection = pending.pop(event.request_id, '_unknown')
+        seconds = event.duration_micros / 1e6
+        labels = (('collection', collection), ('command', event.command_name))
+        _observe('mongodb_command_duration_seconds', labels, seconds, LATENCY_BUCKETS)
+        _inc('mongodb_commands_total', labels + (('outcome', outcome),))
+        stats = getattr(_local, 'request', None)
+        if stats is not None:
+            stats['commands'] += 1
+            stats['mongo_seconds'] += seconds
+            stats['by_collection'][collection] = stats['by_collection'].get(collection, 0.0) + seconds
+
+    def succeeded(self, event):
+        self._finish(event, 'ok')
+
+    def failed(self, event):
+        self._finish(event, 'error')
+
+
+# --- Exposition ---
+
+def _fmt_labels(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ''
+    body = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in items)
+    return '{' + body + '}'
+
+
+def _bucket_label(bound):
+    return f'{bound:g}'
+
+
+def render():
+    """Return all metrics in the Prometheus text exposition format (0.0.4)."""
+    with _lock:
+        histograms = {k: list(v) for k, v in _histograms.items()}
+        counters = dict(_counters)
+    lines = []
+    seen = set()
+
+    def header(metric):
+        if metric not in seen:
+            seen.add(metric)
+            kind, text = HELP.get(metric, ('untyped', ''))
+            lines.append(f'# HELP {metric} {text}')
+            lines.append(f'# TYPE {metric} {kind}')
+
+    for (metric, labels), h in sorted(histograms.items()):
+        header(metric)
+        buckets = COMMAND_COUNT_BUCKETS if metric == 'http_request_mongo_commands' else LATENCY_BUCKETS
+        cumulative = 0
+        for bound, n in zip(buckets, h):
+            cumulative += n
+            lines.append(f"{metric}_bucket{_fmt_labels(labels, ('le', _bucket_label(bound)))} {cumulative}")
+        lines.append(f"{metric}_bucket{_fmt_labels(labels, ('le', '+Inf'))} {h[-1]}")
+        lines.append(f'{metric}_sum{_fmt_labels(labels)} {h[-2]:.6f}')
+        lines.append(f'{metric}_count{_fmt_labels(labels)} {h[-1]}')
+
+    for (metric, labels), value in sorted(counters.items()):
+        header(metric)
+        lines.append(f'{metric}{_fmt_labels(labels)} {round(value, 6)}')
+
+    for provider in _gauge_providers:
+        try:
+            gauges = list(provider())
+        except Exception as e:
+            print(f'Metrics gauge provider failed: {e}')
+            continue
+        for name, text, labels, value in gauges:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f'# HELP {name} {text}')
+                lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name}{_fmt_labels(sorted(labels.items()))} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def init_app(app):
+    global _listener_registered
+    if not METRICS_ENABLED:
+        return
+    if not _listener_registered:
+        # Must happen before the first db.get_client() call in this process
+        db.add_event_listener(MongoCommandMetrics())
+        _listener_registered = True
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
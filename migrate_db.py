@@ -1,5 +1,28 @@
+"""Ensure indexes and normalize existing users/products.
+
+Every fix runs server-side as an aggregation-pipeline update over a window of
+``_id`` values, so a batch of N documents costs one round trip instead of N
+reads plus N writes. Progress is checkpointed per step in ``_checkpoints``;
+an interrupted run resumes after the last completed window.
+
+Usage:
+    python migrate_db.py                    # run (resuming if interrupted)
+    python migrate_db.py --dry-run          # count what would change, write nothing
+    python migrate_db.py --restart          # ignore saved checkpoints
+    python migrate_db.py --batch-size 5000
+"""
+import argparse
 import os
-from pymongo import MongoClient, ASCENDING
+
+from pymongo import MongoClient, ASCENDING, UpdateMany
+from pymongo.errors import BulkWriteError
+
+import inventory
+import otp
+import popularity
+import similarity
+import uploads
+from batch_tools import Checkpoint, Progress, id_ranges
 
 MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
 MONGO_DB_NAME = os.getenv('MONGO_DB_NAME', 'phonestoredb')
@@ -10,61 +33,121 @@ users = db['users']
 products = db['products']
 
 
-def ensure_indexes():
+def ensure_indexes(dry_run=False):
     print('Ensuring indexes...')
+    if dry_run:
+        print('  (dry run) users.email unique, users.role, products.id unique, reservations, otp_codes, product_stats, product_similar, fs.chunks, upload_sessions')
+        return
     try:
         users.create_index([('email', ASCENDING)], unique=True)
         users.create_index([('role', ASCENDING)], unique=False)
         products.create_index([('id', ASCENDING)], unique=True)
+        inventory.ensure_indexes(db)
+        otp.ensure_indexes(db)
+        popularity.ensure_indexes(db)
+        similarity.ensure_indexes(db)
+        uploads.ensure_indexes(db)
         print('Indexes ensured.')
     except Exception as e:
         print('Index ensure warning:', e)
 
 
-def normalize_user_emails_and_roles():
+# --- Steps: (filter selecting documents that need the fix, pipeline applying it) ---
+
+_NORMALIZED_EMAIL = {'$toLower': {'$trim': {'input': '$email'}}}
+
+USER_STEPS = [
+    # Lowercase and strip emails
+    ('email', {'email': {'$type': 'string'}, '$expr': {'$ne': ['$email', _NORMALIZED_EMAIL]}},
+     [{'$set': {'email': _NORMALIZED_EMAIL}}]),
+    # Backfill missing roles to 'user'
+    ('role', {'$or': [{'role': {'$exists': False}}, {'role': None}, {'role': ''}]},
+     [{'$set': {'role': 'user'}}]),
+    # Reset codes now live in otp_codes; drop the old per-user fields
+    ('reset_code', {'$or': [{'reset_code': {'$exists': True}}, {'reset_code_expires': {'$exists': True}}]},
+     [{'$unset': ['reset_code', 'reset_code_expires']}]),
+]
+
+
+def _default_if_missing(field, default):
+    return {'$cond': [{'$eq': [{'$type': f'${field}'}, 'missing']}, default, f'${field}']}
+
+
+PRODUCT_STEPS = [
+    # Ensure id is int
+    ('id', {'id': {'$type': 'string', '$regex': r'^\d+$'}},
+     [{'$set': {'id': {'$toInt': '$id'}}}]),
+    # Ensure required fields exist
+    ('required_fields', {'$or': [{k: {'$exists': False}} for k in ('title', 'image', 'price', 'category')]},
+     [{'$set': {
+         'title': _default_if_missing('title', ''),
+         'image': _default_if_missing('image', ''),
+         'category': _default_if_missing('category', ''),
+         'price': _default_if_missing('price', 0),
+     }}]),
+]
+
+
+def _in_window(filt, first, last):
+    return {'$and': [{'_id': {'$gte': first, '$lte': last}}, filt]}
+
+
+def run_steps(col, steps, batch_size, dry_run=False, restart=False):
+    """Apply ``steps`` to ``col`` window by window with one unordered bulk_write per window."""
+    name = col.name
+    if dry_run:
+        for step, filt, _ in steps:
+            print(f'  (dry run) {name}.{step}: {col.count_documents(filt):,} documents would change')
+        return {}
+
+    checkpoint = Checkpoint(db, f'migrate_db:{name}')
+    if restart:
+        checkpoint.clear()
+    start_after = checkpoint.load()
+    if start_after is not None:
+        print(f'  resuming {name} after _id {start_after}')
+    progress = Progress(f'{name} scanned', col.estimated_document_count())
+    modified = 0
+    errors = 0
+    for first, last, count in id_ranges(col, batch_size, start_after):
+        # Unordered: a duplicate-key failure in one step doesn't block the others
+        ops = [UpdateMany(_in_window(filt, first, last), pipeline) for _, filt, pipeline in steps]
+        try:
+            modified += col.bulk_write(ops, ordered=False).modified_count
+        except BulkWriteError as e:
+            modified += e.details.get('nModified', 0)
+            for err in e.details.get('writeErrors', []):
+                errors += 1
+                print(f"  ⚠️ {name} window {first}..{last}: {err.get('errmsg')}")
+        checkpoint.save(last, modified=modified, errors=errors)
+        progress.add(count)
+    checkpoint.clear()
+    print(f'  {name}: {modified:,} modified, {errors} errors in {progress.elapsed():.1f}s '
+          f'({progress.rate():,.0f} docs/s)')
+    return {'modified': modified, 'errors': errors}
+
+
+def normalize_user_emails_and_roles(batch_size=1000, dry_run=False, restart=False):
     print('Normalizing user emails and roles...')
-    updated = 0
-    for u in users.find({}):
-        updates = {}
-        # Lowercase and strip emails
-        email = (u.get('email') or '').strip()
-        if email and email != email.lower():
-            updates['email'] = email.lower()
-        # Backfill missing roles to 'user'
-        if not u.get('role'):
-            updates['role'] = 'user'
-        if updates:
-            users.update_one({'_id': u['_id']}, {'$set': updates})
-            updated += 1
-    print(f'Users normalized: {updated}')
-
-
-def clean_products():
+    return run_steps(users, USER_STEPS, batch_size, dry_run, restart)
+
+
+def clean_products(batch_size=1000, dry_run=False, restart=False):
     print('Cleaning product fields...')
-    cleaned = 0
-    for p in products.find({}):
-        updates = {}
-        # Ensure id is int
-        try:
-            if isinstance(p.get('id'), str) and p['id'].isdigit():
-                updates['id'] = int(p['id'])
-        except Exception:
-            pass
-        # Ensure required fields exist
-        for key in ['title', 'image', 'price', 'category']:
-            if key not in p:
-                updates[key] = '' if key in ('title', 'image', 'category') else 0
-        if updates:
-            products.update_one({'_id': p['_id']}, {'$set': updates})
-            cleaned += 1
-    print(f'Products cleaned: {cleaned}')
+    return run_steps(products, PRODUCT_STEPS, batch_size, dry_run, restart)
 
 
 def main():
-    ensure_indexes()
-    normalize_user_emails_and_roles()
-    clean_products()
-    print('Migration complete.')
+    parser = argparse.ArgumentParser(description='Ensure indexes and normalize users/products.')
+    parser.add_argument('--batch-size', type=int, default=1000, help='documents per server-side update window')
+    parser.add_argument('--dry-run', action='store_true', help='report what would change without writing')
+    parser.add_argument('--restart', action='store_true', help='discard checkpoints and scan from the start')
+    args = parser.parse_args()
+
+    ensure_indexes(args.dry_run)
+    normalize_user_emails_and_roles(args.batch_size, args.dry_run, args.restart)
+    clean_products(args.batch_size, args.dry_run, args.restart)
+    print('Migration complete.' if not args.dry_run else 'Dry run complete.')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,143 @@
+"""One-time codes (password resets and similar) in their own collection.
+
+Each pending code is one document in ``otp_codes`` keyed by (email, purpose).
+Only an HMAC of the code is stored, never the code itself. ``purge_at``
+carries a TTL index (expireAfterSeconds=0), so MongoDB deletes old documents
+on its own and no sweeper is needed. Code expiry (``expires_at``) is checked
+on every lookup, because the TTL monitor only runs about once a minute.
+
+Wrong guesses count against ``OTP_MAX_ATTEMPTS`` per ``OTP_LOCKOUT_SECONDS``
+window, not per code: re-issuing a code keeps the count, and no new code is
+issued once it is used up, until the window ends. An attempt is claimed with
+one conditional ``$inc`` before the code is compared, so parallel guesses
+cannot go past the limit.
+"""
+import hashlib
+import hmac
+import os
+import secrets
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+import db
+
+
+OTP_TTL_SECONDS = int(os.getenv('OTP_TTL_SECONDS', '900'))
+OTP_MAX_ATTEMPTS = int(os.getenv('OTP_MAX_ATTEMPTS', '5'))
+OTP_RESEND_SECONDS = int(os.getenv('OTP_RESEND_SECONDS', '30'))
+OTP_LOCKOUT_SECONDS = int(os.getenv('OTP_LOCKOUT_SECONDS', '3600'))
+OTP_DIGITS = 6
+
+PASSWORD_RESET = 'password_reset'
+
+# Verification outcomes
+OK = 'ok'
+MISSING = 'missing'
+INVALID = 'invalid'
+EXPIRED = 'expired'
+LOCKED = 'locked'
+
+codes_col = db.CollectionProxy('otp_codes')
+
+
+def ensure_indexes(database):
+    col = database['otp_codes']
+    col.create_index([('email', ASCENDING), ('purpose', ASCENDING)], unique=True)
+    # The TTL used to be on expires_at, which deleted the attempt count along with the code
+    if 'expireAfterSeconds' in col.index_information().get('expires_at_1', {}):
+        col.drop_index('expires_at_1')
+    col.update_many({'purge_at': {'$exists': False}}, [{'$set': {'purge_at': '$expires_at'}}])
+    col.create_index([('purge_at', ASCENDING)], expireAfterSeconds=0)
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _secret():
+    return (os.getenv('OTP_SECRET') or os.getenv('FLASK_SECRET_KEY', 'dev-secret-key')).encode('utf-8')
+
+
+def _hash(email, purpose, code):
+    msg = f'{purpose}:{email}:{code}'.encode('utf-8')
+    return hmac.new(_secret(), msg, hashlib.sha256).hexdigest()
+
+
+def _aware(ts):
+    # PyMongo returns naive UTC datetimes unless the client is tz_aware
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def issue(email, purpose=PASSWORD_RESET):
+    """Create (or replace) the code for (email, purpose) and return it in clear text.
+
+    Returns None if a code was issued less than ``OTP_RESEND_SECONDS`` ago, so
+    repeated requests can't be used to flood an inbox, or if the attempts for
+    the current lockout window are used up.
+    """
+    now = _now()
+    key = {'email': email, 'purpose': purpose}
+    existing = codes_col.find_one(key, {'issued_at': 1, 'expires_at': 1, 'attempts': 1, 'window_start': 1})
+    if (existing and _aware(existing['expires_at']) > now
+            and (now - _aware(existing['issued_at'])).total_seconds() < OTP_RESEND_SECONDS):
+        return None
+    window_start = existing and existing.get('window_start')
+    in_window = bool(window_start) and (now - _aware(window_start)).total_seconds() < OTP_LOCKOUT_SECONDS
+    if in_window and existing.get('attempts', 0) >= OTP_MAX_ATTEMPTS:
+        return None
+    code = str(secrets.randbelow(10 ** OTP_DIGITS)).zfill(OTP_DIGITS)
+    expires_at = now + timedelta(seconds=OTP_TTL_SECONDS)
+    doc = {
+        'code_hash': _hash(email, purpose, code),
+        'issued_at': now,
+        'expires_at': expires_at,
+    }
+    if in_window:
+        # Keep counting wrong guesses; a new code is not a new set of attempts
+        doc['purge_at'] = max(expires_at, _aware(window_start) + timedelta(seconds=OTP_LOCKOUT_SECONDS))
+    else:
+        doc.update(attempts=0, window_start=now,
+                   purge_at=max(expires_at, now + timedelta(seconds=OTP_LOCKOUT_SECONDS)))
+    try:
+        codes_col.update_one(key, {'$set': doc}, upsert=True)
+    except DuplicateKeyError:
+        # A concurrent request upserted the same key first; overwrite it
+        codes_col.update_one(key, {'$set': doc})
+    return code
+
+
+def verify(email, code, purpose=PASSWORD_RESET, consume=False):
+    """Check ``code`` for (email, purpose); returns one of OK, MISSING, INVALID, EXPIRED, LOCKED.
+
+    A correct code does not use up an attempt. With ``consume=True`` it is
+    deleted, so it cannot be used again.
+    """
+    key = {'email': email, 'purpose': purpose}
+    now = _now()
+    doc = codes_col.find_one_and_update(
+        dict(key, expires_at={'$gt': now}, attempts={'$lt': OTP_MAX_ATTEMPTS}),
+        {'$inc': {'attempts': 1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if doc is None:
+        current = codes_col.find_one(key, {'attempts': 1, 'expires_at': 1})
+        if current is None:
+            return MISSING
+        if _aware(current['expires_at']) <= now:
+            return EXPIRED
+        return LOCKED
+    if not hmac.compare_digest(doc['code_hash'], _hash(email, purpose, str(code).strip())):
+        return INVALID
+    if consume:
+        # Matching on the hash means a code that was re-issued meanwhile survives
+        if not codes_col.delete_one({'_id': doc['_id'], 'code_hash': doc['code_hash']}).deleted_count:
+            return MISSING
+    else:
+        codes_col.update_one({'_id': doc['_id']}, {'$inc': {'attempts': -1}})
+    return OK
+
+
+def discard(email, purpose=PASSWORD_RESET):
+    codes_col.delete_one({'email': email, 'purpose': purpose})
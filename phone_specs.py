@@ -0,0 +1,128 @@
+"""Structured phone specs from data/mobile_phones.csv and product spec strings."""
+import csv
+import json
+import os
+import re
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PHONES_CSV = os.path.join(HERE, 'data', 'mobile_phones.csv')
+
+# CSV header -> normalized numeric attribute name
+NUMERIC_COLUMNS = {
+    'Display Size (inches)': 'display_in',
+    'RAM (GB)': 'ram_gb',
+    'Storage (GB)': 'storage_gb',
+    'Battery (mAh)': 'battery_mah',
+    'Price (USD)': 'price',
+    'Release Year': 'release_year',
+}
+
+# Spec-string keys (lower-cased) that map onto the same attributes
+SPEC_KEY_ALIASES = {
+    'ram': 'ram_gb', 'memory': 'ram_gb', 'ram (gb)': 'ram_gb',
+    'storage': 'storage_gb', 'rom': 'storage_gb', 'storage (gb)': 'storage_gb',
+    'battery': 'battery_mah', 'battery (mah)': 'battery_mah',
+    'display': 'display_in', 'screen': 'display_in', 'display size': 'display_in',
+    'display size (inches)': 'display_in', 'screen size': 'display_in',
+    'release year': 'release_year', 'year': 'release_year',
+    'price': 'price', 'price (usd)': 'price',
+}
+
+_NUMBER = re.compile(r'-?\d+(?:\.\d+)?')
+ATTRIBUTES = tuple(NUMERIC_COLUMNS.values())
+
+
+def _to_number(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER.search(str(value or '').replace(',', ''))
+    return float(match.group()) if match else None
+
+
+def parse_specs(raw):
+    """Normalize stored specs (dict, JSON string or ``key: value`` lines) to a dict."""
+    if isinstance(raw, dict):
+        return raw
+    specs = {}
+    if isinstance(raw, str) and raw.strip():
+        try:
+            parsed = json.loads(raw)
+            return parsed if isinstance(parsed, dict) else {}
+        except ValueError:
+            for line in raw.splitlines():
+                if ':' in line:
+                    k, v = line.split(':', 1)
+                    specs[k.strip()] = v.strip()
+    return specs
+
+
+def numeric_specs(specs):
+    """Extract the numeric attributes we know about from a parsed specs dict."""
+    out = {}
+    for key, value in specs.items():
+        attr = SPEC_KEY_ALIASES.get(str(key).strip().lower())
+        if attr:
+            num = _to_number(value)
+            if num is not None:
+                out[attr] = num
+    return out
+
+
+def load_phones(csv_path=PHONES_CSV):
+    """Return one dict per CSV row with ``name``, ``brand``, ``model``, ``os`` and numeric attributes."""
+    if not os.path.exists(csv_path):
+        return []
+    phones = []
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            brand = (row.get('Brand') or '').strip()
+            model = (row.get('Model') or '').strip()
+            phone = {
+                'brand': brand,
+                'model': model,
+                'name': model if model.lower().startswith(brand.lower()) else f'{brand} {model}'.strip(),
+                'os': (row.get('OS') or '').strip(),
+            }
+            for column, attr in NUMERIC_COLUMNS.items():
+                phone[attr] = _to_number(row.get(column))
+            phones.append(phone)
+    return phones
+
+
+def _norm(text):
+    return re.sub(r'[^a-z0-9]+', ' ', str(text).lower()).strip()
+
+
+def phone_models(csv_path=PHONES_CSV):
+    """``[(normalized name, phone)]`` from the CSV, longest name first so titles match the most specific model."""
+    models = []
+    for phone in load_phones(csv_path):
+        models.append((_norm(phone['name']), phone))
+        if phone['brand']:
+            models.append((_norm(f"{phone['brand']} {phone['model']}"), phone))
+    return sorted(models, key=lambda m: -len(m[0]))
+
+
+def match_phone(title, models):
+    """The CSV phone whose name appears in ``title``, or None."""
+    text = f' {_norm(title)} '
+    for name, phone in models:
+        if name and f' {name} ' in text:
+            return phone
+    return None
+
+
+def product_attributes(doc, models=()):
+    """Numeric attributes of a product: its specs and price, with CSV values for those it lacks."""
+    values = numeric_specs(parse_specs(doc.get('specs', '')))
+    try:
+        values['price'] = float(doc['price'])
+    except (KeyError, TypeError, ValueError):
+        pass
+    phone = match_phone(doc.get('title', ''), models) if models else None
+    if phone:
+        for attr in ATTRIBUTES:
+            if attr not in values and phone.get(attr) is not None:
+                values[attr] = phone[attr]
+    return values
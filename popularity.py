@@ -0,0 +1,290 @@
+"""Product popularity counters, batched in memory and flushed to MongoDB.
+
+Request handlers call ``record(pid, VIEW)`` and similar. That increments an
+in-process counter and does no database I/O. Counters are split into
+``POPULARITY_SHARDS`` shards, each with its own lock, and a thread always uses
+the same shard, so request threads rarely wait on each other.
+
+Every ``POPULARITY_FLUSH_SECONDS`` a background thread swaps out each shard's
+counts and writes them as one unordered ``bulk_write`` of ``$inc`` upserts into
+``product_stats``. That collection holds one document per (product, bucket) of
+``POPULARITY_BUCKET_SECONDS``. Handling thousands of views costs a single round
+trip with one update per product touched. Counts that were certainly not
+written go back into the shards and are retried, up to
+``POPULARITY_MAX_PENDING`` keys: the documents a ``BulkWriteError`` lists, or
+the whole batch if no server could be reached. After an error that leaves it
+unclear what was applied (a dropped connection mid-write) the batch is
+dropped instead, so it is never counted twice. A TTL index drops buckets after
+``POPULARITY_RETENTION_DAYS``.
+
+Counts not yet flushed are lost if a worker is killed; they are flushed on a
+normal exit.
+"""
+import atexit
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError, ServerSelectionTimeoutError, WaitQueueTimeoutError
+
+import catalog_snapshot
+import db
+
+
+POPULARITY_ENABLED = os.getenv('POPULARITY_ENABLED', 'true').lower() == 'true'
+POPULARITY_FLUSH_SECONDS = float(os.getenv('POPULARITY_FLUSH_SECONDS', '10'))
+POPULARITY_BUCKET_SECONDS = int(os.getenv('POPULARITY_BUCKET_SECONDS', '3600'))
+POPULARITY_RETENTION_DAYS = int(os.getenv('POPULARITY_RETENTION_DAYS', '30'))
+POPULARITY_SHARDS = int(os.getenv('POPULARITY_SHARDS', '16'))
+POPULARITY_MAX_PENDING = int(os.getenv('POPULARITY_MAX_PENDING', '100000'))
+POPULARITY_CACHE_SECONDS = float(os.getenv('POPULARITY_CACHE_SECONDS', '30'))
+MAX_LIMIT = 50
+
+VIEW = 'views'
+CART_ADD = 'cart_adds'
+IMAGE_HIT = 'image_hits'
+METRICS = (VIEW, CART_ADD, IMAGE_HIT)
+
+# Weights for the combined ``score``; a cart add says more than a page view.
+# Image hits mostly come from thumbnails on the home page, so they count little
+WEIGHTS = {VIEW: 1.0, CART_ADD: 5.0, IMAGE_HIT: 0.1}
+
+# Trending: recent score / (baseline score per window + smoothing)
+TRENDING_BASELINE_WINDOWS = 7
+TRENDING_SMOOTHING = 5.0
+
+stats_col = db.CollectionProxy('product_stats')
+products_col = db.CollectionProxy('products')
+
+
+def ensure_indexes(database):
+    col = database['product_stats']
+    col.create_index([('product_id', ASCENDING), ('bucket', ASCENDING)], unique=True)
+    col.create_index([('bucket', ASCENDING)], expireAfterSeconds=POPULARITY_RETENTION_DAYS * 86400)
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+# --- Counting ---
+
+class _Shard:
+    __slots__ = ('lock', 'counts')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}  # (pid, bucket start epoch, metric) -> n
+
+
+_shards = [_Shard() for _ in range(max(1, POPULARITY_SHARDS))]
+stats = {'recorded': 0, 'flushes': 0, 'flushed_keys': 0, 'flush_errors': 0, 'dropped': 0}
+
+
+def record(pid, metric, n=1):
+    """Count ``n`` events of ``metric`` for product ``pid``. Never touches MongoDB."""
+    if not POPULARITY_ENABLED or pid is None:
+        return
+    bucket = int(time.time()) // POPULARITY_BUCKET_SECONDS * POPULARITY_BUCKET_SECONDS
+    key = (pid, bucket, metric)
+    shard = _shards[threading.get_ident() % len(_shards)]
+    with shard.lock:
+        shard.counts[key] = shard.counts.get(key, 0) + n
+
+
+def pending():
+    return sum(len(s.counts) for s in _shards)
+
+
+def _drain():
+    merged = {}
+    for shard in _shards:
+        with shard.lock:
+            counts, shard.counts = shard.counts, {}
+        for key, n in counts.items():
+            merged[key] = merged.get(key, 0) + n
+    return merged
+
+
+def _restore(counts):
+    """Put counts from a failed flush back, dropping them if too much is pending."""
+    if pending() + len(counts) > POPULARITY_MAX_PENDING:
+        stats['dropped'] += sum(counts.values())
+        return
+    shard = _shards[0]
+    with shard.lock:
+        for key, n in counts.items():
+            shard.counts[key] = shard.counts.get(key, 0) + n
+
+
+def flush():
+    """Write all pending counts in one bulk write; returns the number of documents touched."""
+    counts = _drain()
+    if not counts:
+        return 0
+    per_doc = {}
+    for (pid, bucket, metric), n in counts.items():
+        per_doc.setdefault((pid, bucket), {})[metric] = n
+    docs = list(per_doc)
+    ops = [UpdateOne({'product_id': pid, 'bucket': datetime.fromtimestamp(bucket, timezone.utc)},
+                     {'$inc': per_doc[(pid, bucket)]}, upsert=True)
+           for pid, bucket in docs]
+    try:
+        stats_col.bulk_write(ops, ordered=False)
+    except BulkWriteError as e:
+        # Unordered: every op not listed in writeErrors was applied, so only those are retried
+        failed = {docs[err['index']] for err in e.details.get('writeErrors', [])}
+        retry = {(pid, bucket, metric): n for pid, bucket in failed for metric, n in per_doc[(pid, bucket)].items()}
+        stats['flush_errors'] += 1
+        stats['flushed_keys'] += len(ops) - len(failed)
+        stats['recorded'] += sum(counts.values()) - sum(retry.values())
+        print(f'Popularity flush: {len(failed)} of {len(ops)} documents failed, will retry them')
+        _restore(retry)
+        return len(ops) - len(failed)
+    except (ServerSelectionTimeoutError, WaitQueueTimeoutError) as e:
+        # Nothing was sent, so retrying cannot count anything twice
+        stats['flush_errors'] += 1
+        print(f'Popularity flush failed ({len(ops)} documents), will retry: {e}')
+        _restore(counts)
+        return 0
+    except PyMongoError as e:
+        # Some of the batch may have been applied; re-adding it could double-count
+        stats['flush_errors'] += 1
+        stats['dropped'] += sum(counts.values())
+        print(f'Popularity flush interrupted ({len(ops)} documents), dropping its counts: {e}')
+        return 0
+    stats['flushes'] += 1
+    stats['flushed_keys'] += len(ops)
+    stats['recorded'] += sum(counts.values())
+    return len(ops)
+
+
+_flusher_lock = threading.Lock()
+_flusher_pid = None
+
+
+def _flush_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            flush()
+        except Exception as e:
+            print(f'Popularity flush error: {e}')
+
+
+def start_flusher(interval=POPULARITY_FLUSH_SECONDS):
+    """Start the flush thread once per process, and flush once more at exit."""
+    global _flusher_pid
+    if not POPULARITY_ENABLED or interval <= 0:
+        return
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+        threading.Thread(target=_flush_loop, args=(interval,), name='popularity-flush', daemon=True).start()
+    atexit.register(flush)
+
+
+# --- Reading rollups ---
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _cached(key, compute):
+    """``compute()``, cached for POPULARITY_CACHE_SECONDS.
+
+    While the catalog breaker is open, or if ``compute`` fails, the last
+    value (however old) or an empty list is served instead, and cached like
+    a fresh one so MongoDB is not retried on every request.
+    """
+    now = time.monotonic()
+    with _cache_lock:
+        hit = _cache.get(key)
+    if hit and now - hit[0] < POPULARITY_CACHE_SECONDS:
+        return hit[1]
+    if catalog_snapshot.breaker.is_open():
+        value = hit[1] if hit else []
+    else:
+        try:
+            value = compute()
+        except PyMongoError as e:
+            print(f'Popularity rollup {key[0]} unavailable, serving the last result: {e}')
+            value = hit[1] if hit else []
+    with _cache_lock:
+        _cache[key] = (now, value)
+    return value
+
+
+def _score(row):
+    return sum(WEIGHTS[m] * row.get(m, 0) for m in METRICS)
+
+
+def totals(hours, before=None):
+    """``{pid: {'views': n, 'cart_adds': n, 'image_hits': n}}`` for the ``hours`` up to ``before`` (now)."""
+    until = before or _now()
+    match = {'bucket': {'$gte': until - timedelta(hours=hours)}}
+    if before is not None:
+        match['bucket']['$lt'] = before
+    group = {'_id': '$product_id'}
+    group.update({m: {'$sum': '$' + m} for m in METRICS})
+    rows = stats_col.aggregate([{'$match': match}, {'$group': group}])
+    return {row['_id']: {m: row.get(m, 0) for m in METRICS} for row in rows}
+
+
+def scores(hours=24 * 7):
+    """Weighted popularity score per product; used to rank search suggestions."""
+    return {pid: _score(row) for pid, row in totals(hours).items()}
+
+
+def _with_products(ranked):
+    """Attach public product fields to ``[(pid, extra fields)]``, keeping the order."""
+    pids = [pid for pid, _ in ranked]
+    docs = {d['id']: d for d in products_col.find({'id': {'$in': pids}},
+                                                  {'_id': 0, 'id': 1, 'title': 1, 'price': 1, 'category': 1,
+                                                   'brand': 1, 'image': 1, 'image_file_id': 1})}
+    out = []
+    for pid, extra in ranked:
+        doc = docs.get(pid)
+        if doc is None:
+            continue  # deleted since it was counted
+        doc.update(extra)
+        out.append(doc)
+    return out
+
+
+def popular(metric='score', hours=24, limit=10):
+    """Top products over the last ``hours`` by one metric or the weighted score."""
+    def compute():
+        rows = totals(hours)
+        key = _score if metric == 'score' else (lambda row: row.get(metric, 0))
+        ranked = sorted(rows.items(), key=lambda item: (-key(item[1]), item[0]))
+        ranked = [(pid, dict(row, score=round(_score(row), 2))) for pid, row in ranked if key(row) > 0]
+        return _with_products(ranked[:MAX_LIMIT])
+    return _cached(('popular', metric, hours), compute)[:limit]
+
+
+def trending(hours=24, limit=10):
+    """Products whose score over the last ``hours`` most exceeds their usual rate."""
+    def compute():
+        start = _now() - timedelta(hours=hours)
+        before = totals(hours * TRENDING_BASELINE_WINDOWS, before=start)
+        ranked = []
+        for pid, row in totals(hours).items():
+            recent = _score(row)
+            if recent <= 0:
+                continue
+            baseline = _score(before.get(pid, {})) / TRENDING_BASELINE_WINDOWS
+            ranked.append((pid, {'score': round(recent, 2), 'baseline': round(baseline, 2),
+                                'trend': round(recent / (baseline + TRENDING_SMOOTHING), 3)}))
+        ranked.sort(key=lambda item: (-item[1]['trend'], -item[1]['score'], item[0]))
+        return _with_products(ranked[:MAX_LIMIT])
+    return _cached(('trending', hours), compute)[:limit]
+
+
+def gauges():
+    yield ('popularity_pending_keys', 'Popularity counters not yet flushed to MongoDB.', {}, pending())
+    for name, value in stats.items():
+        yield ('popularity_' + name, f'Popularity counter {name.replace("_", " ")}.', {}, value)
@@ -0,0 +1,300 @@
+"""Live product change feed, fanned out to Server-Sent Events subscribers.
+
+Each process runs at most one watcher thread, and so holds at most one
+upstream cursor, however many clients are connected. The watcher tails a
+MongoDB change stream on ``products`` and keeps its resume token, so a dropped
+cursor picks up where it left off. On a standalone mongod, where change
+streams are unavailable, it polls the collection every ``FEED_POLL_SECONDS``
+and diffs it against the previous poll instead. The watcher starts with the
+first subscriber and stops ``FEED_IDLE_SECONDS`` after the last one leaves.
+
+Every change becomes an event ``{'op': 'upsert'|'delete', 'id': pid,
+'product': {...}}`` with an SSE id of ``<epoch>:<seq>``. The last
+``FEED_REPLAY_EVENTS`` events are kept, so a browser reconnecting with
+``Last-Event-ID`` receives what it missed. If the gap can't be replayed (a
+different worker, a restart, or a subscriber too slow to keep up), the client
+gets a ``reset`` event and reloads the catalog once.
+"""
+import collections
+import hashlib
+import os
+import queue
+import threading
+import time
+import uuid
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+import fastjson
+
+
+# auto: change stream, falling back to polling where the server has none
+FEED_MODE = os.getenv('FEED_MODE', 'auto').lower()
+FEED_HEARTBEAT_SECONDS = float(os.getenv('FEED_HEARTBEAT_SECONDS', '15'))
+FEED_POLL_SECONDS = float(os.getenv('FEED_POLL_SECONDS', '2'))
+FEED_IDLE_SECONDS = float(os.getenv('FEED_IDLE_SECONDS', '60'))
+FEED_REPLAY_EVENTS = int(os.getenv('FEED_REPLAY_EVENTS', '500'))
+FEED_QUEUE_SIZE = int(os.getenv('FEED_QUEUE_SIZE', '1000'))
+# Each open stream holds a worker thread under gthread; leave the rest for normal requests
+FEED_MAX_SUBSCRIBERS = int(os.getenv('FEED_MAX_SUBSCRIBERS', str(max(1, int(os.getenv('GUNICORN_THREADS', '4')) // 2))))
+FEED_RETRY_MS = 3000
+
+# Server error codes meaning "change streams are not available here"
+_NO_CHANGE_STREAMS = {40573, 40324, 20}
+_HISTORY_LOST = 286
+
+RESET = object()
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscriber:
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=FEED_QUEUE_SIZE)
+        self.backlog = []
+        self.reset = False
+
+    def push(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            # Too slow to keep up: drop what's queued and tell the client to reload
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self.queue.put_nowait(RESET)
+
+
+class ProductFeed:
+    def __init__(self, collection, transform=None):
+        self.collection = collection
+        self.transform = transform or (lambda doc: doc)
+        self.epoch = uuid.uuid4().hex[:8]
+        self.mode = 'polling' if FEED_MODE == 'polling' else None  # set by the watcher otherwise
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._recent = collections.deque(maxlen=FEED_REPLAY_EVENTS)
+        self._seq = 0
+        self._thread = None
+        self._thread_pid = None
+        self._resume_token = None
+        self._pids = {}  # _id -> product id, to name deletes
+        self.stats = {'events': 0, 'resets': 0, 'reconnects': 0}
+
+    # --- Subscribers ---
+
+    def subscribe(self, last_event_id=None):
+        sub = Subscriber()
+        with self._lock:
+            if len(self._subscribers) >= FEED_MAX_SUBSCRIBERS:
+                raise TooManySubscribers()
+            if last_event_id:
+                backlog = self._replay(last_event_id)
+                if backlog is None:
+                    sub.reset = True
+                else:
+                    sub.backlog = backlog
+            self._subscribers.add(sub)
+            self._ensure_watcher()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def _replay(self, last_event_id):
+        """Events after ``last_event_id``, or None if they can't all be replayed."""
+        epoch, _, seq = last_event_id.partition(':')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        if seq > self._seq:
+            return None
+        if seq == self._seq:
+            return []
+        if not self._recent or self._recent[0][0] > seq + 1:
+            return None
+        return [payload for n, payload in self._recent if n > seq]
+
+    def publish(self, op, pid, product=None):
+        event = {'op': op, 'id': pid}
+        if product is not None:
+            event['product'] = self.transform(product)
+        with self._lock:
+            self._seq += 1
+            payload = format_event('product', event, f'{self.epoch}:{self._seq}')
+            self._recent.append((self._seq, payload))
+            subscribers = list(self._subscribers)
+            self.stats['events'] += 1
+        for sub in subscribers:
+            sub.push(payload)
+
+    def _reset_all(self):
+        with self._lock:
+            # Nothing before this point can be replayed any more
+            self._recent.clear()
+            subscribers = list(self._subscribers)
+            self.stats['resets'] += 1
+        for sub in subscribers:
+            sub.push(RESET)
+
+    # --- Watcher ---
+
+    def _ensure_watcher(self):
+        pid = os.getpid()
+        if self._thread is not None and self._thread.is_alive() and self._thread_pid == pid:
+            return
+        self._thread_pid = pid
+        self._thread = threading.Thread(target=self._run, name='product-feed', daemon=True)
+        self._thread.start()
+
+    def _idle(self, since):
+        with self._lock:
+            if self._subscribers:
+                return False
+            if time.monotonic() - since < FEED_IDLE_SECONDS:
+                return False
+            # Exit under the lock so a concurrent subscribe() starts a fresh watcher
+            self._thread = None
+            return True
+
+    def _run(self):
+        if self.mode != 'polling':
+            try:
+                self._watch()
+                return
+            except OperationFailure as e:
+                if e.code not in _NO_CHANGE_STREAMS:
+                    raise
+                if FEED_MODE == 'change_stream':
+                    raise
+                print(f'Change streams unavailable ({e.code}); polling products every {FEED_POLL_SECONDS}s')
+        self._poll()
+
+    def _watch(self):
+        idle_since = time.monotonic()
+        backoff = 0.5
+        while True:
+            try:
+                with self.collection.watch(full_document='updateLookup', resume_after=self._resume_token,
+                                           max_await_time_ms=1000) as stream:
+                    self.mode = 'change_stream'
+                    if not self._pids:
+                        self._pids = {d['_id']: d.get('id') for d in self.collection.find({}, {'id': 1})}
+                    backoff = 0.5
+                    while True:
+                        change = stream.try_next()
+                        self._resume_token = stream.resume_token
+                        if change is not None:
+                            self._apply_change(change)
+                        if self._subscribers:
+                            idle_since = time.monotonic()
+                        elif self._idle(idle_since):
+                            self._resume_token = None
+                            return
+            except OperationFailure as e:
+                if e.code in _NO_CHANGE_STREAMS:
+                    raise
+                if e.code == _HISTORY_LOST:
+                    # The oplog no longer covers our token: start over and make clients reload
+                    self._resume_token = None
+                    self._reset_all()
+                print(f'Product change stream error: {e}')
+            except PyMongoError as e:
+                print(f'Product change stream error: {e}')
+            self.stats['reconnects'] += 1
+            if self._idle(idle_since):
+                return
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def _apply_change(self, change):
+        op = change['operationType']
+        key = change.get('documentKey', {}).get('_id')
+        if op in ('insert', 'update', 'replace'):
+            doc = change.get('fullDocument')
+            if doc is None:
+                return  # deleted again before the lookup ran; its delete event follows
+            self._pids[key] = doc.get('id')
+            doc = {k: v for k, v in doc.items() if k != '_id'}
+            self.publish('upsert', doc.get('id'), doc)
+        elif op == 'delete':
+            pid = self._pids.pop(key, None)
+            if pid is not None:
+                self.publish('delete', pid)
+        elif op in ('drop', 'rename', 'dropDatabase', 'invalidate'):
+            self._pids = {}
+            self._resume_token = None
+            self._reset_all()
+
+    def _poll(self):
+        self.mode = 'polling'
+        idle_since = time.monotonic()
+        previous = None
+        while True:
+            try:
+                current = {}
+                docs = {}
+                for doc in self.collection.find({}, {'_id': 0}):
+                    if 'id' not in doc:
+                        continue
+                    current[doc['id']] = hashlib.blake2b(fastjson.dumps(doc), digest_size=16).digest()
+                    docs[doc['id']] = doc
+                if previous is not None:
+                    for pid, digest in current.items():
+                        if previous.get(pid) != digest:
+                            self.publish('upsert', pid, docs[pid])
+                    for pid in previous.keys() - current.keys():
+                        self.publish('delete', pid)
+                previous = current
+            except PyMongoError as e:
+                print(f'Product poll error: {e}')
+            if self._subscribers:
+                idle_since = time.monotonic()
+            elif self._idle(idle_since):
+                return
+            time.sleep(FEED_POLL_SECONDS)
+
+    def gauges(self):
+        yield ('product_feed_subscribers', 'Open product change-feed streams.', {}, self.subscriber_count())
+        for name, value in self.stats.items():
+            yield ('product_feed_' + name, f'Product change-feed {name}.', {}, value)
+
+
+# --- SSE framing ---
+
+def format_event(event, data, event_id=None):
+    lines = []
+    if event_id:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append('data: ' + fastjson.dumps(data).decode('utf-8'))
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+
+def sse_stream(feed, sub):
+    """Yield SSE bytes for ``sub`` until the client goes away."""
+    try:
+        yield f'retry: {FEED_RETRY_MS}\n'.encode('utf-8')
+        yield format_event('hello', {'mode': feed.mode, 'epoch': feed.epoch})
+        if sub.reset:
+            yield format_event('reset', {})
+        for payload in sub.backlog:
+            yield payload
+        while True:
+            try:
+                item = sub.queue.get(timeout=FEED_HEARTBEAT_SECONDS)
+            except queue.Empty:
+                # Comment line: keeps proxies from timing out and detects dead clients
+                yield b': ping\n\n'
+                continue
+            yield format_event('reset', {}) if item is RESET else item
+    finally:
+        feed.unsubscribe(sub)
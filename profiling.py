@@ -0,0 +1,266 @@
+"""Opt-in per-request profiler.
+
+A request is profiled when it sends ``X-Profile: <PROFILE_TOKEN>`` (or just
+``X-Profile: 1`` from an admin session when no token is configured), or when
+it is picked by ``PROFILE_SAMPLE_RATE``. While it runs:
+
+* a sampler thread snapshots the request thread's stack every
+  ``PROFILE_INTERVAL_MS`` via ``sys._current_frames()`` and folds the stacks
+  (flamegraph.pl / speedscope compatible);
+* a pymongo CommandListener records every command the request issues, in
+  order, with its normalized query shape;
+* query shapes issued ``PROFILE_REPEAT_THRESHOLD`` or more times are flagged
+  as likely N+1 patterns.
+
+Each profile is written as JSON to ``PROFILE_DIR`` (relative to this module,
+not the working directory; oldest files beyond ``PROFILE_MAX_FILES`` are
+removed) and its name is returned in the ``X-Profile-Id`` response header. A
+request whose view raised is still profiled, with status 500 and no header.
+"""
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from flask import request, session
+from pymongo import monitoring
+
+import db
+
+
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.getenv('PROFILE_DIR', 'profiles'))
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', '5'))
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', '200'))
+PROFILE_REPEAT_THRESHOLD = int(os.getenv('PROFILE_REPEAT_THRESHOLD', '2'))
+MAX_STACK_DEPTH = 64
+
+_local = threading.local()
+_write_lock = threading.Lock()
+_listener_registered = False
+
+# Where each command keeps its filter, for query-shape normalization
+_FILTER_FIELDS = {
+    'find': lambda c: c.get('filter'),
+    'count': lambda c: c.get('query'),
+    'distinct': lambda c: c.get('query'),
+    'findAndModify': lambda c: c.get('query'),
+    'update': lambda c: [u.get('q') for u in c.get('updates', [])],
+    'delete': lambda c: [d.get('q') for d in c.get('deletes', [])],
+    'aggregate': lambda c: [s for s in c.get('pipeline', []) if '$match' in s or '$group' in s],
+}
+
+
+def _shape(value):
+    """Replace literal values with '?' so queries differing only in values compare equal."""
+    if isinstance(value, dict):
+        return {k: _shape(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        shapes = [_shape(v) for v in value]
+        # {'$in': [1, 2, 3]} and {'$in': [4]} are the same shape
+        return shapes[:1] if all(s == '?' for s in shapes) else shapes
+    return '?'
+
+
+def query_shape(command_name, collection, command):
+    extract = _FILTER_FIELDS.get(command_name)
+    filt = extract(command) if extract else None
+    return f'{command_name} {collection} ' + json.dumps(_shape(filt), sort_keys=True, default=str)
+
+
+# --- Sampler ---
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f'{os.path.basename(code.co_filename)}:{code.co_name}'
+
+
+class StackSampler(threading.Thread):
+    def __init__(self, thread_id, interval):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join(timeout=1)
+
+
+# --- Mongo command capture ---
+
+class ProfileCommandListener(monitoring.CommandListener):
+    """Records commands only on threads that are currently being profiled."""
+
+    def started(self, event):
+        profile = getattr(_local, 'profile', None)
+        if profile is None:
+            return
+        name = event.command_name
+        collection = event.command.get('collection') if name == 'getMore' else event.command.get(name)
+        collection = collection if isinstance(collection, str) else event.database_name
+        profile['pending'][event.request_id] = {
+            'at_ms': round((time.perf_counter() - profile['started']) * 1000, 3),
+            'command': name,
+            'collection': collection,
+            'shape': query_shape(name, collection, event.command),
+        }
+
+    def _finish(self, event, ok):
+        profile = getattr(_local, 'profile', None)
+        if profile is None:
+            return
+        entry = profile['pending'].pop(event.request_id, None)
+        if entry is None:
+            return
+        entry['duration_ms'] = round(event.duration_micros / 1000, 3)
+        entry['ok'] = ok
+        profile['commands'].append(entry)
+
+    def succeeded(self, event):
+        self._finish(event, True)
+
+    def failed(self, event):
+        self._finish(event, False)
+
+
+def find_repeated_shapes(commands, threshold=PROFILE_REPEAT_THRESHOLD):
+    counts = Counter(c['shape'] for c in commands)
+    return [{'shape': shape, 'count': n} for shape, n in counts.most_common() if n >= threshold]
+
+
+# --- Request hooks ---
+
+def _should_profile():
+    header = request.headers.get('X-Profile')
+    if header:
+        if PROFILE_TOKEN:
+            return header == PROFILE_TOKEN
+        return session.get('role') == 'admin'
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _before_request():
+    _local.profile = None
+    if not _should_profile():
+        return
+    sampler = StackSampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000.0)
+    _local.profile = {
+        'started': time.perf_counter(),
+        'sampler': sampler,
+        'pending': {},
+        'commands': [],
+    }
+    sampler.start()
+
+
+def _finish(profile, status):
+    """Stop the sampler and write the report; returns its profile id, or None."""
+    profile['sampler'].stop()
+    duration_ms = (time.perf_counter() - profile['started']) * 1000
+    repeated = find_repeated_shapes(profile['commands'])
+    sampler = profile['sampler']
+    report = {
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint,
+        'status': status,
+        'started_at': datetime.utcnow().isoformat() + 'Z',
+        'duration_ms': round(duration_ms, 3),
+        'sample_interval_ms': PROFILE_INTERVAL_MS,
+        'samples': sampler.samples,
+        'stacks': dict(sampler.stacks.most_common()),
+        'mongo': {
+            'count': len(profile['commands']),
+            'total_ms': round(sum(c['duration_ms'] for c in profile['commands']), 3),
+            'commands': profile['commands'],
+            'repeated_shapes': repeated,
+        },
+    }
+    if repeated:
+        print(f"⚠️ Possible N+1 in {request.method} {request.path}: "
+              + '; '.join(f"{r['count']}x {r['shape']}" for r in repeated))
+    try:
+        return write_profile(report)
+    except OSError as e:
+        print(f'Failed to write profile: {e}')
+        return None
+
+
+def _after_request(response):
+    profile = getattr(_local, 'profile', None)
+    if profile is None:
+        return response
+    _local.profile = None
+    profile_id = _finish(profile, response.status_code)
+    if profile_id:
+        response.headers['X-Profile-Id'] = profile_id
+    return response
+
+
+def _teardown_request(exc=None):
+    # after_request is skipped when the view raises; stop the sampler thread and keep the profile
+    profile = getattr(_local, 'profile', None)
+    if profile is None:
+        return
+    _local.profile = None
+    _finish(profile, 500)
+
+
+def write_profile(report, directory=None):
+    """Write ``report`` to the profile directory, pruning the oldest files; returns the file name."""
+    directory = directory or PROFILE_DIR
+    endpoint = (report.get('endpoint') or 'unmatched').replace('.', '_')
+    name = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{endpoint}-{uuid.uuid4().hex[:8]}.json"
+    with _write_lock:
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, name), 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, default=str)
+        files = sorted(f for f in os.listdir(directory) if f.endswith('.json'))
+        for old in files[:max(0, len(files) - PROFILE_MAX_FILES)]:
+            try:
+                os.remove(os.path.join(directory, old))
+            except OSError:
+                pass
+    return name
+
+
+def fold(report):
+    """Render a profile's stacks in the folded format read by flamegraph.pl and speedscope."""
+    return '\n'.join(f'{stack} {n}' for stack, n in report['stacks'].items())
+
+
+def init_app(app):
+    global _listener_registered
+    if not _listener_registered:
+        db.add_event_listener(ProfileCommandListener())
+        _listener_registered = True
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+
+if __name__ == '__main__':
+    # python profiling.py profiles/<file>.json > out.folded
+    with open(sys.argv[1], encoding='utf-8') as f:
+        print(fold(json.load(f)))
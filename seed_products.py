@@ -1,12 +1,27 @@
+"""Upsert data/products.json (or --file) into the products collection.
+
+Products are written as unordered ``bulk_write`` batches of upserts keyed by
+``id``, one round trip per batch. The last completed batch is checkpointed in
+``_checkpoints`` so an interrupted seed of a large file resumes where it stopped.
+
+Usage:
+    python seed_products.py
+    python seed_products.py --file big_catalog.json --batch-size 2000
+    python seed_products.py --dry-run
+"""
+import argparse
+import hashlib
 import json
 import os
-from pymongo import MongoClient, ASCENDING
+from pymongo import MongoClient, ASCENDING, UpdateOne
 
+from batch_tools import Checkpoint, Progress
 
-def main():
+
+def _find_data_path(path=None):
     # Resolve data path relative to this file, with fallback to parent directory
     here = os.path.dirname(os.path.abspath(__file__))
-    candidates = [
+    candidates = [path] if path else [
         os.path.join(here, 'data', 'products.json'),
         os.path.join(os.path.dirname(here), 'data', 'products.json')
     ]
@@ -16,13 +31,26 @@ def main():
             f"Could not find data/products.json. Tried: {candidates}. "
             f"Ensure products.json exists under the project's data folder."
         )
+    return data_path
+
 
-    with open(data_path, 'r', encoding='utf-8') as f:
-        payload = json.load(f)
+def main():
+    parser = argparse.ArgumentParser(description='Seed products into MongoDB.')
+    parser.add_argument('--file', help='products JSON file (default: data/products.json)')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--dry-run', action='store_true', help='report inserts/updates without writing')
+    parser.add_argument('--restart', action='store_true', help='ignore a saved checkpoint')
+    args = parser.parse_args()
+
+    data_path = _find_data_path(args.file)
+    with open(data_path, 'rb') as f:
+        raw = f.read()
+    payload = json.loads(raw)
 
     products = payload.get('products', [])
     if not isinstance(products, list):
         raise ValueError('products.json format invalid: "products" should be a list')
+    products = [p for p in products if 'id' in p]
 
     mongo_uri = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
     db_name = os.getenv('MONGO_DB_NAME', 'phonestoredb')
@@ -31,21 +59,45 @@ def main():
     db = client.get_database(db_name)
     col = db['products']
 
+    batches = [products[i:i + args.batch_size] for i in range(0, len(products), args.batch_size)]
+
+    if args.dry_run:
+        existing = 0
+        for batch in batches:
+            existing += col.count_documents({'id': {'$in': [p['id'] for p in batch]}})
+        print(f'(dry run) {len(products)} products in {data_path}: '
+              f'{len(products) - existing} would be inserted, {existing} updated')
+        return
+
     # Ensure unique index on id
     try:
         col.create_index([('id', ASCENDING)], unique=True)
     except Exception:
         pass
 
-    # Upsert by id
-    upserts = 0
-    for p in products:
-        if 'id' not in p:
-            continue
-        col.update_one({'id': p['id']}, {'$set': p}, upsert=True)
-        upserts += 1
+    # The checkpoint is tied to the file contents: a changed file starts over
+    checkpoint = Checkpoint(db, 'seed_products:' + hashlib.sha256(raw).hexdigest()[:16])
+    if args.restart:
+        checkpoint.clear()
+    start = checkpoint.load() or 0
+    if start:
+        print(f'Resuming after batch {start} of {len(batches)}')
+
+    progress = Progress('products', len(products))
+    if start:
+        progress.add(sum(len(b) for b in batches[:start]))
+    inserted = updated = 0
+    for n, batch in enumerate(batches[start:], start=start + 1):
+        # Upsert by id
+        result = col.bulk_write([UpdateOne({'id': p['id']}, {'$set': p}, upsert=True) for p in batch], ordered=False)
+        inserted += result.upserted_count
+        updated += result.modified_count
+        checkpoint.save(n)
+        progress.add(len(batch))
+    checkpoint.clear()
 
-    print(f'Seeded {upserts} products into MongoDB database "{db_name}" collection "products"')
+    print(f'Seeded {len(products)} products into MongoDB database "{db_name}" collection "products" '
+          f'({inserted} inserted, {updated} modified, {progress.rate():,.0f}/s)')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,385 @@
+"""Precomputed "similar products" from numeric spec vectors.
+
+Each product becomes a vector of the numeric attributes in phone_specs
+(display size, RAM, storage, battery, price, release year). The values come
+from its ``specs`` string, and data/mobile_phones.csv fills the gaps for phones
+whose title contains a known model name. RAM, storage and price are
+log-scaled. Every attribute is then standardized per category, and a missing
+value counts as the category mean.
+
+A build compares the vectors of each category in blocks with NumPy, as
+squared Euclidean distances ``|a|^2 + |b|^2 - 2ab``, and keeps the
+``SIMILAR_K`` nearest products. It stores them in ``product_similar``, one
+document per product, with the neighbours' title, price and image
+denormalized in. Requests only look the product up in a dict loaded from
+that collection, so no distances are computed while serving.
+
+An incremental sync fingerprints every product. It recomputes the rows of
+products that changed, and patches them into, or out of, the other products'
+lists. The scaling parameters are kept from the last full build, so stored
+scores stay comparable. Run ``--full`` after large catalog changes; a sync
+does so by itself when more than ``SIMILAR_FULL_REBUILD_RATIO`` of the
+catalog changed.
+
+Usage:
+    python similarity.py            # incremental sync
+    python similarity.py --full     # rebuild every list
+    python similarity.py --compare  # time a full rebuild vs an incremental sync
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+import warnings
+from datetime import datetime, timezone
+
+import numpy as np
+from pymongo import ASCENDING, DeleteMany, ReplaceOne
+
+import catalog_snapshot
+import db
+from phone_specs import ATTRIBUTES, phone_models, product_attributes
+
+
+SIMILAR_K = int(os.getenv('SIMILAR_K', '10'))
+SIMILAR_REFRESH_SECONDS = float(os.getenv('SIMILAR_REFRESH_SECONDS', '300'))
+SIMILAR_DEBOUNCE_SECONDS = float(os.getenv('SIMILAR_DEBOUNCE_SECONDS', '5'))
+SIMILAR_FULL_REBUILD_RATIO = float(os.getenv('SIMILAR_FULL_REBUILD_RATIO', '0.25'))
+# Distance matrix cells per block (float32): bounds memory at ~16 MB per block
+BLOCK_CELLS = 4_000_000
+WRITE_BATCH = 1000
+
+LOG_SCALED = {'ram_gb', 'storage_gb', 'price'}
+META_ID = 'spec_vectors'
+
+similar_col = db.CollectionProxy('product_similar')
+meta_col = db.CollectionProxy('similarity_meta')
+products_col = db.CollectionProxy('products')
+
+PRODUCT_FIELDS = {'_id': 0, 'id': 1, 'title': 1, 'price': 1, 'category': 1, 'brand': 1,
+                  'image': 1, 'image_file_id': 1, 'specs': 1}
+
+
+def ensure_indexes(database):
+    database['product_similar'].create_index([('product_id', ASCENDING)], unique=True)
+
+
+# --- Features ---
+
+def raw_features(doc, models=()):
+    values = product_attributes(doc, models)
+    return [values.get(attr) for attr in ATTRIBUTES]
+
+
+def _transform(matrix):
+    """NaN-aware log scaling of the skewed columns."""
+    out = matrix.copy()
+    for i, attr in enumerate(ATTRIBUTES):
+        if attr in LOG_SCALED:
+            out[:, i] = np.log1p(np.clip(out[:, i], 0, None))
+    return out
+
+
+def fit_params(matrix):
+    """Per-column mean and std of a transformed matrix; columns with no spread get std 1."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN columns
+        mean = np.nanmean(matrix, axis=0) if len(matrix) else np.zeros(len(ATTRIBUTES))
+        std = np.nanstd(matrix, axis=0) if len(matrix) else np.ones(len(ATTRIBUTES))
+    mean = np.nan_to_num(mean)
+    std = np.where(np.isnan(std) | (std < 1e-9), 1.0, std)
+    return {'mean': mean.tolist(), 'std': std.tolist()}
+
+
+def standardize(matrix, params):
+    z = (matrix - np.asarray(params['mean'])) / np.asarray(params['std'])
+    return np.nan_to_num(z).astype(np.float32)  # missing -> category mean
+
+
+def _card(doc):
+    card = {'id': doc['id'], 'title': doc.get('title', ''), 'price': doc.get('price')}
+    if doc.get('image_file_id'):
+        card['image'] = f"/api/products/{doc['id']}/image"
+    elif doc.get('image'):
+        img = doc['image']
+        card['image'] = '/static' + img[1:] if isinstance(img, str) and img.startswith('./images/') else img
+    return card
+
+
+def _fingerprint(doc, raw):
+    payload = json.dumps([doc.get('category'), raw, _card(doc)], sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=12).hexdigest()
+
+
+# --- Nearest neighbours ---
+
+def nearest(vectors, rows, k=SIMILAR_K):
+    """For each index in ``rows``: (neighbour indices, distances), nearest first, self excluded.
+
+    Distances for ``rows`` against all vectors are computed block by block so
+    memory stays bounded on large categories.
+    """
+    n = len(vectors)
+    k = min(k, n - 1)
+    if k <= 0:
+        return {int(r): (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for r in rows}
+    sq = np.einsum('ij,ij->i', vectors, vectors)
+    rows = np.asarray(rows, dtype=np.int64)
+    block = max(1, BLOCK_CELLS // n)
+    out = {}
+    for start in range(0, len(rows), block):
+        idx = rows[start:start + block]
+        d2 = sq[idx, None] + sq[None, :] - 2.0 * (vectors[idx] @ vectors.T)
+        np.maximum(d2, 0, out=d2)
+        d2[np.arange(len(idx)), idx] = np.inf
+        part = np.argpartition(d2, k - 1, axis=1)[:, :k]
+        part_d = np.take_along_axis(d2, part, axis=1)
+        order = np.argsort(part_d, axis=1, kind='stable')
+        part = np.take_along_axis(part, order, axis=1)
+        part_d = np.sqrt(np.take_along_axis(part_d, order, axis=1))
+        for j, r in enumerate(idx):
+            out[int(r)] = (part[j], part_d[j])
+    return out
+
+
+def _score(distance):
+    return round(1.0 / (1.0 + float(distance)), 4)
+
+
+# --- Build / sync ---
+
+def _load_catalog():
+    models = phone_models()
+    by_category = {}
+    for doc in products_col.find({}, PRODUCT_FIELDS):
+        if 'id' not in doc:
+            continue
+        raw = raw_features(doc, models)
+        by_category.setdefault(doc.get('category') or '', []).append((doc, raw))
+    return by_category
+
+
+def _write(docs, deleted=()):
+    ops = [ReplaceOne({'product_id': d['product_id']}, d, upsert=True) for d in docs]
+    if deleted:
+        ops.append(DeleteMany({'product_id': {'$in': list(deleted)}}))
+    for i in range(0, len(ops), WRITE_BATCH):
+        similar_col.bulk_write(ops[i:i + WRITE_BATCH], ordered=False)
+
+
+def _entry(doc, raw, neighbours):
+    return {'product_id': doc['id'], 'category': doc.get('category') or '',
+            'fingerprint': _fingerprint(doc, raw), 'similar': neighbours,
+            'updated_at': datetime.now(timezone.utc)}
+
+
+def build(k=SIMILAR_K):
+    """Recompute every list from scratch and refit the scaling parameters."""
+    started = time.perf_counter()
+    catalog = _load_catalog()
+    params, entries = {}, []
+    for category, items in catalog.items():
+        raw = _transform(np.array([r for _, r in items], dtype=np.float64))
+        params[category] = fit_params(raw)
+        vectors = standardize(raw, params[category])
+        cards = [_card(doc) for doc, _ in items]
+        for row, (idx, dist) in nearest(vectors, range(len(items)), k).items():
+            doc, r = items[row]
+            entries.append(_entry(doc, r, [dict(cards[j], score=_score(d)) for j, d in zip(idx, dist)]))
+    seen = [e['product_id'] for e in entries]
+    _write(entries)
+    similar_col.delete_many({'product_id': {'$nin': seen}})
+    meta_col.replace_one({'_id': META_ID}, {'_id': META_ID, 'params': params, 'k': k,
+                                            'attributes': list(ATTRIBUTES), 'built_at': datetime.now(timezone.utc)},
+                         upsert=True)
+    return {'mode': 'full', 'products': len(entries), 'written': len(entries), 'removed': None,
+            'seconds': round(time.perf_counter() - started, 3)}
+
+
+def sync(full=False, k=SIMILAR_K):
+    """Bring ``product_similar`` in line with the catalog, touching only what changed."""
+    meta = None if full else meta_col.find_one({'_id': META_ID})
+    if not meta or meta.get('k') != k or meta.get('attributes') != list(ATTRIBUTES):
+        return build(k)
+    started = time.perf_counter()
+    catalog = _load_catalog()
+    if set(catalog) - set(meta['params']):
+        return build(k)  # a new category has no scaling parameters yet
+    stored = {d['product_id']: d for d in similar_col.find({}, {'_id': 0, 'product_id': 1, 'fingerprint': 1,
+                                                                 'similar': 1, 'category': 1})}
+    total = sum(len(items) for items in catalog.values())
+    present = {doc['id'] for items in catalog.values() for doc, _ in items}
+    deleted = set(stored) - present
+    changed = {doc['id'] for items in catalog.values() for doc, raw in items
+               if stored.get(doc['id'], {}).get('fingerprint') != _fingerprint(doc, raw)}
+    if total and (len(changed) + len(deleted)) / total > SIMILAR_FULL_REBUILD_RATIO:
+        return build(k)
+
+    entries = []
+    # Ids whose lists must drop entries: deleted products and products that moved category
+    gone = set(deleted) | {pid for pid in changed if pid in stored}
+    for category, items in catalog.items():
+        ids = [doc['id'] for doc, _ in items]
+        touched_here = [i for i, pid in enumerate(ids) if pid in changed]
+        referenced = {s['id'] for pid in ids for s in stored.get(pid, {}).get('similar', [])}
+        if not touched_here and not referenced & gone:
+            continue
+        raw = _transform(np.array([r for _, r in items], dtype=np.float64))
+        vectors = standardize(raw, meta['params'][category])
+        cards = [_card(doc) for doc, _ in items]
+        fresh = nearest(vectors, touched_here, k)
+        # Distances from every product to each changed one, to patch them into other lists
+        cols = np.asarray(touched_here, dtype=np.int64)
+        if len(cols):
+            sq = np.einsum('ij,ij->i', vectors, vectors)
+            to_changed = np.sqrt(np.maximum(sq[:, None] + sq[cols][None, :] - 2.0 * (vectors @ vectors[cols].T), 0))
+        recompute = []
+        for row, pid in enumerate(ids):
+            doc, r = items[row]
+            if row in fresh:
+                idx, dist = fresh[row]
+                entries.append(_entry(doc, r, [dict(cards[j], score=_score(d)) for j, d in zip(idx, dist)]))
+                continue
+            old = stored.get(pid, {}).get('similar', [])
+            kept = [s for s in old if s['id'] not in gone and s['id'] not in changed]
+            if len(kept) < len(old) and len(kept) < min(k, len(ids) - 1):
+                # A neighbour was deleted or moved: whatever was next in line is unknown here
+                recompute.append(row)
+                continue
+            candidates = kept + [dict(cards[c], score=_score(to_changed[row, n]))
+                                 for n, c in enumerate(touched_here) if c != row]
+            candidates.sort(key=lambda s: -s['score'])
+            merged = candidates[:k]
+            if merged != old:
+                entries.append(_entry(doc, r, merged))
+        for row, (idx, dist) in nearest(vectors, recompute, k).items():
+            doc, r = items[row]
+            entries.append(_entry(doc, r, [dict(cards[j], score=_score(d)) for j, d in zip(idx, dist)]))
+    _write(entries, deleted)
+    return {'mode': 'incremental', 'products': total, 'written': len(entries), 'removed': len(deleted),
+            'changed': len(changed), 'seconds': round(time.perf_counter() - started, 3)}
+
+
+# --- Serving ---
+
+_index = {}  # product id -> list of neighbour cards
+_loaded_at = None
+_ready = False
+_load_lock = threading.Lock()
+
+
+def load():
+    """Replace this process's lookup table with the stored lists."""
+    global _index, _loaded_at, _ready
+    _index = {d['product_id']: d['similar'] for d in similar_col.find({}, {'_id': 0, 'product_id': 1, 'similar': 1})}
+    _loaded_at = time.monotonic()
+    _ready = True
+
+
+def _first_load():
+    """Load on the request thread, under the catalog breaker's deadline.
+
+    A failure is remembered like a load, so requests don't each wait on a
+    dead server; the next attempt comes after SIMILAR_REFRESH_SECONDS.
+    """
+    global _loaded_at
+    _, degraded = catalog_snapshot.breaker.call(load, lambda: None)
+    if degraded:
+        _loaded_at = time.monotonic()
+
+
+def _reload_in_background():
+    if not _load_lock.acquire(blocking=False):
+        return
+
+    def run():
+        global _loaded_at
+        try:
+            load()
+        except Exception as e:
+            print(f'Similar products reload failed: {e}')
+            _loaded_at = time.monotonic()  # keep the old table; retry after the next interval
+        finally:
+            _load_lock.release()
+
+    threading.Thread(target=run, name='similar-reload', daemon=True).start()
+
+
+def is_ready():
+    """Whether a lookup table has been loaded at least once in this process."""
+    return _ready
+
+
+def similar(pid, limit=SIMILAR_K):
+    """Stored neighbours of ``pid`` (a dict lookup), or None if it has no entry.
+
+    While MongoDB is unreachable nothing is loaded; whatever table this
+    process already has keeps being served.
+    """
+    if not catalog_snapshot.breaker.is_open():
+        if _loaded_at is None:
+            with _load_lock:
+                if _loaded_at is None:
+                    _first_load()
+        elif time.monotonic() - _loaded_at > SIMILAR_REFRESH_SECONDS:
+            _reload_in_background()
+    found = _index.get(pid)
+    return None if found is None else found[:limit]
+
+
+# --- In-app hook ---
+
+_sync_lock = threading.Lock()
+_timer_lock = threading.Lock()
+_pending_timer = None
+
+
+def _run_scheduled_sync():
+    global _pending_timer
+    with _timer_lock:
+        _pending_timer = None
+    with _sync_lock:
+        try:
+            stats = sync()
+            load()
+            print(f"🔄 Similar products synced: {stats}")
+        except Exception as e:
+            print(f"Similar products sync failed: {e}")
+
+
+def schedule_sync(delay=SIMILAR_DEBOUNCE_SECONDS):
+    """Debounced background sync, called after admin product writes."""
+    global _pending_timer
+    with _timer_lock:
+        if _pending_timer is not None:
+            _pending_timer.cancel()
+        _pending_timer = threading.Timer(delay, _run_scheduled_sync)
+        _pending_timer.daemon = True
+        _pending_timer.start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the similar-products lists from spec vectors.')
+    parser.add_argument('--full', action='store_true', help='rebuild every list and refit the scaling')
+    parser.add_argument('--compare', action='store_true', help='run a full rebuild then an incremental sync and report both timings')
+    parser.add_argument('-k', type=int, default=SIMILAR_K, help='neighbours kept per product')
+    args = parser.parse_args()
+
+    if args.compare:
+        full_stats = sync(full=True, k=args.k)
+        incr_stats = sync(k=args.k)
+        print(f"Full rebuild:     {full_stats['products']} products in {full_stats['seconds']}s")
+        print(f"Incremental sync: {incr_stats.get('changed', 0)} changed, {incr_stats['written']} lists written "
+              f"in {incr_stats['seconds']}s")
+        if incr_stats['seconds']:
+            print(f"Speedup: {full_stats['seconds'] / incr_stats['seconds']:.1f}x")
+        return
+
+    stats = sync(full=args.full, k=args.k)
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+"""Columnar phone specs for range filters and side-by-side comparison.
+
+Rows are the phones in data/mobile_phones.csv plus catalog products in the
+``Mobile phone`` category. Their numeric attributes (see
+``phone_specs.ATTRIBUTES``) are parsed once, at build time, into one float32
+NumPy array per attribute, with NaN for unknown values. Brand and OS are
+stored as integer codes into small vocabularies.
+
+A filter such as ``ram_gb >= 8 and battery_mah >= 5000 and price <= 500`` is
+a handful of vectorized comparisons ANDed into one boolean mask, so its cost
+grows with the row count but not with the number of Python objects. A row
+with an unknown value never matches a range on that attribute. Sorting only
+orders the requested page (``argpartition``), not every match.
+
+A table is immutable once built. A rebuild every ``SPECS_REFRESH_SECONDS``
+swaps in a new one, so readers never see a half-built table.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+
+import catalog_snapshot
+import db
+from phone_specs import ATTRIBUTES, load_phones, match_phone, parse_specs, phone_models, product_attributes
+
+
+SPECS_REFRESH_SECONDS = float(os.getenv('SPECS_REFRESH_SECONDS', '300'))
+PHONE_CATEGORY = 'Mobile phone'
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+MAX_COMPARE = 6
+SOURCES = ('catalog', 'csv')
+
+# Which end of each attribute wins a comparison
+LOWER_IS_BETTER = {'price'}
+
+products_col = db.CollectionProxy('products')
+
+
+def encode(values):
+    """Integer codes plus vocabulary for a list of labels, matched case-insensitively."""
+    index, vocab, codes = {}, [], np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        value = (value or '').strip()
+        code = index.get(value.lower())
+        if code is None:
+            code = index[value.lower()] = len(vocab)
+            vocab.append(value)
+        codes[i] = code
+    return codes, vocab
+
+
+class SpecTable:
+    """Parallel arrays, one entry per phone.
+
+    ``refs`` holds the product id for catalog rows and the CSV row number for
+    CSV rows; together with the source it forms the row key (``p:12``,
+    ``csv:3``).
+    """
+
+    def __init__(self, names, brand_codes, brand_vocab, os_codes, os_vocab, source_codes, refs, columns):
+        self.names = names
+        self.brand_codes, self.brand_vocab = np.asarray(brand_codes, dtype=np.int32), list(brand_vocab)
+        self.os_codes, self.os_vocab = np.asarray(os_codes, dtype=np.int32), list(os_vocab)
+        self.source_codes = np.asarray(source_codes, dtype=np.int8)
+        self.refs = np.asarray(refs, dtype=np.int64)
+        self.columns = {attr: np.asarray(columns[attr], dtype=np.float32) for attr in ATTRIBUTES}
+        self.built_at = time.time()
+
+    def __len__(self):
+        return len(self.refs)
+
+    def nbytes(self):
+        arrays = [self.brand_codes, self.os_codes, self.source_codes, self.refs, *self.columns.values()]
+        return sum(a.nbytes for a in arrays)
+
+    def key(self, i):
+        return f"{'p' if self.source_codes[i] == 0 else 'csv'}:{self.refs[i]}"
+
+    def find(self, key):
+        """Row number for a key such as ``p:12`` or ``csv:3``, or None."""
+        prefix, _, ref = str(key).partition(':')
+        if prefix not in ('p', 'csv') or not ref.lstrip('-').isdigit():
+            return None
+        hits = np.flatnonzero((self.source_codes == (0 if prefix == 'p' else 1)) & (self.refs == int(ref)))
+        return int(hits[0]) if len(hits) else None
+
+    def row(self, i):
+        source = SOURCES[self.source_codes[i]]
+        out = {'key': self.key(i), 'name': self.names[i], 'brand': self.brand_vocab[self.brand_codes[i]],
+               'os': self.os_vocab[self.os_codes[i]] or None, 'source': source}
+        if source == 'catalog':
+            out['product_id'] = int(self.refs[i])
+        for attr in ATTRIBUTES:
+            value = float(self.columns[attr][i])
+            out[attr] = None if np.isnan(value) else round(value, 2)
+        return out
+
+    # --- Filtering ---
+
+    @staticmethod
+    def _allowed(vocab, wanted):
+        """Lookup table over the vocabulary; ``allowed[codes]`` is the row mask."""
+        wanted = set(wanted)
+        return np.array([v.lower() in wanted for v in vocab], dtype=bool)
+
+    def mask(self, ranges=None, brands=None, oses=None, source=None):
+        """Boolean row mask for ``{attr: (low, high)}`` ranges (inclusive; None = open) and exact matches."""
+        mask = np.ones(len(self.refs), dtype=bool)
+        for attr, (low, high) in (ranges or {}).items():
+            col = self.columns[attr]
+            if low is not None:
+                mask &= col >= low
+            if high is not None:
+                mask &= col <= high
+        if brands:
+            mask &= self._allowed(self.brand_vocab, brands)[self.brand_codes]
+        if oses:
+            mask &= self._allowed(self.os_vocab, oses)[self.os_codes]
+        if source:
+            mask &= self.source_codes == SOURCES.index(source)
+        return mask
+
+    def filter(self, ranges=None, brands=None, oses=None, source=None, sort=None, limit=DEFAULT_LIMIT, offset=0):
+        """Return ``(total matches, [row dicts])`` for one page of the matches."""
+        idx = np.flatnonzero(self.mask(ranges, brands, oses, source))
+        total = len(idx)
+        end = min(offset + limit, total)
+        if offset >= total:
+            return total, []
+        if sort:
+            attr = sort.lstrip('-')
+            values = self.columns[attr][idx]
+            values = np.where(np.isnan(values), np.inf, -values if sort.startswith('-') else values)
+            if end < total:
+                top = np.argpartition(values, end - 1)[:end]
+                order = top[np.argsort(values[top], kind='stable')]
+            else:
+                order = np.argsort(values, kind='stable')
+            idx = idx[order]
+        return total, [self.row(int(i)) for i in idx[offset:end]]
+
+    # --- Comparison ---
+
+    def compare(self, rows):
+        """Rows side by side, plus the key of the row that wins each attribute."""
+        rows = np.asarray(rows, dtype=np.int64)
+        best = {}
+        for attr in ATTRIBUTES:
+            values = self.columns[attr][rows]
+            known = ~np.isnan(values)
+            if known.sum() < 2 or np.nanmin(values) == np.nanmax(values):
+                continue  # nothing to choose between
+            pick = np.nanargmin(values) if attr in LOWER_IS_BETTER else np.nanargmax(values)
+            best[attr] = self.key(int(rows[pick]))
+        return [self.row(int(i)) for i in rows], best
+
+
+# --- Building ---
+
+def build(products):
+    """Table from CSV phones plus the phone products in ``products``."""
+    names, brands, oses, sources, refs = [], [], [], [], []
+    columns = {attr: [] for attr in ATTRIBUTES}
+
+    def add(name, brand, os_name, source, ref, values):
+        names.append(name)
+        brands.append(brand)
+        oses.append(os_name)
+        sources.append(SOURCES.index(source))
+        refs.append(ref)
+        for attr in ATTRIBUTES:
+            value = values.get(attr)
+            columns[attr].append(np.nan if value is None else value)
+
+    for i, phone in enumerate(load_phones()):
+        add(phone['name'], phone['brand'], phone['os'], 'csv', i, phone)
+
+    models = phone_models()
+    for doc in products:
+        if doc.get('category') != PHONE_CATEGORY or 'id' not in doc:
+            continue
+        phone = match_phone(doc.get('title', ''), models)
+        specs = parse_specs(doc.get('specs', ''))
+        title = doc.get('title', '')
+        brand = doc.get('brand') or (phone or {}).get('brand') or (title.split() or [''])[0]
+        os_name = specs.get('OS') or specs.get('os') or (phone or {}).get('os', '')
+        add(title, brand, os_name, 'catalog', doc['id'], product_attributes(doc, models))
+
+    brand_codes, brand_vocab = encode(brands)
+    os_codes, os_vocab = encode(oses)
+    return SpecTable(names, brand_codes, brand_vocab, os_codes, os_vocab, sources, refs, columns)
+
+
+def parse_query(args):
+    """Filter arguments from a request's query string; raises ValueError with a message."""
+    ranges = {}
+    for attr in ATTRIBUTES:
+        bounds = []
+        for suffix in ('_min', '_max'):
+            raw = args.get(attr + suffix)
+            try:
+                bounds.append(float(raw) if raw not in (None, '') else None)
+            except ValueError:
+                raise ValueError(f'{attr}{suffix} must be a number')
+        if bounds != [None, None]:
+            ranges[attr] = tuple(bounds)
+
+    def names(param):
+        return [v.strip().lower() for v in (args.get(param) or '').split(',') if v.strip()]
+
+    source = args.get('source') or None
+    if source and source not in SOURCES:
+        raise ValueError(f"source must be one of {', '.join(SOURCES)}")
+    sort = args.get('sort') or None
+    if sort and sort.lstrip('-') not in ATTRIBUTES:
+        raise ValueError(f"sort must be one of {', '.join(ATTRIBUTES)} (prefix - for descending)")
+    try:
+        limit = max(1, min(int(args.get('limit', DEFAULT_LIMIT)), MAX_LIMIT))
+        offset = max(0, int(args.get('offset', 0)))
+    except ValueError:
+        raise ValueError('limit and offset must be integers')
+    return {'ranges': ranges, 'brands': names('brand'), 'oses': names('os'), 'source': source,
+            'sort': sort, 'limit': limit, 'offset': offset}
+
+
+# --- Process-wide table ---
+
+table = None
+_refreshing = threading.Lock()
+
+
+def rebuild(products=None):
+    global table
+    if products is None:
+        products = products_col.find({'category': PHONE_CATEGORY},
+                                     {'_id': 0, 'id': 1, 'title': 1, 'brand': 1, 'category': 1, 'price': 1, 'specs': 1})
+    table = build(products)
+    return table
+
+
+def _refresh_in_background():
+    if not _refreshing.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            rebuild()
+        except Exception as e:
+            print(f'Spec table rebuild failed: {e}')
+            if table is not None:
+                table.built_at = time.time()  # keep serving the old table; retry after the next interval
+        finally:
+            _refreshing.release()
+
+    threading.Thread(target=run, name='spec-table-rebuild', daemon=True).start()
+
+
+def invalidate():
+    """Rebuild on the next request (after admin writes)."""
+    if table is not None:
+        table.built_at = 0
+
+
+def current():
+    """The table, built on first use and rebuilt in the background once stale.
+
+    The first build goes through the catalog breaker and falls back to the
+    CSV phones plus the catalog snapshot, so there is always a table and a
+    dead MongoDB costs at most one read deadline per SPECS_REFRESH_SECONDS.
+    Nothing is rebuilt while the breaker is open.
+    """
+    if table is None:
+        with _refreshing:
+            if table is None:
+                catalog_snapshot.breaker.call(rebuild, lambda: rebuild(catalog_snapshot.products() or []))
+    elif time.time() - table.built_at > SPECS_REFRESH_SECONDS and not catalog_snapshot.breaker.is_open():
+        _refresh_in_background()
+    return table
@@ -8,6 +8,7 @@ let currentFiltered = [];
 let selectedRowId = null;
 let isLoading = false;
 let eventsBound = false;
+let liveFeed = null;
 
 function renderProducts(rows) {
   const tbody = document.getElementById('productsTable');
@@ -80,6 +81,25 @@ async function load() {
   }
 }
 
+// After our own save/delete the change arrives over the live feed; only
+// refetch the whole catalog when the feed isn't connected
+function refreshAfterWrite() {
+  if (liveFeed && liveFeed.readyState === EventSource.OPEN) return Promise.resolve();
+  return load();
+}
+
+function startLiveFeed() {
+  if (typeof openProductFeed !== 'function') return;
+  liveFeed = openProductFeed({
+    onEvent: event => {
+      applyProductEvent(allProducts, event);
+      if (event.op === 'delete' && selectedRowId === event.id) selectedRowId = null;
+      applyFilters();
+    },
+    onReset: () => load(),
+  });
+}
+
 function setImagePreview(path) {
   const wrap = document.getElementById('imagePreview');
   const img = document.getElementById('imagePreviewImg');
@@ -171,11 +191,87 @@ function buildFormData(data) {
   return fd;
 }
 
+// Files above this go through the chunked upload API (uploads.py) instead of
+// one multipart request, which the server caps at 5 MB
+const DIRECT_UPLOAD_MAX_BYTES = 4 * 1024 * 1024;
+const UPLOAD_PARALLEL_PARTS = 3;
+
+async function sha256Hex(blob) {
+  const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+  return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+}
+
+async function uploadJson(res) {
+  const body = await res.json().catch(() => ({}));
+  if (!res.ok) throw new Error(body.message || `Upload failed (${res.status})`);
+  return body;
+}
+
+// Upload a file in parts, a few at a time. The session id is remembered per
+// file, so picking the same file again after a failure sends only the parts
+// the server is missing.
+async function uploadChunked(file, onProgress) {
+  const key = `upload:${file.name}:${file.size}:${file.lastModified}`;
+  let upload = null;
+  const savedId = localStorage.getItem(key);
+  if (savedId) {
+    const res = await fetch(`/api/admin/uploads/${savedId}`);
+    if (res.ok) upload = await res.json();
+  }
+  if (!upload) {
+    upload = await uploadJson(await fetch('/api/admin/uploads', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ filename: file.name, size: file.size, content_type: file.type })
+    }));
+    localStorage.setItem(key, upload.upload_id);
+  }
+
+  if (upload.state !== 'complete') {
+    const queue = [...upload.missing];
+    let done = upload.received.length;
+    const sendPart = async index => {
+      const part = file.slice(index * upload.part_size, Math.min(file.size, (index + 1) * upload.part_size));
+      const headers = { 'Content-Type': 'application/octet-stream', 'X-Part-Sha256': await sha256Hex(part) };
+      for (let attempt = 1; ; attempt++) {
+        try {
+          return await uploadJson(await fetch(`/api/admin/uploads/${upload.upload_id}/parts/${index}`, { method: 'PUT', headers, body: part }));
+        } catch (err) {
+          if (attempt >= 3) throw err;
+          await new Promise(resolve => setTimeout(resolve, attempt * 1000));
+        }
+      }
+    };
+    const worker = async () => {
+      while (queue.length) {
+        await sendPart(queue.shift());
+        done++;
+        if (onProgress) onProgress(done / upload.parts);
+      }
+    };
+    await Promise.all(Array.from({ length: Math.min(UPLOAD_PARALLEL_PARTS, queue.length) }, worker));
+    upload = await uploadJson(await fetch(`/api/admin/uploads/${upload.upload_id}/complete`, { method: 'POST' }));
+  }
+  localStorage.removeItem(key);
+  return upload;
+}
+
+// Large image: upload it first, then save the product as JSON pointing at it
+async function attachChunkedImage(data) {
+  const fileInput = document.getElementById('p_image_file');
+  const file = fileInput && fileInput.files && fileInput.files[0];
+  if (!file || file.size <= DIRECT_UPLOAD_MAX_BYTES) return false;
+  const upload = await uploadChunked(file, p => showNotification(`Uploading ${file.name}: ${Math.round(p * 100)}%`));
+  data.image_file_id = upload.file_id;
+  return true;
+}
+
 async function saveProduct(data) {
   const method = 'POST';
   let body; let headers = {};
+  const chunked = await attachChunkedImage(data);
   const fileInput = document.getElementById('p_image_file');
-  if (fileInput && fileInput.files && fileInput.files[0]) {
+  if (!chunked && fileInput && fileInput.files && fileInput.files[0]) {
     body = buildFormData(data);
   } else {
     headers['Content-Type'] = 'application/json';
@@ -187,8 +283,9 @@ async function saveProduct(data) {
 
 async function updateProduct(id, data) {
   let body; let headers = {};
+  const chunked = await attachChunkedImage(data);
   const fileInput = document.getElementById('p_image_file');
-  if (fileInput && fileInput.files && fileInput.files[0]) {
+  if (!chunked && fileInput && fileInput.files && fileInput.files[0]) {
     body = buildFormData(data);
   } else {
     headers['Content-Type'] = 'application/json';
@@ -248,28 +345,42 @@ function highlightSelected() {
 }
 
 function exportCsv() {
-  const rows = currentFiltered.length ? currentFiltered : allProducts;
-  if (!rows.length) return alert('No products to export');
-  // Export columns: ID, Title, Brand, Price, Stock, Category, Status
-  const header = ['ID','Title','Brand','Price','Stock','Category','Status'];
-  const body = rows.map(r => [
-    r.id,
-    String(r.title || '').replace(/"/g,'""'),
-    String(r.brand || '').replace(/"/g,'""'),
-    typeof r.price !== 'undefined' ? r.price : '',
-    typeof r.stock !== 'undefined' ? r.stock : '',
-    String(r.category || '').replace(/"/g,'""'),
-    String(r.status || '').replace(/"/g,'""')
-  ]);
-  const csv = [header.join(','), ...body.map(r => r.map(x => /[",\n]/.test(String(x)) ? `"${x}"` : x).join(','))].join('\n');
-  const blob = new Blob([csv], { type: 'text/csv;charset=utf-8;' });
+  // Streamed by the server straight from the database, so large catalogs don't
+  // have to be materialized in the browser first
   const a = document.createElement('a');
-  a.href = URL.createObjectURL(blob);
+  a.href = '/api/admin/products/export?format=csv';
   a.download = 'products.csv';
   document.body.appendChild(a);
   a.click();
   a.remove();
-  URL.revokeObjectURL(a.href);
+}
+
+async function importProducts(file) {
+  const btn = document.getElementById('importProducts');
+  if (btn) { btn.disabled = true; btn.textContent = 'Importing...'; }
+  try {
+    const body = new FormData();
+    body.append('file', file);
+    const res = await fetch('/api/admin/products/import', { method: 'POST', body });
+    const summary = await res.json();
+    if (!res.ok && !summary.received) {
+      alert(summary.message || 'Import failed');
+      return;
+    }
+    await load();
+    const msg = `Imported ${summary.valid} of ${summary.received} rows (${summary.inserted} new, ${summary.updated} updated)`;
+    showNotification(msg, summary.error_count ? 'error' : 'success');
+    if (summary.error_count) {
+      const lines = summary.errors.slice(0, 20).map(e => `Row ${e.row}${e.id != null ? ` (id ${e.id})` : ''}: ${e.message}`);
+      const more = summary.error_count > lines.length ? `\n...and ${summary.error_count - lines.length} more` : '';
+      alert(`${summary.error_count} rows were rejected:\n` + lines.join('\n') + more);
+    }
+  } catch (err) {
+    console.error(err);
+    alert('Import failed: ' + err.message);
+  } finally {
+    if (btn) { btn.disabled = false; btn.textContent = 'Import'; }
+  }
 }
 
 let pdfLibPromise = null;
@@ -393,6 +504,8 @@ function bindEvents() {
   const filter = document.getElementById('categoryFilter');
   const exportBtn = document.getElementById('exportCsv');
   const exportPdfBtn = document.getElementById('exportPdf');
+  const importBtn = document.getElementById('importProducts');
+  const importInput = document.getElementById('importFile');
   const fileInput = document.getElementById('p_image_file');
 
   form.addEventListener('submit', async (e) => {
@@ -419,10 +532,16 @@ function bindEvents() {
 
     // If product exists (update) else create
     const existing = allProducts.find(p => p.id === data.id);
-    const resp = existing ? await updateProduct(data.id, data) : await saveProduct(data);
+    let resp;
+    try {
+      resp = existing ? await updateProduct(data.id, data) : await saveProduct(data);
+    } catch (err) {
+      // A failed chunked upload; choosing the same file again resumes it
+      resp = { success: false, message: 'Image upload failed: ' + err.message };
+    }
 
     if (resp.success) {
-      await load();
+      await refreshAfterWrite();
       // fully reset the form including preview and hidden inputs
       clearProductForm();
       selectedRowId = null;
@@ -465,7 +584,7 @@ function bindEvents() {
         const resp = await deleteProduct(id);
         if (resp.success) {
           if (selectedRowId === id) selectedRowId = null;
-          await load();
+          await refreshAfterWrite();
           // clear form if deleted product was being edited
           clearProductForm();
           showNotification('Product deleted successfully!', 'success');
@@ -480,6 +599,12 @@ function bindEvents() {
   filter?.addEventListener('change', () => applyFilters());
   exportBtn?.addEventListener('click', exportCsv);
   exportPdfBtn?.addEventListener('click', exportPdf);
+  importBtn?.addEventListener('click', () => importInput?.click());
+  importInput?.addEventListener('change', () => {
+    const file = importInput.files && importInput.files[0];
+    if (file) importProducts(file);
+    importInput.value = '';
+  });
   if (fileInput) {
     fileInput.addEventListener('change', () => {
       const file = fileInput.files && fileInput.files[0];
@@ -502,4 +627,5 @@ function bindEvents() {
 document.addEventListener('DOMContentLoaded', async () => {
   await load();
   bindEvents();
+  startLiveFeed();
 });
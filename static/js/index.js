@@ -258,11 +258,11 @@ document.addEventListener('DOMContentLoaded', function() {
         body: JSON.stringify({ message: text }),
       });
       
-      if (!response.ok) {
+      // 429/503/504 still carry a friendly message in the JSON body
+      const data = await response.json().catch(() => ({}));
+      if (!response.ok && !data.response) {
         throw new Error('Network response was not ok');
       }
-      
-      const data = await response.json();
       return data.response;
     } catch (error) {
       console.error('Error sending message to API:', error);
@@ -429,11 +429,11 @@ document.addEventListener('DOMContentLoaded', function() {
         body: JSON.stringify({ message: text }),
       });
       
-      if (!response.ok) {
+      // 429/503/504 still carry a friendly message in the JSON body
+      const data = await response.json().catch(() => ({}));
+      if (!response.ok && !data.response) {
         throw new Error('Network response was not ok');
       }
-      
-      const data = await response.json();
       return data.response;
     } catch (error) {
       console.error('Error sending message to API:', error);
@@ -0,0 +1,41 @@
+// Live product updates from /api/products/stream (Server-Sent Events).
+// onEvent({op: 'upsert'|'delete', id, product}) is called per change; onReset()
+// when the server can't replay what was missed and the catalog should be
+// reloaded once. If the stream is refused (e.g. too many live connections) the
+// feed falls back to calling onReset() every `pollMs`.
+function openProductFeed({ onEvent, onReset, pollMs = 60000 }) {
+  if (!window.EventSource) {
+    setInterval(onReset, pollMs);
+    return null;
+  }
+  // On reconnect the browser sends Last-Event-ID and the server replays what was missed
+  const source = new EventSource('/api/products/stream');
+  source.addEventListener('product', e => {
+    try {
+      onEvent(JSON.parse(e.data));
+    } catch (err) {
+      console.log('Bad product event', err);
+    }
+  });
+  source.addEventListener('reset', () => onReset());
+  source.addEventListener('error', () => {
+    // CLOSED means the server answered with an error status; EventSource won't retry
+    if (source.readyState === EventSource.CLOSED) {
+      setInterval(onReset, pollMs);
+    }
+  });
+  return source;
+}
+
+// Apply one feed event to an array of products in place; returns the array
+function applyProductEvent(products, event) {
+  const idx = products.findIndex(p => p.id === event.id);
+  if (event.op === 'delete') {
+    if (idx >= 0) products.splice(idx, 1);
+  } else if (idx >= 0) {
+    products[idx] = event.product;
+  } else {
+    products.push(event.product);
+  }
+  return products;
+}
@@ -28,9 +28,63 @@ function normalizeImage(path) {
   return path;
 }
 
+// Catalog as last loaded, kept current by the live feed; the category filter
+// works from this copy instead of refetching
+let catalog = [];
+let activeCategory = "All Products";
+
+const renderCatalog = () => {
+  displayProductItems(
+    activeCategory === "All Products" ? catalog : catalog.filter(product => product.category === activeCategory)
+  );
+};
+
+const reloadCatalog = async () => {
+  catalog = await getProducts();
+  renderCatalog();
+};
+
+// The server renders the first cards and inlines the catalog as JSON
+// (#catalog-state); hydrating from it avoids a round trip before products show
+const readCatalogState = () => {
+  const el = document.getElementById("catalog-state");
+  if (!el) return null;
+  try {
+    const state = JSON.parse(el.textContent);
+    return Array.isArray(state.products) ? state : null;
+  } catch (err) {
+    console.log("Bad inline catalog state", err);
+    return null;
+  }
+};
+
+const hydrateCatalog = state => {
+  catalog = state.products;
+  // Keep the server-rendered cards and only add the ones after them
+  const rendered = categoryCenter ? categoryCenter.querySelectorAll(".category__products").length : 0;
+  if (categoryCenter && catalog.length > rendered) {
+    categoryCenter.insertAdjacentHTML("beforeend", catalog.slice(rendered).map(productCard).join(""));
+  }
+};
+
 window.addEventListener("DOMContentLoaded", async function () {
-  const products = await getProducts();
-  displayProductItems(products);
+  const state = readCatalogState();
+  if (state) {
+    hydrateCatalog(state);
+    // Only part of a large catalog is inlined; load the rest without blocking
+    if (!state.complete) reloadCatalog();
+  } else {
+    await reloadCatalog();
+  }
+  if (categoryCenter && typeof openProductFeed === "function") {
+    openProductFeed({
+      onEvent: event => {
+        applyProductEvent(catalog, event);
+        renderCatalog();
+      },
+      onReset: reloadCatalog,
+    });
+  }
 });
 
 // Ensure any statically-rendered product cards in templates that have a
@@ -73,9 +127,7 @@ function wireStaticProductLinks() {
 
 window.addEventListener('DOMContentLoaded', wireStaticProductLinks);
 
-const displayProductItems = items => {
-  let displayProduct = items.map(
-    product => ` 
+const productCard = product => ` 
                   <div class="product category__products" data-product-id="${product.id}">
                     <div class="product__header">
                       <a href="/product/${product.id}">
@@ -130,12 +182,11 @@ const displayProductItems = items => {
                       </li>
                   </ul>
                   </div>
-                  `
-  );
+                  `;
 
-  displayProduct = displayProduct.join("");
+const displayProductItems = items => {
   if (categoryCenter) {
-    categoryCenter.innerHTML = displayProduct;
+    categoryCenter.innerHTML = items.map(productCard).join("");
   }
 };
 
@@ -154,7 +205,6 @@ if (categoryContainer) {
     if (!target) return;
 
     const id = target.dataset.id;
-    const products = await getProducts();
 
     if (id) {
       // remove active from buttons
@@ -163,18 +213,8 @@ if (categoryContainer) {
       });
       target.classList.add("active");
 
-      // Load Products
-      let menuCategory = products.filter(product => {
-        if (product.category === id) {
-          return product;
-        }
-      });
-
-      if (id === "All Products") {
-        displayProductItems(products);
-      } else {
-        displayProductItems(menuCategory);
-      }
+      activeCategory = id;
+      renderCatalog();
     }
   });
 }
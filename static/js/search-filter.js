@@ -10,33 +10,53 @@ const dropdownProducts = document.getElementById("dropdownProducts");
 const sortPrice = document.getElementById("sortPrice");
 const loadMoreBtn = document.getElementById("loadMoreBtn");
 
-const products = [
-  {name: "📱 Apple iPhone 17 Pro", brand: "Apple iPhone 17 Pro", price: 2700},
-  {name: "📱 Apple iPhone 11", brand: "Apple iPhone 11", price: 760},
-  {name: "📱 Apple iPhone 11", brand: "Apple iPhone 11", price: 850},
-  {name: "📱 Apple iPhone 11", brand: "Apple iPhone 11", price: 290},
-  {name: "📱 Apple iPhone 11", brand: "Apple iPhone 11", price: 800},
-  {name: "📱 Apple iPhone 11", brand: "Apple iPhone 11", price: 300},
-  {name: "📱 Apple iPhone 11 Pro", brand: "Apple iPhone 11 Pro", price: 385},
-  {name: "📱 Samsung Galaxy", brand: "Samsung Galaxy", price: 400},
-  {name: "📱 Samsung Galaxy", brand: "Samsung Galaxy", price: 550},
-  {name: "📱 Samsung Galaxy", brand: "Samsung Galaxy", price: 270},
-  {name: "📱 Samsung Galaxy", brand: "Samsung Galaxy", price: 500},
-  {name: "📱 Samsung Galaxy", brand: "Samsung Galaxy", price: 450},
-  {name: "📱 Samsung Galaxy", brand: "Samsung Galaxy", price: 460},
-  {name: "🎧 Sony WH-CH510", brand: "Sony WH-CH510", price: 265},
-  {name: "🎧 Sony WH-CH510", brand: "Sony WH-CH510", price: 250},
-  {name: "🎧 Sony WH-CH510", brand: "Sony WH-CH510", price: 365},
-  {name: "🎧 Sony WH-CH510", brand: "Sony WH-CH510", price: 475},
-  {name: "🎧 Sony WH-CH510", brand: "Sony WH-CH510", price: 850},
-  {name: "🎧 Sony WH-CH510", brand: "Sony WH-CH510", price: 360},
-  {name: "🎧 Sony WH-CH510", brand: "Sony WH-CH510", price: 320},
-  {name: "🎧 Sony WH-CH510", brand: "Sony WH-CH510", price: 305},
-  {name: "🎧 Sony WH-CH510", brand: "Sony WH-CH510", price: 630},
-  {name: "🎧 Sony WH-CH510", brand: "Sony WH-CH510", price: 250},
-  {name: "🎧 Sony WH-CH510", brand: "Sony WH-CH510", price: 700},
-  {name: "🎧 Sony WH-CH510", brand: "Sony WH-CH510", price: 600}
-];
+// Results of the last /api/suggest lookup, in the shape the filters below expect
+let products = [];
+
+// Typeahead: wait for a pause in typing, share one request per distinct query
+// (in flight or recently answered) and drop responses that are no longer current
+const SUGGEST_DEBOUNCE_MS = 120;
+const SUGGEST_LIMIT = 50;
+const suggestCache = new Map();
+let suggestTimer = null;
+let suggestSeq = 0;
+
+function fetchSuggestions(query) {
+  const key = query.trim().toLowerCase();
+  if (!suggestCache.has(key)) {
+    const request = fetch(`/api/suggest?q=${encodeURIComponent(key)}&limit=${SUGGEST_LIMIT}`)
+      .then(res => res.ok ? res.json() : { suggestions: [] })
+      .then(data => (data.suggestions || []).map(p => ({
+        id: p.id,
+        name: p.title,
+        brand: p.title,
+        price: p.price
+      })))
+      .catch(err => {
+        suggestCache.delete(key);
+        console.log('Suggestions failed', err);
+        return [];
+      });
+    suggestCache.set(key, request);
+    if (suggestCache.size > 200) suggestCache.delete(suggestCache.keys().next().value);
+  }
+  return suggestCache.get(key);
+}
+
+function scheduleSuggest() {
+  clearTimeout(suggestTimer);
+  suggestTimer = setTimeout(async () => {
+    const seq = ++suggestSeq;
+    const results = await fetchSuggestions(searchBox.value);
+    if (seq !== suggestSeq) return; // a newer keystroke has taken over
+    products = results;
+    updateFilters();
+  }, SUGGEST_DEBOUNCE_MS);
+}
+
+function escapeRegExp(text) {
+  return text.replace(/[.*+?^${}()|[\]\\]/g, "\\$&");
+}
 
 let productsPerBatch = 6;
 let currentIndex = 0;
@@ -59,7 +79,9 @@ function displayProducts(reset = false){
     const div = document.createElement("div");
     div.className = "product";
     div.style.animationDelay = `${i*0.05}s`;
-    div.innerHTML = `<span>${p.name.replace(new RegExp(searchBox.value,"gi"), match=>`<mark>${match}</mark>`)}</span><span>$${p.price}</span>`;
+    const term = searchBox.value.trim();
+    const name = term ? p.name.replace(new RegExp(escapeRegExp(term),"gi"), match=>`<mark>${match}</mark>`) : p.name;
+    div.innerHTML = `<span><a href="/product/${p.id}">${name}</a></span><span>$${p.price}</span>`;
     dropdownProducts.appendChild(div);
   });
 
@@ -73,19 +95,18 @@ function displayProducts(reset = false){
 }
 
 function updateFilters(){
-  let searchText = searchBox.value.toLowerCase();
   let selectedVersion = iphoneVersion.value.toLowerCase();
   let selectedBrands = Array.from(brandFilters).filter(cb=>cb.checked).map(cb=>cb.value.toLowerCase());
   let maxPrice = parseInt(priceRange.value);
 
   priceValue.textContent = "$"+maxPrice;
 
+  // The text match itself comes from the server; only the dropdown filters apply here
   filteredProducts = products.filter(p=>{
-    let matchSearch = p.name.toLowerCase().includes(searchText);
     let matchVersion = selectedVersion ? p.brand.toLowerCase().includes(selectedVersion) : true;
     let matchBrand = selectedBrands.length ? selectedBrands.includes(p.brand.toLowerCase()) : true;
     let matchPrice = p.price <= maxPrice;
-    return matchSearch && matchVersion && matchBrand && matchPrice;
+    return matchVersion && matchBrand && matchPrice;
   });
 
   if(sortPrice.value==="asc") filteredProducts.sort((a,b)=>a.price-b.price);
@@ -96,7 +117,7 @@ function updateFilters(){
 
 loadMoreBtn.addEventListener("click", ()=>displayProducts());
 
-searchBox.addEventListener("input", updateFilters);
+searchBox.addEventListener("input", scheduleSuggest);
 iphoneVersion.addEventListener("change", updateFilters);
 brandFilters.forEach(cb=>cb.addEventListener("change", updateFilters));
 priceRange.addEventListener("input", updateFilters);
@@ -107,7 +128,7 @@ clearFiltersBtn.addEventListener("click", ()=>{
   brandFilters.forEach(cb=>cb.checked=false);
   priceRange.value=3000;
   sortPrice.value="none";
-  updateFilters();
+  scheduleSuggest();
 });
 
-updateFilters();
\ No newline at end of file
+scheduleSuggest();
\ No newline at end of file
@@ -0,0 +1,229 @@
+"""In-memory prefix index for search-box suggestions.
+
+Every word position in a product's title, brand and category becomes one key,
+e.g. "apple iphone 15 pro", "iphone 15 pro", "15 pro" and "pro" for the
+title "Apple iPhone 15 Pro". The keys live in one sorted list. A lookup is a
+``bisect`` to the first key at or after the query, then a forward scan while
+keys still start with it, so it costs O(log n + matches) and typically takes
+a few microseconds.
+
+Products are ranked by a popularity score (see ``set_scores``), then by
+which field matched (title before brand before category), then by title.
+Writes through the admin API update the index in place. Changes made by
+other workers or scripts are picked up by a full rebuild every
+``SUGGEST_REFRESH_SECONDS``.
+"""
+import bisect
+import os
+import threading
+import time
+import unicodedata
+
+import catalog_snapshot
+import db
+
+
+SUGGEST_REFRESH_SECONDS = float(os.getenv('SUGGEST_REFRESH_SECONDS', '60'))
+SUGGEST_MAX_SCAN = 2000
+MAX_LIMIT = 50
+
+FIELDS = ('title', 'brand', 'category')  # in rank order
+_FIELD_RANK = {f: i for i, f in enumerate(FIELDS)}
+
+products_col = db.CollectionProxy('products')
+cart_col = db.CollectionProxy('cart')
+
+
+def normalize(text):
+    """Lowercase, strip accents and collapse whitespace."""
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(text.lower().split())
+
+
+def _keys(doc):
+    for field in FIELDS:
+        value = doc.get(field)
+        if not value:
+            continue
+        words = normalize(value).split(' ')
+        for i in range(len(words)):
+            yield ' '.join(words[i:]), field
+
+
+class SuggestIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = []      # sorted (key, field rank, pid)
+        self._docs = {}      # pid -> public fields
+        self._entries = {}   # pid -> list of its entries in _keys
+        self._scores = {}
+        self._top = None     # cached ranking for the empty query
+        self.built_at = None
+
+    # --- Building ---
+
+    @staticmethod
+    def _public(doc):
+        out = {'id': doc['id'], 'title': doc.get('title', ''), 'price': doc.get('price'),
+               'category': doc.get('category', '')}
+        if doc.get('brand'):
+            out['brand'] = doc['brand']
+        if doc.get('image_file_id'):
+            out['image'] = f"/api/products/{doc['id']}/image"
+        elif doc.get('image'):
+            img = doc['image']
+            out['image'] = '/static' + img[1:] if img.startswith('./images/') else img
+        return out
+
+    def _entries_for(self, doc):
+        return sorted({(key, _FIELD_RANK[field], doc['id']) for key, field in _keys(doc)})
+
+    def build(self, docs):
+        keys, entries, public = [], {}, {}
+        for doc in docs:
+            if 'id' not in doc:
+                continue
+            own = self._entries_for(doc)
+            entries[doc['id']] = own
+            public[doc['id']] = self._public(doc)
+            keys.extend(own)
+        keys.sort()
+        with self._lock:
+            self._keys, self._entries, self._docs = keys, entries, public
+            self._top = None
+            self.built_at = time.time()
+
+    def upsert(self, doc):
+        if 'id' not in doc:
+            return
+        own = self._entries_for(doc)
+        with self._lock:
+            self._remove_locked(doc['id'])
+            for entry in own:
+                bisect.insort(self._keys, entry)
+            self._entries[doc['id']] = own
+            self._docs[doc['id']] = self._public(doc)
+            self._top = None
+
+    def remove(self, pid):
+        with self._lock:
+            self._remove_locked(pid)
+
+    def _remove_locked(self, pid):
+        for entry in self._entries.pop(pid, []):
+            i = bisect.bisect_left(self._keys, entry)
+            if i < len(self._keys) and self._keys[i] == entry:
+                del self._keys[i]
+        self._docs.pop(pid, None)
+        self._top = None
+
+    def set_scores(self, scores):
+        """Replace the popularity scores, ``{pid: number}``; higher ranks first."""
+        self._scores = dict(scores)
+        self._top = None
+
+    # --- Lookup ---
+
+    def suggest(self, query, limit=8):
+        q = normalize(query)
+        scores = self._scores
+        with self._lock:
+            if not q:
+                if self._top is None:
+                    self._top = sorted(self._docs, key=lambda pid: (-scores.get(pid, 0), self._docs[pid]['title']))[:MAX_LIMIT]
+                return [self._docs[pid] for pid in self._top[:limit]]
+            best = {}  # pid -> best field rank
+            keys = self._keys
+            i = bisect.bisect_left(keys, (q,))
+            scanned = 0
+            while i < len(keys) and scanned < SUGGEST_MAX_SCAN:
+                key, rank, pid = keys[i]
+                if not key.startswith(q):
+                    break
+                if rank < best.get(pid, len(FIELDS)):
+                    best[pid] = rank
+                i += 1
+                scanned += 1
+            ranked = sorted(best, key=lambda pid: (-scores.get(pid, 0), best[pid], self._docs[pid]['title']))
+            return [dict(self._docs[pid], match=FIELDS[best[pid]]) for pid in ranked[:limit]]
+
+    def __len__(self):
+        return len(self._docs)
+
+
+index = SuggestIndex()
+
+
+def cart_counts():
+    """Cart lines per product: a popularity signal available without extra tracking."""
+    return {row['_id']: row['n'] for row in cart_col.aggregate([
+        {'$group': {'_id': '$product_id', 'n': {'$sum': 1}}},
+    ])}
+
+
+# Swapped out by later popularity sources; called on every full rebuild
+score_source = cart_counts
+
+
+def rebuild(docs=None, scores=True):
+    if docs is None:
+        docs = products_col.find({}, {'_id': 0, 'id': 1, 'title': 1, 'brand': 1, 'category': 1,
+                                      'price': 1, 'image': 1, 'image_file_id': 1})
+    index.build(docs)
+    if not scores:
+        return
+    try:
+        index.set_scores(score_source())
+    except Exception as e:
+        print(f'Suggest popularity scores unavailable: {e}')
+
+
+def _rebuild_from_snapshot():
+    """Index the local catalog snapshot (no scores; they need MongoDB).
+
+    With no snapshot either, the index stays empty but counts as built, so
+    the next attempt waits SUGGEST_REFRESH_SECONDS.
+    """
+    rebuild(catalog_snapshot.products() or [], scores=False)
+
+
+_refreshing = threading.Lock()
+
+
+def _refresh_in_background():
+    if not _refreshing.acquire(blocking=False):
+        return  # a rebuild is already running
+
+    def run():
+        try:
+            rebuild()
+        except Exception as e:
+            print(f'Suggest index rebuild failed: {e}')
+            index.built_at = time.time()  # keep serving the old index; retry after the next interval
+        finally:
+            _refreshing.release()
+
+    threading.Thread(target=run, name='suggest-rebuild', daemon=True).start()
+
+
+def invalidate():
+    """Schedule a full rebuild on the next lookup (e.g. after a bulk import)."""
+    if index.built_at is not None:
+        index.built_at = 0
+
+
+def ensure_fresh():
+    """Build the index on first use; afterwards rebuild stale indexes in the background.
+
+    The first build goes through the catalog breaker and falls back to the
+    snapshot, so a request never waits on MongoDB more than once per
+    refresh interval. Nothing is rebuilt while the breaker is open.
+    """
+    built = index.built_at
+    if built is None:
+        with _refreshing:
+            if index.built_at is None:
+                catalog_snapshot.breaker.call(rebuild, _rebuild_from_snapshot)
+    elif time.time() - built > SUGGEST_REFRESH_SECONDS and not catalog_snapshot.breaker.is_open():
+        _refresh_in_background()
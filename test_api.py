@@ -1,3 +1,8 @@
+import os
+
+# Keep the app under test from writing the catalog snapshot
+os.environ.setdefault('CATALOG_SNAPSHOT_SECONDS', '0')
+
 from app import app
 
 client = app.test_client()
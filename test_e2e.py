@@ -1,7 +1,15 @@
-from app import app, mongo_db
+import os
+
+# Keep the app under test from writing the catalog snapshot
+os.environ.setdefault('CATALOG_SNAPSHOT_SECONDS', '0')
+
+from app import app
+from db import get_db
 from bson.objectid import ObjectId
 import json
 
+mongo_db = get_db()
+
 # Use Flask test client
 app.testing = True
 client = app.test_client()
@@ -0,0 +1,324 @@
+"""Resumable chunked uploads of product media into GridFS.
+
+An upload is a session in ``upload_sessions``:
+
+1. ``create`` fixes the file size, the part size and (optionally) the
+   whole-file SHA-256, and reserves a GridFS file id.
+2. ``write_part`` streams one part of the request body straight into
+   ``fs.chunks``, one GridFS chunk (255 KiB) at a time, so memory use does not
+   depend on the part or file size. Parts are addressed by index and can
+   arrive in any order, in parallel, and more than once (a repeated part
+   overwrites itself). A part may carry its own SHA-256; a mismatch discards
+   it.
+3. ``complete`` checks that every part arrived, re-reads the chunks in order
+   to compute the SHA-256, and only then inserts the ``fs.files`` document.
+   Until that point the file is invisible to ``fs.get``.
+
+The part size is a multiple of the GridFS chunk size, so part ``i`` always
+maps to the same chunk numbers and the result is an ordinary GridFS file.
+A client that was interrupted asks ``status`` for the missing parts and sends
+only those. Sessions left open longer than ``UPLOAD_SESSION_HOURS`` are
+removed together with their chunks by ``cleanup``.
+"""
+import argparse
+import hashlib
+import math
+import mimetypes
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from bson import Binary, ObjectId
+from gridfs import DEFAULT_CHUNK_SIZE
+from pymongo import ASCENDING, ReturnDocument
+
+import db
+
+
+UPLOAD_PART_BYTES = int(os.getenv('UPLOAD_PART_BYTES', str(4 * 1024 * 1024)))
+UPLOAD_MAX_BYTES = int(os.getenv('UPLOAD_MAX_BYTES', str(2 * 1024 * 1024 * 1024)))
+UPLOAD_SESSION_HOURS = float(os.getenv('UPLOAD_SESSION_HOURS', '24'))
+UPLOAD_CLEANUP_SECONDS = float(os.getenv('UPLOAD_CLEANUP_SECONDS', '600'))
+
+# Parts are whole GridFS chunks, so each part owns a fixed range of chunk numbers
+GRIDFS_CHUNK = DEFAULT_CHUNK_SIZE
+PART_SIZE = max(1, UPLOAD_PART_BYTES // GRIDFS_CHUNK) * GRIDFS_CHUNK
+CHUNKS_PER_PART = PART_SIZE // GRIDFS_CHUNK
+
+# A session stuck in "completing" this long (worker died mid-check) can be completed again
+COMPLETE_TIMEOUT_SECONDS = 300
+
+ALLOWED_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.mp4', '.webm', '.mov'}
+
+sessions_col = db.CollectionProxy('upload_sessions')
+chunks_col = db.CollectionProxy('fs.chunks')
+files_col = db.CollectionProxy('fs.files')
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def ensure_indexes(database):
+    # GridFS only creates this index on its own first write; parts are upserted by it
+    database['fs.chunks'].create_index([('files_id', ASCENDING), ('n', ASCENDING)], unique=True)
+    database['upload_sessions'].create_index([('state', ASCENDING), ('expires_at', ASCENDING)])
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _is_sha256(value):
+    return isinstance(value, str) and len(value) == 64 and all(c in '0123456789abcdef' for c in value)
+
+
+def public(session):
+    """The session as returned by the API."""
+    parts = session['parts']
+    received = sorted(set(session.get('received', [])))
+    out = {
+        'upload_id': session['_id'],
+        'filename': session['filename'],
+        'content_type': session['content_type'],
+        'size': session['length'],
+        'part_size': session['part_size'],
+        'parts': parts,
+        'received': received,
+        'missing': sorted(set(range(parts)) - set(received)),
+        'state': session['state'],
+        'expires_at': session['expires_at'].isoformat(),
+    }
+    if session['state'] == 'complete':
+        out['file_id'] = str(session['file_id'])
+        out['sha256'] = session['sha256']
+    return out
+
+
+# --- Sessions ---
+
+def create(filename, size, sha256=None, content_type=None, owner=None):
+    """Start an upload; returns the new session document."""
+    filename = os.path.basename((filename or '').strip())
+    if not filename:
+        raise UploadError('filename is required')
+    if os.path.splitext(filename.lower())[1] not in ALLOWED_EXTENSIONS:
+        raise UploadError('Unsupported file type')
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError('size must be an integer')
+    if size <= 0 or size > UPLOAD_MAX_BYTES:
+        raise UploadError(f'size must be between 1 and {UPLOAD_MAX_BYTES} bytes')
+    if sha256 is not None:
+        sha256 = str(sha256).lower()
+        if not _is_sha256(sha256):
+            raise UploadError('sha256 must be 64 hex characters')
+
+    _maybe_cleanup()
+    now = _now()
+    session = {
+        '_id': uuid.uuid4().hex,
+        'file_id': ObjectId(),
+        'filename': filename,
+        'content_type': content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+        'length': size,
+        'part_size': PART_SIZE,
+        'parts': math.ceil(size / PART_SIZE),
+        'expected_sha256': sha256,
+        'sha256': None,
+        'received': [],
+        'state': 'open',
+        'owner': owner,
+        'created_at': now,
+        'updated_at': now,
+        'expires_at': now + timedelta(hours=UPLOAD_SESSION_HOURS),
+    }
+    sessions_col.insert_one(session)
+    return session
+
+
+def get(upload_id):
+    session = sessions_col.find_one({'_id': upload_id})
+    if session is None:
+        raise UploadError('Upload not found', 404)
+    for field in ('created_at', 'updated_at', 'expires_at'):
+        if session[field].tzinfo is None:
+            session[field] = session[field].replace(tzinfo=timezone.utc)
+    return session
+
+
+def part_length(session, index):
+    return min(session['part_size'], session['length'] - index * session['part_size'])
+
+
+def _read_exact(stream, n):
+    buf = b''
+    while len(buf) < n:
+        chunk = stream.read(n - len(buf))
+        if not chunk:
+            break
+        buf += chunk
+    return buf
+
+
+def write_part(upload_id, index, stream, sha256=None):
+    """Stream part ``index`` from ``stream`` into GridFS chunks; returns the updated session."""
+    session = get(upload_id)
+    if session['state'] != 'open':
+        raise UploadError(f"Upload is {session['state']}", 409)
+    if not 0 <= index < session['parts']:
+        raise UploadError(f"part must be between 0 and {session['parts'] - 1}")
+    if sha256 is not None:
+        sha256 = sha256.lower()
+        if not _is_sha256(sha256):
+            raise UploadError('X-Part-Sha256 must be 64 hex characters')
+
+    expected = part_length(session, index)
+    file_id = session['file_id']
+    first_n = index * CHUNKS_PER_PART
+    digest = hashlib.sha256()
+    written = 0
+    n = first_n
+    try:
+        while written < expected:
+            data = _read_exact(stream, min(GRIDFS_CHUNK, expected - written))
+            if not data:
+                raise UploadError(f'part {index} is {written} bytes, expected {expected}')
+            digest.update(data)
+            chunks_col.replace_one({'files_id': file_id, 'n': n},
+                                   {'files_id': file_id, 'n': n, 'data': Binary(data)}, upsert=True)
+            written += len(data)
+            n += 1
+        if stream.read(1):
+            raise UploadError(f'part {index} is longer than {expected} bytes')
+        if sha256 is not None and digest.hexdigest() != sha256:
+            raise UploadError(f'part {index} failed its checksum', 422)
+    except Exception:
+        # Never leave a partial part behind looking complete
+        chunks_col.delete_many({'files_id': file_id, 'n': {'$gte': first_n, '$lt': first_n + CHUNKS_PER_PART}})
+        sessions_col.update_one({'_id': upload_id}, {'$pull': {'received': index}})
+        raise
+
+    now = _now()
+    return sessions_col.find_one_and_update(
+        {'_id': upload_id},
+        {'$addToSet': {'received': index},
+         '$set': {'updated_at': now, 'expires_at': now + timedelta(hours=UPLOAD_SESSION_HOURS)}},
+        return_document=ReturnDocument.AFTER)
+
+
+def _verify(session):
+    """Read the chunks back in order; returns the SHA-256 of the assembled file."""
+    file_id = session['file_id']
+    total_chunks = math.ceil(session['length'] / GRIDFS_CHUNK)
+    digest = hashlib.sha256()
+    length = 0
+    expected_n = 0
+    cursor = chunks_col.find({'files_id': file_id}, {'_id': 0, 'n': 1, 'data': 1}).sort('n', ASCENDING).batch_size(16)
+    for chunk in cursor:
+        if chunk['n'] != expected_n:
+            raise UploadError(f'chunk {expected_n} is missing', 409)
+        digest.update(chunk['data'])
+        length += len(chunk['data'])
+        expected_n += 1
+    if expected_n != total_chunks or length != session['length']:
+        raise UploadError(f"assembled {length} of {session['length']} bytes", 409)
+    return digest.hexdigest()
+
+
+def complete(upload_id):
+    """Verify every part and publish the GridFS file; returns the completed session."""
+    session = get(upload_id)
+    if session['state'] == 'complete':
+        return session  # a retried complete after a lost response
+    missing = sorted(set(range(session['parts'])) - set(session.get('received', [])))
+    if missing:
+        raise UploadError(f'{len(missing)} parts missing', 409)
+
+    stale = _now() - timedelta(seconds=COMPLETE_TIMEOUT_SECONDS)
+    claimed = sessions_col.find_one_and_update(
+        {'_id': upload_id, '$or': [{'state': 'open'}, {'state': 'completing', 'updated_at': {'$lt': stale}}]},
+        {'$set': {'state': 'completing', 'updated_at': _now()}})
+    if claimed is None:
+        raise UploadError('Upload is already being completed', 409)
+
+    try:
+        digest = _verify(session)
+        expected = session.get('expected_sha256')
+        if expected and digest != expected:
+            raise UploadError(f'checksum mismatch: got {digest}, expected {expected}', 422)
+        files_col.insert_one({
+            '_id': session['file_id'],
+            'length': session['length'],
+            'chunkSize': GRIDFS_CHUNK,
+            'uploadDate': _now(),
+            'filename': session['filename'],
+            'contentType': session['content_type'],
+            'metadata': {'sha256': digest, 'upload_id': upload_id},
+        })
+    except Exception:
+        sessions_col.update_one({'_id': upload_id}, {'$set': {'state': 'open', 'updated_at': _now()}})
+        raise
+
+    return sessions_col.find_one_and_update(
+        {'_id': upload_id}, {'$set': {'state': 'complete', 'sha256': digest, 'updated_at': _now()}},
+        return_document=ReturnDocument.AFTER)
+
+
+def abort(upload_id):
+    """Drop an unfinished upload and its chunks."""
+    session = get(upload_id)
+    if session['state'] == 'complete':
+        raise UploadError('Upload is already complete', 409)
+    chunks_col.delete_many({'files_id': session['file_id']})
+    sessions_col.delete_one({'_id': upload_id})
+
+
+# --- Cleanup ---
+
+def cleanup(now=None):
+    """Remove expired sessions, with the chunks of those never completed; returns how many."""
+    now = now or _now()
+    removed = 0
+    for session in sessions_col.find({'expires_at': {'$lt': now}}, {'file_id': 1, 'state': 1}):
+        if session['state'] != 'complete':
+            chunks_col.delete_many({'files_id': session['file_id']})
+        sessions_col.delete_one({'_id': session['_id']})
+        removed += 1
+    return removed
+
+
+_cleanup_lock = threading.Lock()
+_last_cleanup = 0.0
+
+
+def _maybe_cleanup():
+    """Run ``cleanup`` at most every UPLOAD_CLEANUP_SECONDS, piggybacking on new uploads."""
+    global _last_cleanup
+    if time.monotonic() - _last_cleanup < UPLOAD_CLEANUP_SECONDS or not _cleanup_lock.acquire(blocking=False):
+        return
+    try:
+        _last_cleanup = time.monotonic()
+        removed = cleanup()
+        if removed:
+            print(f'Removed {removed} expired upload sessions')
+    except Exception as e:
+        print(f'Upload cleanup failed: {e}')
+    finally:
+        _cleanup_lock.release()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Maintain chunked upload sessions.')
+    parser.add_argument('--cleanup', action='store_true', help='remove expired sessions and their chunks')
+    args = parser.parse_args()
+    if args.cleanup:
+        print(f'Removed {cleanup()} expired upload sessions')
+    else:
+        for s in sessions_col.find({}, {'received': 0}).sort('created_at', ASCENDING):
+            print(f"{s['_id']}  {s['state']:<10}  {s['length']:>12}  {s['filename']}")